@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:33
+
+import cs412.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0005_article_user"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="article",
+            name="image_file",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+    ]
@@ -4,6 +4,7 @@
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User # for authentication
+from cs412.storage import get_media_storage # stores identical uploads once
 
 # Create your models here.
 
@@ -18,7 +19,7 @@ class Article(models.Model):
     text = models.TextField(blank=True)
     published = models.DateTimeField(auto_now=True) # automatically sets published to the current time
     # image_url = models.URLField(blank=True) # holds any kind of url # url as a string
-    image_file = models.ImageField(blank=True) # an actual image file
+    image_file = models.ImageField(blank=True, storage=get_media_storage) # an actual image file (stored once per distinct file)
     user = models.ForeignKey(User, on_delete=models.CASCADE) # user as a FK
 
 
@@ -0,0 +1,102 @@
+# File: cs412/chart_cache.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: A small in-process cache for rendered chart HTML, shared by the
+# analytics apps.
+#
+# plotly.offline.plot(..., output_type='div') serializes the whole figure, so
+# rendering is slow. Charts that many requests share (e.g. a marathon
+# division's finish time histogram) are cached here, rendered without
+# plotly.js (the page loads that once), under a key built from whatever they
+# depend on plus the version of their data. Entries are evicted
+# least-recently-used first once the total size of the cached HTML goes over
+# settings.CHART_CACHE_MAX_BYTES.
+
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+# default cap on the total size of cached HTML, if settings doesn't set one
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_params(query_dict, ignore=('page',)):
+    """Turn a request's GET QueryDict into a hashable, order-independent key,
+    dropping empty values and any parameters that don't change the charts.
+    """
+
+    return tuple(
+        sorted(
+            (name, tuple(sorted(value for value in values if value)))
+            for name, values in query_dict.lists()
+            if name not in ignore and any(values)
+        )
+    )
+
+
+class RenderedChartCache:
+    """A thread-safe LRU cache mapping keys to dicts of rendered chart divs,
+    capped by the total length of the HTML it holds.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get_or_render(self, key, render):
+        """Return the divs cached under key, or call render() to build them
+        (a dict mapping names to HTML strings) and cache the result.
+        """
+
+        with self.lock:
+            divs = self.entries.get(key)
+
+            if divs is not None:
+                self.entries.move_to_end(key)
+                return divs
+
+        # render outside the lock, so slow renders don't block cache hits
+        divs = render()
+        self.add(key, divs)
+
+        return divs
+
+    def add(self, key, divs):
+        """Cache divs under key, evicting the least recently used entries
+        until everything fits under the size cap.
+        """
+
+        size = self.sizeof(divs)
+
+        # something bigger than the whole cache would just evict everything
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.sizeof(self.entries.pop(key))
+
+            self.entries[key] = divs
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+    def clear(self):
+        """Remove every cached entry."""
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    @staticmethod
+    def sizeof(divs):
+        """Return the total length of the HTML in a cached entry."""
+
+        return sum(len(html) for html in divs.values())
+
+
+chart_cache = RenderedChartCache(getattr(settings, 'CHART_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
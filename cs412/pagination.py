@@ -0,0 +1,255 @@
+# File: cs412/pagination.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Keyset (cursor) pagination for ListViews, shared by the
+# analytics apps.
+#
+# Django's Paginator runs a COUNT(*) over the whole filtered queryset and then
+# fetches each page with OFFSET n, which gets slower the deeper you page.
+# Here, each page is instead fetched as "the next page_size rows whose key is
+# past the last row we showed", which is an index range scan that costs the
+# same on page 1000 as on page 1. The position is carried in an opaque
+# ?cursor= parameter.
+#
+# The key can be a single field (e.g. the primary key) or a tuple of fields
+# (each optionally prefixed with "-" for descending order) that together
+# uniquely order the rows, e.g. ("-followed", "-timestamp", "-pk").
+
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+# which way a cursor pages from its key
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_key_value(value):
+    """Turn a key value that JSON can't hold into a string the database
+    will accept back in a filter (keeping full microsecond precision).
+    """
+
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    raise TypeError(f"can't put {value!r} in a cursor")
+
+
+def encode_cursor(direction, key):
+    """Pack a direction and a list of key values into an opaque, URL-safe cursor."""
+
+    payload = json.dumps([direction, list(key)], default=encode_key_value, separators=(',', ':'))
+
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor() into (direction, key values).
+    Raises ValueError if it isn't a valid cursor.
+    """
+
+    padded = cursor + '=' * (-len(cursor) % 4)
+
+    try:
+        direction, key = json.loads(base64.urlsafe_b64decode(padded).decode())
+    except Exception:
+        raise ValueError(f'invalid cursor: {cursor!r}')
+
+    if direction not in (NEXT, PREVIOUS) or not isinstance(key, list):
+        raise ValueError(f'invalid cursor: {cursor!r}')
+
+    return direction, key
+
+
+def parse_key_fields(key_field):
+    """Turn a key field (or tuple of them, "-" meaning descending) into a list
+    of (attribute name, descending) pairs. "pk" is allowed as a name.
+    """
+
+    if isinstance(key_field, str):
+        key_field = (key_field,)
+
+    return [(field.lstrip('-'), field.startswith('-')) for field in key_field]
+
+
+def keyset_filter(key_fields, values, forwards):
+    """Build the Q object matching the rows that come after (or, if not
+    forwards, before) the row whose key is values in key_fields order:
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+    with > flipped to < for descending fields, or when going backwards.
+    """
+
+    if len(values) != len(key_fields):
+        raise ValueError(f'expected {len(key_fields)} key values, got {len(values)}')
+
+    condition = Q()
+    equal_so_far = Q()
+
+    for (name, descending), value in zip(key_fields, values):
+        lookup = 'lt' if descending == forwards else 'gt'
+        condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+        equal_so_far &= Q(**{name: value})
+
+    return condition
+
+
+def order_fields(key_fields, forwards):
+    """Return the order_by() arguments that sort in key order (or reversed)."""
+
+    return [f'-{name}' if descending == forwards else name for name, descending in key_fields]
+
+
+class KeysetPage:
+    """One page of results fetched by keyset, with cursors to its neighbours."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, key_fields, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.key_fields = key_fields
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def key_of(self, obj):
+        """Return the key values of one row, in key field order."""
+
+        return [getattr(obj, name) for name, _ in self.key_fields]
+
+    def next_cursor(self):
+        """Return the cursor for the page after this one (or None)."""
+
+        if not self.has_next_page or not self.object_list:
+            return None
+
+        return encode_cursor(NEXT, self.key_of(self.object_list[-1]))
+
+    def previous_cursor(self):
+        """Return the cursor for the page before this one (or None)."""
+
+        if not self.has_previous_page or not self.object_list:
+            return None
+
+        return encode_cursor(PREVIOUS, self.key_of(self.object_list[0]))
+
+
+class KeysetPaginator:
+    """Fetch pages of an ordered-by-key queryset using range filters on the key
+    (which should be indexed, e.g. the primary key) instead of OFFSET.
+    """
+
+    def __init__(self, queryset, per_page, key_field='pk'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key_fields = parse_key_fields(key_field)
+
+    def has_rows_beyond(self, obj, forwards):
+        """Return whether any row comes after (or, if not forwards, before) obj."""
+
+        values = [getattr(obj, name) for name, _ in self.key_fields]
+
+        return self.queryset.filter(keyset_filter(self.key_fields, values, forwards)).exists()
+
+    def page(self, cursor=None):
+        """Return the KeysetPage that the cursor points to (the first page if
+        there's no cursor, or if the cursor is stale and points past the
+        rows there are). Raises ValueError for a malformed cursor.
+        """
+
+        keys = self.key_fields
+        forwards = order_fields(keys, True)
+
+        if not cursor:
+            # first page: fetch one extra row to find out whether there's a next page
+            rows = list(self.queryset.order_by(*forwards)[: self.per_page + 1])
+
+            return KeysetPage(rows[: self.per_page], keys, len(rows) > self.per_page, False)
+
+        direction, values = decode_cursor(cursor)
+
+        try:
+            after = keyset_filter(keys, values, direction == NEXT)
+
+            if direction == NEXT:
+                rows = list(self.queryset.filter(after).order_by(*forwards)[: self.per_page + 1])
+            else:
+                # walk backwards from the cursor
+                rows = list(self.queryset.filter(after).order_by(*order_fields(keys, False))[: self.per_page + 1])
+
+        # a key value that doesn't fit its field (e.g. a bad date) is a bad cursor too
+        except ValidationError as e:
+            raise ValueError(f'invalid cursor: {cursor!r} ({e})')
+
+        # nothing left on that side of the cursor (the rows it came from are gone)
+        if not rows:
+            return self.page()
+
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        # the extra row tells whether there's more in the direction we paged;
+        # whether there's anything the other way is checked against the data
+        if direction == NEXT:
+            return KeysetPage(rows, keys, more, self.has_rows_beyond(rows[0], False))
+
+        # flip the rows back into key order
+        rows = rows[::-1]
+
+        return KeysetPage(rows, keys, self.has_rows_beyond(rows[-1], True), more)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that pages through the queryset by keyset (?cursor=...)
+    rather than by page number. Old ?page=N links still get Django's regular
+    offset pagination. Also adds a 'querystring' context variable holding the
+    GET parameters minus the paging ones, for building page links.
+    """
+
+    cursor_kwarg = 'cursor'
+
+    # the key to page by: a field, or a tuple of fields ("-" for descending)
+    keyset_field = 'pk'
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate the queryset by keyset, unless a page number was asked for."""
+
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_field)
+
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except ValueError as e:
+            raise Http404(str(e))
+
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        """Add the non-paging GET parameters to the context as 'querystring'."""
+
+        context = super().get_context_data(**kwargs)
+
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        params.pop(self.cursor_kwarg, None)
+        context['querystring'] = params.urlencode()
+
+        return context
@@ -159,4 +159,12 @@ if socket.gethostname() == CS_DEPLOYMENT_HOSTNAME:
 REST_FRAMEWORK = {
   'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
   'PAGE_SIZE': 10
-}
\ No newline at end of file
+}
+
+# cap on the total size of rendered chart HTML kept in memory by cs412/chart_cache.py
+# (the divs are cached without plotly.js, so each is only a few KB)
+CHART_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# the search backend used by mini_insta/search.py (a dotted path to a SearchBackend
+# class); if it isn't set, FTS5 is used on SQLite and substring matching elsewhere
+# MINI_INSTA_SEARCH_BACKEND = 'mini_insta.search.ContainsSearchBackend'
@@ -0,0 +1,323 @@
+# File: cs412/storage.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: A content-addressed file storage for uploaded media, shared by
+# the apps.
+#
+# Uploading the same file twice used to store it twice, under names Django
+# made unique by adding a random suffix (e.g. chiikawa.jpg,
+# chiikawa_90jKezW.jpg). This storage instead names every file after the
+# SHA-256 of its contents, under blobs/ (e.g. blobs/3f/3f9a...e1.jpg), so an
+# upload of a file that is already stored just reuses it. A blob's name never
+# changes and its contents never change, so it can be cached forever (e.g. by
+# a CDN).
+#
+# The rows that name a blob are its references: deleting one of them (or
+# saving it with a different file) releases the blob, which is only removed
+# from disk once no row (in any model, through any field using this storage)
+# references it any more. A blob written or reused within the last
+# BLOB_GRACE_PERIOD is kept even then, since the row about to reference it may
+# not be committed yet; sweep() removes it later. Requests never sweep, so
+# `python manage.py sweep_media` has to run on a schedule (e.g. hourly from
+# cron), or such blobs stay on disk for good. Files stored before this storage
+# existed keep their old names, and are served as before until
+# `python manage.py dedup_media` moves them into blobs (and sweeps too).
+#
+# Fields opt in with storage=get_media_storage.
+
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from functools import partial
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import class_prepared, post_delete, post_save, pre_save
+
+# the directory (under MEDIA_ROOT) holding the blobs
+BLOB_DIRECTORY = 'blobs'
+
+# how long (in seconds) after a blob was last written or reused it is kept,
+# even with nothing referencing it: longer than any transaction that saves a row
+BLOB_GRACE_PERIOD = 60 * 60
+
+# the permissions given to new blobs when FILE_UPLOAD_PERMISSIONS is None (the
+# umask can't be used: the only way to read it is to set it, process-wide,
+# which would race with other threads creating files)
+BLOB_PERMISSIONS = 0o644
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """A FileSystemStorage that saves each file under the hash of its contents,
+    storing identical files once and deleting them once nothing uses them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # the (model, field name) pairs of every FileField using this storage
+        self.fields = []
+
+    @staticmethod
+    def hash_content(content):
+        """Return the hex SHA-256 of a File's contents, leaving it rewound."""
+
+        digest = hashlib.sha256()
+
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        content.seek(0)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def blob_name(digest, name):
+        """Return the name of the blob with this hash, keeping the extension of
+        name (so the web server still sends the right Content-Type).
+        """
+
+        extension = os.path.splitext(name or '')[1].lower()
+
+        return f'{BLOB_DIRECTORY}/{digest[:2]}/{digest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        """Store content (unless an identical file is stored already) and
+        return the name of its blob.
+        """
+
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.blob_name(self.hash_content(content), name)
+
+        try:
+            # reusing the blob: mark it as just used, so it isn't deleted
+            # before the row that will reference it is committed (see delete_blob)
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            self.write_blob(name, content)
+
+        return name
+
+    def write_blob(self, name, content):
+        """Write a new blob, all at once: it's written to a temporary file that
+        is then renamed into place, so nobody ever reads half a blob. Two
+        uploads racing to write the same blob write the same bytes anyway.
+        """
+
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # an upload that was streamed to disk: move it instead of copying it
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), temporary_path, allow_overwrite=True)
+            else:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+
+            # mkstemp() creates files only the owner can read
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary_path, self.file_permissions_mode)
+            else:
+                os.chmod(temporary_path, BLOB_PERMISSIONS)
+
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def count_references(self, name):
+        """Return how many rows (across every field using this storage) name this file."""
+
+        return sum(
+            model._default_manager.filter(**{field_name: name}).count()
+            for model, field_name in self.fields
+        )
+
+    def delete(self, name):
+        """Delete a file, but only if no row references it any more (and, for
+        a blob, only if it wasn't just written or reused; see delete_blob).
+        """
+
+        if not name or self.count_references(name):
+            return
+
+        if name.startswith(f'{BLOB_DIRECTORY}/'):
+            self.delete_blob(name)
+        else:
+            super().delete(name)
+
+    def delete_blob(self, name):
+        """Delete a blob nothing references, unless it was written or reused
+        within the last BLOB_GRACE_PERIOD. Returns whether it was deleted.
+
+        A save() racing with this either touches the blob before it's moved
+        aside here (and the blob is then put back), or finds it gone and
+        writes it again, so a row is never left naming a missing blob.
+        """
+
+        path = self.path(name)
+
+        try:
+            if time.time() - os.stat(path).st_mtime < BLOB_GRACE_PERIOD:
+                return False
+
+            tombstone = f'{path}.{uuid.uuid4().hex}.deleted'
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            return False
+
+        # check again, now that no save() can reuse it: one may have touched it just before
+        if time.time() - os.stat(tombstone).st_mtime < BLOB_GRACE_PERIOD:
+            os.replace(tombstone, path)
+            return False
+
+        os.remove(tombstone)
+
+        return True
+
+    def release(self, names):
+        """Delete each of these files that nothing references any more, once
+        the current transaction (which may have deleted their rows) commits.
+        """
+
+        names = [name for name in names if name]
+
+        if names:
+            transaction.on_commit(lambda: [self.delete(name) for name in names])
+
+    def register(self, model, field_name):
+        """Start counting the rows of model that reference a file through field_name."""
+
+        if (model, field_name) not in self.fields:
+            self.fields.append((model, field_name))
+
+            dispatch_uid = f'cs412.storage:{model._meta.label}'
+
+            post_delete.connect(
+                partial(release_deleted_files, storage=self),
+                sender=model,
+                weak=False,
+                dispatch_uid=dispatch_uid,
+            )
+            pre_save.connect(
+                partial(remember_replaced_files, storage=self),
+                sender=model,
+                weak=False,
+                dispatch_uid=dispatch_uid,
+            )
+            post_save.connect(
+                partial(release_replaced_files, storage=self),
+                sender=model,
+                weak=False,
+                dispatch_uid=dispatch_uid,
+            )
+
+    def sweep(self):
+        """Delete every blob that nothing references (and that wasn't written or
+        reused within the last BLOB_GRACE_PERIOD). Returns how many there were.
+        """
+
+        removed = 0
+
+        if not self.exists(BLOB_DIRECTORY):
+            return removed
+
+        for prefix in self.listdir(BLOB_DIRECTORY)[0]:
+            for filename in self.listdir(f'{BLOB_DIRECTORY}/{prefix}')[1]:
+                name = f'{BLOB_DIRECTORY}/{prefix}/{filename}'
+
+                if not self.count_references(name) and self.delete_blob(name):
+                    removed += 1
+
+        return removed
+
+
+# the one storage every opted-in field shares, so it can count all their references
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Return the shared ContentAddressedStorage (fields take this callable as
+    their storage, so migrations refer to it instead of copying its settings).
+    """
+
+    return media_storage
+
+
+def get_file_field_names(sender, storage):
+    """Return the names of the fields of model sender that use storage."""
+
+    return [field_name for model, field_name in storage.fields if model is sender]
+
+
+def release_deleted_files(sender, instance, storage, **kwargs):
+    """post_delete handler: release the files a deleted row referenced."""
+
+    storage.release(
+        [getattr(instance, field_name).name for field_name in get_file_field_names(sender, storage)]
+    )
+
+
+def remember_replaced_files(sender, instance, storage, raw=False, **kwargs):
+    """pre_save handler: note the files an existing row references before
+    it's saved, so the ones it stops referencing can be released after.
+    """
+
+    if raw or instance._state.adding:
+        return
+
+    field_names = get_file_field_names(sender, storage)
+
+    instance._stored_file_names = (
+        sender._default_manager.filter(pk=instance.pk).values(*field_names).first() or {}
+    )
+
+
+def release_replaced_files(sender, instance, storage, **kwargs):
+    """post_save handler: release the files a saved row no longer references."""
+
+    old_names = instance.__dict__.pop('_stored_file_names', {})
+
+    storage.release(
+        [
+            name for field_name, name in old_names.items()
+            if getattr(instance, field_name).name != name
+        ]
+    )
+
+
+def register_file_fields(sender, **kwargs):
+    """class_prepared handler: keep track of every FileField that uses the
+    shared storage, wherever its model is defined.
+    """
+
+    # skip the historical models that migrations build (they have their own registry)
+    if sender._meta.apps is not apps:
+        return
+
+    for field in sender._meta.local_fields:
+        if isinstance(field, FileField) and field.storage is media_storage:
+            media_storage.register(sender, field.name)
+
+
+class_prepared.connect(register_file_fields)
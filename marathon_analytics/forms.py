@@ -0,0 +1,25 @@
+# marathon_analytics/forms.py
+# define the forms used to search the marathon results
+
+from django import forms
+
+
+class ResultSearchForm(forms.Form):
+    """A form to validate the search/filter parameters for the results list.
+    Every field is optional; blank fields don't filter anything.
+    """
+
+    # case-insensitive prefix searches
+    first_name = forms.CharField(required=False)
+    last_name = forms.CharField(required=False)
+    city = forms.CharField(required=False)
+
+    # exact matches
+    gender = forms.CharField(required=False)
+    division = forms.CharField(required=False)
+    state = forms.CharField(required=False)
+    ctz = forms.CharField(required=False)
+
+    # finish time range (H:MM:SS)
+    min_finish = forms.TimeField(required=False)
+    max_finish = forms.TimeField(required=False)
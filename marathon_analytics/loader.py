@@ -0,0 +1,284 @@
+# marathon_analytics/loader.py
+#
+# Helpers for parsing the Chicago Marathon results CSV in parallel, and for
+# the field-wide statistics worked out after each load.
+# Nothing in here touches Django, so worker processes can import this
+# module without having to set up the ORM first.
+
+import bisect
+import csv
+import io
+import os
+from datetime import time
+
+# the Result attribute that each CSV column gets loaded into, in column order:
+# BIB,First Name,Last Name,CTZ,City,State,Gender,Division,
+# Place Overall,Place Gender,Place Division,Start TOD,Finish TOD,Finish,HALF1,HALF2
+CSV_FIELD_NAMES = [
+    'bib', 'first_name', 'last_name', 'ctz', 'city', 'state',
+    'gender', 'division',
+    'place_overall', 'place_gender', 'place_division',
+    'start_time_of_day', 'finish_time_of_day',
+    'time_finish', 'time_half1', 'time_half2',
+]
+
+# the integer-second durations derived from the times, appended to every row
+DERIVED_FIELD_NAMES = [
+    'finish_seconds', 'half1_seconds', 'half2_seconds',
+    'split_delta_seconds', 'pace_seconds',
+]
+
+# every Result attribute in a parsed row, in order
+FIELD_NAMES = CSV_FIELD_NAMES + DERIVED_FIELD_NAMES
+
+# columns that hold integers (bib and places) / H:MM:SS times
+INT_COLUMNS = [0, 8, 9, 10]
+TIME_COLUMNS = [11, 12, 13, 14, 15]
+
+# gender and division are CharField(max_length=6) on the model
+MAX_CHOICE_LENGTH = 6
+
+# the length of a marathon, for working out the pace
+MARATHON_MILES = 26.2188
+
+# finish time histograms count runners in fixed buckets of this many seconds
+HISTOGRAM_BUCKET_SECONDS = 5 * 60
+
+
+def parse_time(text):
+    '''Turn a H:MM:SS string into a datetime.time (raises ValueError if it isn't one).'''
+
+    hours, minutes, seconds = text.split(':')
+
+    return time(int(hours), int(minutes), int(seconds))
+
+
+def to_seconds(t):
+    '''Turn a duration stored as a datetime.time into a number of seconds.'''
+
+    return (t.hour * 60 + t.minute) * 60 + t.second
+
+
+def split_durations(time_finish, time_half1, time_half2):
+    '''Return the DERIVED_FIELD_NAMES values for a runner's finish and half times:
+    the three durations in seconds, the second half minus the first (negative
+    for a negative split), and the average pace in seconds per mile.
+    '''
+
+    finish = to_seconds(time_finish)
+    half1 = to_seconds(time_half1)
+    half2 = to_seconds(time_half2)
+
+    return finish, half1, half2, half2 - half1, round(finish / MARATHON_MILES)
+
+
+def parse_row(fields):
+    '''Validate one CSV row and return a tuple of values in FIELD_NAMES order.'''
+
+    if len(fields) != len(CSV_FIELD_NAMES):
+        raise ValueError(f'expected {len(CSV_FIELD_NAMES)} columns, got {len(fields)}')
+
+    values = list(fields)
+
+    for i in INT_COLUMNS:
+        values[i] = int(values[i])
+
+    for i in TIME_COLUMNS:
+        values[i] = parse_time(values[i])
+
+    if len(values[6]) > MAX_CHOICE_LENGTH or len(values[7]) > MAX_CHOICE_LENGTH:
+        raise ValueError('gender/division is too long')
+
+    return tuple(values) + split_durations(*values[13:16])
+
+
+def split_into_chunks(filename, num_chunks):
+    '''Split the data rows of a CSV file (everything after the header) into
+    roughly equal byte ranges. Every boundary is moved forward to the start
+    of the next line, so no row is ever cut in half.
+    Returns a list of (start, end) byte offsets.
+    '''
+
+    size = os.path.getsize(filename)
+
+    with open(filename, 'rb') as f:
+        # the first chunk starts right after the header line
+        f.readline()
+        data_start = f.tell()
+
+        chunk_size = max((size - data_start) // max(num_chunks, 1), 1)
+        boundaries = [data_start]
+
+        offset = data_start + chunk_size
+        while offset < size:
+            # finish the line that the rough boundary lands in
+            f.seek(offset - 1)
+            f.readline()
+
+            if f.tell() >= size:
+                break
+
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+
+            offset = f.tell() + chunk_size
+
+    boundaries.append(size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def parse_chunk(task):
+    '''Worker function: parse the rows in one (filename, start, end) byte range.
+    Returns a list of value tuples and a list of the raw lines that were rejected.
+    '''
+
+    filename, start, end = task
+
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+
+    rows = []
+    rejected = []
+
+    for fields in csv.reader(io.StringIO(text)):
+        # ignore blank lines (e.g. a trailing newline at the end of the file)
+        if not fields:
+            continue
+
+        try:
+            rows.append(parse_row(fields))
+        except ValueError as e:
+            rejected.append((','.join(fields), str(e)))
+
+    return rows, rejected
+
+
+class FenwickTree:
+    '''A binary indexed tree over positions 1..size, supporting point
+    increments and prefix sums in O(log size).
+    '''
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, position, amount=1):
+        '''Add amount to the count at position (1-based).'''
+
+        while position < len(self.tree):
+            self.tree[position] += amount
+            position += position & -position
+
+    def prefix_sum(self, position):
+        '''Return the total count at positions 1..position.'''
+
+        total = 0
+
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+
+        return total
+
+
+def count_passes(starts, finishes):
+    '''For every runner i, count the runners they passed (started strictly
+    earlier but finished strictly later) and the runners who passed them
+    (started strictly later but finished strictly earlier).
+
+    These are the inversions between start order and finish order, so instead
+    of comparing every pair of runners we sweep through the runners by start
+    time, keeping a Fenwick tree of the finish times seen so far: O(n log n).
+    Returns two lists (passed, passed_by), indexed like the inputs.
+    '''
+
+    n = len(starts)
+
+    # compress the finish times into ranks 1..m for the tree
+    ranks = {finish: i + 1 for i, finish in enumerate(sorted(set(finishes)))}
+    finish_ranks = [ranks[finish] for finish in finishes]
+
+    # runners grouped by start time, earliest first; runners who started at
+    # the same time never pass each other, so each group is queried before
+    # any of its members are added to the tree
+    order = sorted(range(n), key=lambda i: starts[i])
+    groups = []
+    for i in order:
+        if groups and starts[groups[-1][0]] == starts[i]:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+
+    passed = [0] * n
+    passed_by = [0] * n
+
+    # sweep forwards: earlier starters who finished after runner i
+    tree = FenwickTree(len(ranks))
+    seen = 0
+    for group in groups:
+        for i in group:
+            passed[i] = seen - tree.prefix_sum(finish_ranks[i])
+
+        for i in group:
+            tree.add(finish_ranks[i])
+        seen += len(group)
+
+    # sweep backwards: later starters who finished before runner i
+    tree = FenwickTree(len(ranks))
+    for group in reversed(groups):
+        for i in group:
+            passed_by[i] = tree.prefix_sum(finish_ranks[i] - 1)
+
+        for i in group:
+            tree.add(finish_ranks[i])
+
+    return passed, passed_by
+
+
+def finish_histogram(finish_times):
+    '''Count a sorted list of finish times (in seconds) in fixed buckets of
+    HISTOGRAM_BUCKET_SECONDS. Returns the start of the first bucket and the
+    list of counts from there on (including any empty buckets in between).
+    '''
+
+    if not finish_times:
+        return 0, []
+
+    first = finish_times[0] // HISTOGRAM_BUCKET_SECONDS
+    counts = [0] * (finish_times[-1] // HISTOGRAM_BUCKET_SECONDS - first + 1)
+
+    for t in finish_times:
+        counts[t // HISTOGRAM_BUCKET_SECONDS - first] += 1
+
+    return first * HISTOGRAM_BUCKET_SECONDS, counts
+
+
+def percentile_table(finish_times):
+    '''Return the 0th..100th percentiles of a sorted list of finish times
+    (nearest-rank, like models.finish_time_percentiles()), as a list of 101.
+    '''
+
+    n = len(finish_times)
+
+    if not n:
+        return []
+
+    # the p-th percentile is the value at rank ceil(p * n / 100), at least 1
+    return [finish_times[max(-(-p * n // 100), 1) - 1] for p in range(101)]
+
+
+def percent_faster_than(finish_times, finish):
+    '''Return the percentage of the other runners in a sorted list of finish
+    times (which includes this runner's own time) who finished strictly
+    slower than finish, found by binary search.
+    '''
+
+    others = len(finish_times) - 1
+
+    if others < 1:
+        return None
+
+    slower = len(finish_times) - bisect.bisect_right(finish_times, finish)
+
+    return 100 * slower / others
@@ -0,0 +1,92 @@
+# marathon_analytics/management/commands/benchmark_load_results.py
+#
+# python manage.py benchmark_load_results <path> [--rows N]
+#
+# Compares the throughput of the original loader (one Result.save() per row)
+# against the parallel chunked loader in models.load_data().
+# WARNING: like load_data itself, this replaces every Result in the database.
+
+from django.core.management.base import BaseCommand
+from marathon_analytics.models import Result, load_data
+import time
+
+
+def load_data_row_by_row(filename, max_rows):
+    '''The original loader: split each line by hand and save() every Result
+    on its own (one INSERT and one transaction per row).
+    Returns the number of Results created.
+    '''
+
+    created = 0
+
+    with open(filename, 'r') as f:
+        # discard headers
+        f.readline()
+
+        for line in f:
+            if created >= max_rows:
+                break
+
+            try:
+                fields = line.strip().split(',')
+
+                result = Result(
+                    bib=fields[0],
+                    first_name=fields[1],
+                    last_name=fields[2],
+                    ctz=fields[3],
+                    city=fields[4],
+                    state=fields[5],
+                    gender=fields[6],
+                    division=fields[7],
+                    place_overall=fields[8],
+                    place_gender=fields[9],
+                    place_division=fields[10],
+                    start_time_of_day=fields[11],
+                    finish_time_of_day=fields[12],
+                    time_finish=fields[13],
+                    time_half1=fields[14],
+                    time_half2=fields[15],
+                )
+                result.save()
+                created += 1
+
+            except:
+                pass
+
+    return created
+
+
+class Command(BaseCommand):
+    '''Time the row-by-row loader against the parallel loader.'''
+
+    help = 'Benchmark the row-by-row results loader against the parallel one.'
+
+    def add_arguments(self, parser):
+        '''Define the command line arguments for this command.'''
+
+        parser.add_argument('path', help='path to the results CSV file')
+        parser.add_argument(
+            '--rows', type=int, default=2000,
+            help='rows to load with the (slow) row-by-row loader (default 2000)',
+        )
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        '''Run both loaders and print rows/sec for each.'''
+
+        path = options['path']
+
+        # the old loader takes minutes on the full file, so only time a sample of it
+        Result.objects.all().delete()
+        start = time.perf_counter()
+        old_rows = load_data_row_by_row(path, options['rows'])
+        old_rate = old_rows / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        new_rows, _ = load_data(path, workers=options['workers'], log=lambda message: None)
+        new_rate = new_rows / (time.perf_counter() - start)
+
+        self.stdout.write(f'row-by-row: {old_rows} rows at {old_rate:.0f} rows/sec')
+        self.stdout.write(f'parallel:   {new_rows} rows at {new_rate:.0f} rows/sec')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {new_rate / old_rate:.1f}x'))
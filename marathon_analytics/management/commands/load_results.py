@@ -0,0 +1,38 @@
+# marathon_analytics/management/commands/load_results.py
+#
+# python manage.py load_results <path> [--workers N] [--batch-size N]
+
+from django.core.management.base import BaseCommand
+from marathon_analytics.models import BATCH_SIZE, load_data
+
+
+class Command(BaseCommand):
+    '''Replace every Result with the rows of a Chicago Marathon results CSV file.'''
+
+    help = 'Load marathon results from a CSV file, parsing it in parallel.'
+
+    def add_arguments(self, parser):
+        '''Define the command line arguments for this command.'''
+
+        parser.add_argument('path', help='path to the results CSV file')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='number of parser processes (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'number of rows inserted per transaction (default {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        '''Run the import and report any rejected lines.'''
+
+        created, rejected = load_data(
+            options['path'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+
+        for line, error in rejected:
+            self.stderr.write(f'Rejected ({error}): {line}')
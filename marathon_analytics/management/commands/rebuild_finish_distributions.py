@@ -0,0 +1,24 @@
+# marathon_analytics/management/commands/rebuild_finish_distributions.py
+#
+# python manage.py rebuild_finish_distributions
+#
+# load_data() already does this after every load; this is for Results
+# that were loaded (or edited) some other way.
+
+from django.core.management.base import BaseCommand
+from marathon_analytics.models import rebuild_finish_distributions
+import time
+
+
+class Command(BaseCommand):
+    '''Recompute the finish time histograms and percentile tables.'''
+
+    help = 'Precompute the finish time distribution of every gender/division.'
+
+    def handle(self, *args, **options):
+        '''Rebuild the distributions and report how long it took.'''
+
+        start = time.perf_counter()
+        built = rebuild_finish_distributions()
+
+        self.stdout.write(f'Built {built} finish distributions in {time.perf_counter() - start:.2f}s.')
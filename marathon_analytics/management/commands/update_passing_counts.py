@@ -0,0 +1,24 @@
+# marathon_analytics/management/commands/update_passing_counts.py
+#
+# python manage.py update_passing_counts
+#
+# load_data() already does this after every load; this is for Results
+# that were loaded (or edited) some other way.
+
+from django.core.management.base import BaseCommand
+from marathon_analytics.models import update_passing_counts
+import time
+
+
+class Command(BaseCommand):
+    '''Recompute runners passed / passed by for every Result.'''
+
+    help = 'Precompute runners passed / passed by for every Result.'
+
+    def handle(self, *args, **options):
+        '''Run the sweep and report how long it took.'''
+
+        start = time.perf_counter()
+        update_passing_counts()
+
+        self.stdout.write(f'Updated passing counts in {time.perf_counter() - start:.2f}s.')
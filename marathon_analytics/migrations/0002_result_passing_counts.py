@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marathon_analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="runners_passed",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="runners_passed_by",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
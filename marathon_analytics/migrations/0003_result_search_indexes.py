@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marathon_analytics", "0002_result_passing_counts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                django.db.models.functions.text.Lower("last_name"),
+                name="result_last_name_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                django.db.models.functions.text.Lower("first_name"),
+                name="result_first_name_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                django.db.models.functions.text.Lower("city"),
+                name="result_city_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["gender", "division"], name="result_gender_division_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["division"], name="result_division_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["state"], name="result_state_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["ctz"], name="result_ctz_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["time_finish"], name="result_time_finish_idx"),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+# copies of the loader's helpers as they were when this migration was written,
+# so later changes to the loader can't change what this migration does
+
+DERIVED_FIELD_NAMES = [
+    "finish_seconds",
+    "half1_seconds",
+    "half2_seconds",
+    "split_delta_seconds",
+    "pace_seconds",
+]
+
+MARATHON_MILES = 26.2188
+
+
+def to_seconds(t):
+    """Turn a duration stored as a datetime.time into a number of seconds."""
+
+    return (t.hour * 60 + t.minute) * 60 + t.second
+
+
+def split_durations(time_finish, time_half1, time_half2):
+    """Return the DERIVED_FIELD_NAMES values for a runner's finish and half times."""
+
+    finish = to_seconds(time_finish)
+    half1 = to_seconds(time_half1)
+    half2 = to_seconds(time_half2)
+
+    return finish, half1, half2, half2 - half1, round(finish / MARATHON_MILES)
+
+
+def fill_durations(apps, schema_editor):
+    """Work out the duration columns for the Results that are already loaded."""
+
+    Result = apps.get_model("marathon_analytics", "Result")
+    qn = schema_editor.connection.ops.quote_name
+
+    # (like update_passing_counts) executemany is far faster than bulk_update here
+    sql = (
+        f"UPDATE {qn(Result._meta.db_table)} SET "
+        + ", ".join(f"{qn(name)} = %s" for name in DERIVED_FIELD_NAMES)
+        + f" WHERE {qn('id')} = %s"
+    )
+    rows = Result.objects.values_list("pk", "time_finish", "time_half1", "time_half2")
+    params = [split_durations(*times) + (pk,) for pk, *times in rows]
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marathon_analytics", "0003_result_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="finish_seconds",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="half1_seconds",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="half2_seconds",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="pace_seconds",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="split_delta_seconds",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["gender", "division", "finish_seconds"],
+                name="result_group_finish_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["division", "finish_seconds"], name="result_division_finish_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                fields=["split_delta_seconds"], name="result_split_delta_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["pace_seconds"], name="result_pace_idx"),
+        ),
+        migrations.RunPython(fill_durations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marathon_analytics", "0004_result_duration_seconds"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FinishDistribution",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("gender", models.CharField(blank=True, max_length=6)),
+                ("division", models.CharField(blank=True, max_length=6)),
+                ("version", models.IntegerField()),
+                ("runners", models.IntegerField()),
+                ("finish_seconds", models.JSONField()),
+                ("histogram_start", models.IntegerField()),
+                ("histogram", models.JSONField()),
+                ("percentiles", models.JSONField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("gender", "division"),
+                        name="finish_distribution_group_unique",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,16 @@
 # marathon_analytics/models.py
 
-from django.db import models
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models.functions import Lower
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from . loader import (
+    FIELD_NAMES, count_passes, finish_histogram, parse_chunk, percentile_table,
+    split_into_chunks,
+)
+import os
+import time
 
 # Create your models here.
 
@@ -34,6 +44,40 @@ class Result(models.Model):
     time_finish = models.TimeField()
     time_half1 = models.TimeField()
     time_half2 = models.TimeField()
+
+    # the same durations as whole seconds (plus the second half minus the first,
+    # and the pace in seconds per mile), filled in at load time so pacing
+    # analytics can be aggregated in SQL
+    finish_seconds = models.IntegerField(null=True, blank=True)
+    half1_seconds = models.IntegerField(null=True, blank=True)
+    half2_seconds = models.IntegerField(null=True, blank=True)
+    split_delta_seconds = models.IntegerField(null=True, blank=True)
+    pace_seconds = models.IntegerField(null=True, blank=True)
+
+    # precomputed by update_passing_counts() after each load
+    runners_passed = models.IntegerField(null=True, blank=True)
+    runners_passed_by = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        '''Index the columns that the results search filters on. The name and city 
+        searches are case-insensitive prefix matches, so those get functional 
+        indexes on their lower-case values.
+        '''
+
+        indexes = [
+            models.Index(Lower('last_name'), name='result_last_name_lower_idx'),
+            models.Index(Lower('first_name'), name='result_first_name_lower_idx'),
+            models.Index(Lower('city'), name='result_city_lower_idx'),
+            models.Index(fields=['gender', 'division'], name='result_gender_division_idx'),
+            models.Index(fields=['division'], name='result_division_idx'),
+            models.Index(fields=['state'], name='result_state_idx'),
+            models.Index(fields=['ctz'], name='result_ctz_idx'),
+            models.Index(fields=['time_finish'], name='result_time_finish_idx'),
+            models.Index(fields=['gender', 'division', 'finish_seconds'], name='result_group_finish_idx'),
+            models.Index(fields=['division', 'finish_seconds'], name='result_division_finish_idx'),
+            models.Index(fields=['split_delta_seconds'], name='result_split_delta_idx'),
+            models.Index(fields=['pace_seconds'], name='result_pace_idx'),
+        ]
  
     def __str__(self):
         '''Return a string representation of this model instance.'''
@@ -41,89 +85,332 @@ class Result(models.Model):
     
     def get_runners_passed(self):
         '''Return the number of runners passed by this runner.'''
+
+        # use the count precomputed at load time, if there is one
+        if self.runners_passed is not None:
+            return self.runners_passed
+
         started_first = Result.objects.filter(start_time_of_day__lt=self.start_time_of_day)
         passed = started_first.filter(finish_time_of_day__gt=self.finish_time_of_day)
  
-        return len(passed)
+        return passed.count()
         
     def get_runners_passed_by(self):
         '''Return the number of runners who passed this runner.'''
+
+        # use the count precomputed at load time, if there is one
+        if self.runners_passed_by is not None:
+            return self.runners_passed_by
+
         started_later = Result.objects.filter(start_time_of_day__gt=self.start_time_of_day)
         passed_by = started_later.filter(finish_time_of_day__lt=self.finish_time_of_day)
  
-        return len(passed_by)
+        return passed_by.count()
     
 
-def load_data():
-    '''Function to load data records from CSV file into the Django database.'''
+class FinishDistribution(models.Model):
+    '''
+    Store the precomputed finish time distribution of one group of runners:
+    a gender and division, a whole gender (division is blank), or the whole
+    field (both are blank). Rebuilt by rebuild_finish_distributions() after
+    every load, so nothing field-wide has to be counted per request.
+    '''
+
+    gender = models.CharField(max_length=6, blank=True)
+    division = models.CharField(max_length=6, blank=True)
+
+    # which rebuild this came from, so cached copies can tell when they're stale
+    version = models.IntegerField()
+
+    runners = models.IntegerField()
+
+    # every finish time in the group (in seconds), sorted fastest first
+    finish_seconds = models.JSONField()
+
+    # runners per HISTOGRAM_BUCKET_SECONDS bucket, from histogram_start on
+    histogram_start = models.IntegerField()
+    histogram = models.JSONField()
+
+    # the 0th..100th percentile finish times (in seconds)
+    percentiles = models.JSONField()
+
+    class Meta:
+        '''There's only one distribution per group.'''
+
+        constraints = [
+            models.UniqueConstraint(fields=['gender', 'division'], name='finish_distribution_group_unique'),
+        ]
+
+    def __str__(self):
+        '''Return a string representation of this model instance.'''
+        return f'{self.gender or "All"} {self.division or "divisions"}: {self.runners} runners (v{self.version})'
+
+
+# the number of Results inserted per bulk_create call (and per transaction)
+BATCH_SIZE = 2000
+
+# the percentiles of finish time reported by finish_time_percentiles()
+PERCENTILES = [10, 25, 50, 75, 90]
+
+# the columns that finish_time_percentiles() can group by
+PERCENTILE_GROUPS = ['gender', 'division']
+
+# how long (in seconds) to cache a FinishDistribution's sorted times for; a
+# rebuild changes the version, which invalidates them right away anyway
+DISTRIBUTION_TIMEOUT = 60 * 60 * 24
+
+
+def save_results(rows):
+    '''Insert a batch of parsed rows (tuples in FIELD_NAMES order) with a single
+    bulk_create, inside its own transaction. Returns how many were inserted.
+    '''
+
+    results = [Result(**dict(zip(FIELD_NAMES, row))) for row in rows]
+
+    with transaction.atomic():
+        Result.objects.bulk_create(results)
+
+    return len(results)
+
+
+def update_passing_counts():
+    '''Compute how many runners each runner passed / was passed by, for every
+    Result at once (see loader.count_passes), and store the counts on each Result.
+    '''
+
+    rows = list(Result.objects.values_list('pk', 'start_time_of_day', 'finish_time_of_day'))
+    passed, passed_by = count_passes([row[1] for row in rows], [row[2] for row in rows])
+
+    # a plain executemany() UPDATE is a couple of hundred times faster here than
+    # bulk_update(), which builds a giant CASE WHEN expression for every batch
+    qn = connection.ops.quote_name
+    sql = (
+        f'UPDATE {qn(Result._meta.db_table)} '
+        f'SET {qn("runners_passed")} = %s, {qn("runners_passed_by")} = %s '
+        f'WHERE {qn("id")} = %s'
+    )
+    params = [(p, pb, row[0]) for p, pb, row in zip(passed, passed_by, rows)]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def load_data(filename, workers=None, batch_size=BATCH_SIZE, log=print):
+    '''Function to load data records from CSV file into the Django database.
+
+    The file is split into byte-range chunks that are parsed and validated
+    in a pool of worker processes (parsing the four time columns is the slow
+    part), while this process acts as the single writer, inserting the rows
+    with batched bulk_create calls in file order.
+    Returns the number of Results created and a list of (line, error) tuples
+    for the rows that were rejected.
+    '''
+
+    workers = workers or os.cpu_count() or 1
 
     ## very dangerous line! we use it here to clean out the data before adding records
     Result.objects.all().delete()
 
-    filename = '/Users/waynewang/Downloads/CS412/data/2023_chicago_results.csv'
-    f = open(filename, 'r') # open the file for reading
-
-    # discard headers by reading a line and doing nothing with it
-    f.readline()
-
-    # read several rows
-    # for i in range(5):
-        # line = f.readline()
-
-    # read the entire file, one line at a time
-    for line in f:
-        try:
-            fields = line.strip().split(',')
-
-            # print(fields)
-
-            # for j in range(len(fields)):
-            #     print(f'fields[{j}] = {fields[j]}')
-
-            # fields[0] = 6
-            # fields[1] = Seifu
-            # fields[2] = Tura Abdiwak
-            # fields[3] = ETH
-            # fields[4] = Addis Abeba
-            # fields[5] = Addis Abeba
-            # fields[6] = Male
-            # fields[7] = 25-29
-            # fields[8] = 5
-            # fields[9] = 5
-            # fields[10] = 2
-            # fields[11] = 7:30:02
-            # fields[12] = 9:35:31
-            # fields[13] = 2:05:29
-            # fields[14] = 1:02:21
-            # fields[15] = 1:03:08
-
-            # create a new instance of Result object with this record from CSV
-            result = Result(
-                bib=fields[0],
-                first_name=fields[1],
-                last_name=fields[2],
-                ctz = fields[3],
-                city = fields[4],
-                state = fields[5],
-                
-                gender = fields[6],
-                division = fields[7],
-
-                place_overall = fields[8],
-                place_gender = fields[9],
-                place_division = fields[10],
-            
-                start_time_of_day = fields[11],
-                finish_time_of_day = fields[12],
-                time_finish = fields[13],
-                time_half1 = fields[14],
-                time_half2 = fields[15],
-            )
-            result.save() # commit this result to the database!
-            # print(f'Created result {result}.') # commented out so it doesn't take 3 min to run lol
-
-        except:
-            print('Something went wrong!')
-            print(f'line={line}')
-
-    print(f'Done. Created {len(Result.objects.all())} results.')
\ No newline at end of file
+    start = time.perf_counter()
+
+    # a few chunks per worker keeps every process busy until the end
+    chunks = split_into_chunks(filename, workers * 4)
+    tasks = [(filename, chunk_start, chunk_end) for chunk_start, chunk_end in chunks]
+
+    created = 0
+    rejected = []
+    batch = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() hands back the chunks in file order as soon as each is ready
+        for rows, bad_rows in executor.map(parse_chunk, tasks):
+            rejected += bad_rows
+            batch += rows
+
+            while len(batch) >= batch_size:
+                created += save_results(batch[:batch_size])
+                batch = batch[batch_size:]
+
+                elapsed = time.perf_counter() - start
+                log(f'Created {created} results ({created / elapsed:.0f} rows/sec)')
+
+    # flush whatever is left over
+    if batch:
+        created += save_results(batch)
+
+    # precompute everyone's passed / passed by counts in one sweep,
+    # and the field-wide finish time distributions
+    update_passing_counts()
+    rebuild_finish_distributions()
+
+    elapsed = time.perf_counter() - start
+    rate = created / elapsed if elapsed else 0
+
+    log(f'Done. Created {created} results in {elapsed:.2f}s '
+        f'({rate:.0f} rows/sec) with {workers} workers, rejected {len(rejected)} lines.')
+
+    return created, rejected
+
+
+def finish_time_percentiles(group_by=('gender', 'division'), **filters):
+    '''Return the PERCENTILES of finish time (in seconds) for each group of
+    runners, computed entirely in the database. group_by is a list of
+    PERCENTILE_GROUPS columns and filters are exact matches on those same
+    columns (e.g. gender='F').
+
+    Each runner is numbered 1..n by finish time within their group (a window
+    function), and the p-th percentile is the fastest time whose number is
+    at least p% of n (the nearest-rank method), so only one row per group
+    comes back.
+    Returns a list of dicts holding the group values, 'runners', 'fastest',
+    'slowest', 'mean', and 'p10', 'p25', ... for each percentile.
+    '''
+
+    group_by = list(group_by)
+
+    for column in group_by + list(filters):
+        if column not in PERCENTILE_GROUPS:
+            raise ValueError(f'cannot group or filter percentiles by {column!r}')
+
+    qn = connection.ops.quote_name
+    columns = [qn(column) for column in group_by]
+
+    where = [f'{qn("finish_seconds")} IS NOT NULL']
+    params = []
+    for column, value in filters.items():
+        where.append(f'{qn(column)} = %s')
+        params.append(value)
+
+    partition = f'PARTITION BY {", ".join(columns)} ' if columns else ''
+    percentile_columns = ''.join(
+        f', MIN(CASE WHEN finish_rank * 100 >= runners * {p} THEN {qn("finish_seconds")} END) AS p{p}'
+        for p in PERCENTILES
+    )
+    select_groups = ''.join(f'{column}, ' for column in columns)
+    group_clause = f'GROUP BY {", ".join(columns)} ORDER BY {", ".join(columns)}' if columns else ''
+
+    sql = (
+        f'WITH ranked AS ('
+        f'SELECT {select_groups}{qn("finish_seconds")}, '
+        f'ROW_NUMBER() OVER ({partition}ORDER BY {qn("finish_seconds")}) AS finish_rank, '
+        f'COUNT(*) OVER ({partition.strip()}) AS runners '
+        f'FROM {qn(Result._meta.db_table)} WHERE {" AND ".join(where)}'
+        f') '
+        f'SELECT {select_groups}COUNT(*), MIN({qn("finish_seconds")}), '
+        f'MAX({qn("finish_seconds")}), AVG({qn("finish_seconds")}){percentile_columns} '
+        f'FROM ranked {group_clause}'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    names = group_by + ['runners', 'fastest', 'slowest', 'mean'] + [f'p{p}' for p in PERCENTILES]
+
+    # with no grouping, an empty table still gives back one row of NULLs
+    return [dict(zip(names, row)) for row in rows if row[len(group_by)]]
+
+
+def rebuild_finish_distributions():
+    '''Recompute the FinishDistribution of every gender/division, every
+    gender, and the whole field from the Results, replacing the old ones.
+    Returns the number of distributions built.
+    '''
+
+    # one pass over the finish times, already sorted by the database
+    rows = list(
+        Result.objects.filter(finish_seconds__isnull=False)
+        .order_by('finish_seconds')
+        .values_list('gender', 'division', 'finish_seconds')
+    )
+
+    # a blank division (or gender) would make the same key as the whole
+    # gender (or field), so those runners are only counted in the wider groups
+    groups = {('', ''): []}
+    for gender, division, seconds in rows:
+        if gender and division:
+            groups.setdefault((gender, division), []).append(seconds)
+        if gender:
+            groups.setdefault((gender, ''), []).append(seconds)
+        groups[('', '')].append(seconds)
+
+    with transaction.atomic():
+        version = (FinishDistribution.objects.aggregate(v=models.Max('version'))['v'] or 0) + 1
+
+        FinishDistribution.objects.all().delete()
+
+        distributions = []
+        for (gender, division), times in groups.items():
+            start, counts = finish_histogram(times)
+
+            distributions.append(FinishDistribution(
+                gender=gender, division=division, version=version,
+                runners=len(times), finish_seconds=times,
+                histogram_start=start, histogram=counts,
+                percentiles=percentile_table(times),
+            ))
+
+        FinishDistribution.objects.bulk_create(distributions)
+
+    return len(distributions)
+
+
+def get_finish_distributions(groups):
+    '''Return the sorted finish times and histograms of some groups of runners
+    (see FinishDistribution), given as (gender, division) pairs, as a dict
+    mapping each pair to a dict (or to None if it hasn't been built).
+    Only the groups' versions are read from the database each time, all in
+    one query; the (large) lists of finish times are kept in the cache until
+    the next rebuild.
+    '''
+
+    groups = list(groups)
+
+    matching = models.Q(pk__in=[])
+    for gender, division in groups:
+        matching |= models.Q(gender=gender, division=division)
+
+    versions = {
+        (gender, division): version
+        for gender, division, version in FinishDistribution.objects.filter(matching).values_list(
+            'gender', 'division', 'version',
+        )
+    }
+
+    keys = {
+        group: f'marathon_analytics:finish_distribution:{group[0]}:{group[1]}:{version}'
+        for group, version in versions.items()
+    }
+    cached = cache.get_many(keys.values())
+
+    distributions = {}
+
+    for group in groups:
+        if group not in keys:
+            distributions[group] = None
+            continue
+
+        distribution = cached.get(keys[group])
+
+        if distribution is None:
+            gender, division = group
+            distribution = FinishDistribution.objects.filter(gender=gender, division=division).values(
+                'gender', 'division', 'version', 'runners', 'finish_seconds',
+                'histogram_start', 'histogram', 'percentiles',
+            ).first()
+
+            # it could have been rebuilt in between; the next request will catch up
+            if distribution is not None:
+                cache.set(keys[group], distribution, DISTRIBUTION_TIMEOUT)
+
+        distributions[group] = distribution
+
+    return distributions
+
+
+def get_finish_distribution(gender='', division=''):
+    '''Return the sorted finish times and histogram of one group of runners
+    (see get_finish_distributions), or None if it hasn't been built.
+    '''
+
+    return get_finish_distributions([(gender, division)])[(gender, division)]
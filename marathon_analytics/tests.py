@@ -1,3 +1,566 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 # Create your tests here.
+
+import csv
+import io
+import os
+import random
+import statistics
+import tempfile
+import unittest
+from datetime import time
+from django.core.cache import cache
+from django.db import connection
+from unittest import mock
+from cs412.chart_cache import RenderedChartCache, chart_cache
+from cs412.pagination import NEXT, PREVIOUS, KeysetPaginator, encode_cursor
+from .loader import (
+    count_passes, parse_chunk, parse_row, percent_faster_than, percentile_table, split_into_chunks,
+)
+from .models import (
+    FIELD_NAMES, PERCENTILES, FinishDistribution, Result, finish_time_percentiles,
+    get_finish_distribution, load_data, rebuild_finish_distributions, update_passing_counts,
+)
+from .views import (
+    PLOTLYJS_URL, PREFIX_FIELDS, get_field_standing, prefix_filter, render_division_histogram,
+    search_results,
+)
+
+
+def make_result(**fields):
+    '''Create a Result with made up values for every field not given.'''
+
+    defaults = {
+        'bib': 1, 'first_name': 'Pat', 'last_name': 'Runner', 'ctz': 'USA',
+        'city': 'Chicago', 'state': 'IL', 'gender': 'F', 'division': '30-34',
+        'place_overall': 1, 'place_gender': 1, 'place_division': 1,
+        'start_time_of_day': time(7, 30), 'finish_time_of_day': time(11, 30),
+        'time_finish': time(4, 0), 'time_half1': time(2, 0), 'time_half2': time(2, 0),
+    }
+    defaults.update(fields)
+
+    return Result.objects.create(**defaults)
+
+
+def brute_force_passes(starts, finishes):
+    '''Count passes by comparing every pair of runners (what count_passes replaces).'''
+
+    n = len(starts)
+    passed = [sum(starts[j] < starts[i] and finishes[j] > finishes[i] for j in range(n)) for i in range(n)]
+    passed_by = [sum(starts[j] > starts[i] and finishes[j] < finishes[i] for j in range(n)) for i in range(n)]
+
+    return passed, passed_by
+
+
+# the header line of the Chicago Marathon results CSV file
+CSV_HEADER = (
+    'BIB,First Name,Last Name,CTZ,City,State,Gender,Division,Place Overall,'
+    'Place Gender,Place Division,Start TOD,Finish TOD,Finish,HALF1,HALF2'
+)
+
+
+def csv_row(bib, finish='3:59:58', half1='1:59:00', half2='2:00:58', gender='F', city='Chicago'):
+    '''Return the CSV fields of a made up runner.'''
+
+    return [
+        str(bib), f'First{bib}', f'Last{bib}', 'USA', city, 'IL', gender, '30-34',
+        str(bib), str(bib), str(bib), '7:30:00', '11:29:58', finish, half1, half2,
+    ]
+
+
+def write_results_csv(rows):
+    '''Write a results CSV file (header included) and return its path.'''
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+
+    with os.fdopen(fd, 'w', newline='') as f:
+        f.write(CSV_HEADER + '\r\n')
+        csv.writer(f).writerows(rows)
+
+    return path
+
+
+class ParseRowTests(SimpleTestCase):
+    '''Check that CSV rows are typed, and that bad ones are rejected.'''
+
+    def test_row_is_typed(self):
+        '''Numbers become ints, times become times, and the durations are derived.'''
+
+        values = dict(zip(FIELD_NAMES, parse_row(csv_row(7))))
+
+        self.assertEqual((values['bib'], values['place_overall']), (7, 7))
+        self.assertEqual(values['start_time_of_day'], time(7, 30))
+        self.assertEqual(values['time_finish'], time(3, 59, 58))
+        self.assertEqual((values['finish_seconds'], values['half1_seconds']), (14398, 7140))
+        self.assertEqual(values['split_delta_seconds'], 118)
+        self.assertEqual(values['pace_seconds'], 549)
+
+    def test_bad_rows_are_rejected(self):
+        '''Short rows, bad numbers, bad times and over-long genders raise ValueError.'''
+
+        bad_rows = [
+            csv_row(1)[:-1],
+            ['x'] + csv_row(1)[1:],
+            csv_row(1, finish='3:59'),
+            csv_row(1, half1='one hour'),
+            csv_row(1, gender='Unknown'),
+        ]
+
+        for fields in bad_rows:
+            with self.subTest(fields=fields), self.assertRaises(ValueError):
+                parse_row(fields)
+
+
+class ChunkedLoadTests(TestCase):
+    '''Check that the byte-range chunks cover every row exactly once, and that
+    the parallel load matches parsing the file in one go.
+    '''
+
+    def setUp(self):
+        '''Write a results file whose rows vary in length (one has a quoted
+        comma, and two are bad).
+        '''
+
+        rows = [csv_row(bib, city='Chicago' + 'o' * (bib % 7)) for bib in range(1, 41)]
+        rows[5] = csv_row(6, city='Oak Park, West')
+        rows[12] = csv_row(13, finish='bad')
+        rows[30] = csv_row(31)[:5]
+
+        self.path = write_results_csv(rows)
+        self.addCleanup(os.remove, self.path)
+
+        # what parsing the whole file in this process gives
+        with open(self.path, newline='') as f:
+            reader = csv.reader(f)
+            next(reader)
+
+            self.expected = []
+            for fields in reader:
+                try:
+                    self.expected.append(parse_row(fields))
+                except ValueError:
+                    pass
+
+    def test_chunks_split_on_line_boundaries(self):
+        '''For any number of chunks, the chunks are contiguous, start on new
+        lines and parse to the same rows as the whole file.
+        '''
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        header_end = data.index(b'\n') + 1
+
+        for num_chunks in (1, 2, 3, 7, 40, 500):
+            with self.subTest(num_chunks=num_chunks):
+                chunks = split_into_chunks(self.path, num_chunks)
+
+                self.assertEqual(chunks[0][0], header_end)
+                self.assertEqual(chunks[-1][1], len(data))
+                self.assertTrue(all(end == start for (_, end), (start, _) in zip(chunks, chunks[1:])))
+                self.assertTrue(all(data[start - 1:start] == b'\n' for start, _ in chunks))
+
+                rows, rejected = [], []
+                for start, end in chunks:
+                    chunk_rows, chunk_rejected = parse_chunk((self.path, start, end))
+                    rows += chunk_rows
+                    rejected += chunk_rejected
+
+                self.assertEqual(rows, self.expected)
+                self.assertEqual(len(rejected), 2)
+
+    def test_parallel_load_matches_single_process_parse(self):
+        '''load_data() with worker processes stores exactly the rows parsed
+        in one go, in small batches, and reports the bad ones.
+        '''
+
+        created, rejected = load_data(self.path, workers=2, batch_size=3, log=lambda message: None)
+
+        self.assertEqual(created, 38)
+        self.assertEqual(len(rejected), 2)
+        self.assertEqual(list(Result.objects.order_by('bib').values_list(*FIELD_NAMES)), self.expected)
+
+
+class CountPassesTests(SimpleTestCase):
+    '''Check the O(n log n) passing counts against comparing every pair.'''
+
+    def test_matches_brute_force(self):
+        '''Random fields (with lots of tied start and finish times) agree with brute force.'''
+
+        rng = random.Random(412)
+
+        for _ in range(200):
+            n = rng.randint(0, 40)
+
+            # small ranges of times, so plenty of runners tie
+            starts = [rng.randint(0, 5) for _ in range(n)]
+            finishes = [rng.randint(0, 10) for _ in range(n)]
+
+            self.assertEqual(count_passes(starts, finishes), brute_force_passes(starts, finishes))
+
+
+class UpdatePassingCountsTests(TestCase):
+    '''Check that the stored passing counts match the per-runner queries.'''
+
+    def test_matches_queries(self):
+        '''Every runner's stored counts equal what the fallback queries count.'''
+
+        rng = random.Random(412)
+
+        for bib in range(30):
+            make_result(
+                bib=bib,
+                start_time_of_day=time(7, rng.randint(0, 3) * 10),
+                finish_time_of_day=time(rng.randint(10, 12), rng.choice([0, 30])),
+            )
+
+        update_passing_counts()
+
+        for result in Result.objects.all():
+            stored = (result.runners_passed, result.runners_passed_by)
+
+            # with the stored counts cleared, the getters fall back to querying
+            result.runners_passed = result.runners_passed_by = None
+            self.assertEqual(stored, (result.get_runners_passed(), result.get_runners_passed_by()))
+
+
+class ResultSearchTests(TestCase):
+    '''Check the case-insensitive prefix searches, and that they use the indexes.'''
+
+    def setUp(self):
+        '''Create a few runners with differently cased names and cities.'''
+
+        make_result(bib=1, first_name='Jo', last_name='Smith', city='Chicago')
+        make_result(bib=2, first_name='JOHN', last_name='smithers', city='chicago heights')
+        make_result(bib=3, first_name='Ann', last_name='Smyth', city='Zürich')
+
+    def search_bibs(self, **params):
+        '''Return the bibs of the runners that search_results() finds.'''
+
+        return sorted(search_results(Result.objects.all(), params).values_list('bib', flat=True))
+
+    def test_prefixes_ignore_case(self):
+        '''Prefixes match whatever the case of the prefix or the value.'''
+
+        self.assertEqual(self.search_bibs(last_name='SMITH'), [1, 2])
+        self.assertEqual(self.search_bibs(first_name='jo', city='CHI'), [1, 2])
+        self.assertEqual(self.search_bibs(last_name='smy'), [3])
+
+    def test_non_ascii_prefixes(self):
+        '''Prefixes that aren't plain ASCII still match (and never crash).'''
+
+        self.assertEqual(self.search_bibs(city='Zü'), [3])
+        self.assertEqual(self.search_bibs(city='Z\U0010ffff'), [])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'checks SQLite query plans')
+    def test_prefix_searches_use_lower_indexes(self):
+        '''Each prefix search is an index search over the field's Lower() index.'''
+
+        for field in PREFIX_FIELDS:
+            with self.subTest(field=field):
+                plan = prefix_filter(Result.objects.all(), field, 'Ab').explain()
+
+                self.assertIn(f'SEARCH marathon_analytics_result USING INDEX result_{field}_lower_idx', plan)
+
+
+class PercentFasterThanTests(SimpleTestCase):
+    '''Check the binary search that places a runner in a sorted list of times.'''
+
+    def test_counts_strictly_slower_others(self):
+        '''Ties don't count as slower, and the runner isn't compared with themself.'''
+
+        times = [100, 200, 200, 300, 400]
+
+        self.assertEqual(percent_faster_than(times, 100), 100)
+        self.assertEqual(percent_faster_than(times, 200), 50)
+        self.assertEqual(percent_faster_than(times, 400), 0)
+
+    def test_alone(self):
+        '''A runner with nobody else in their group can't be placed.'''
+
+        self.assertIsNone(percent_faster_than([100], 100))
+
+
+class FieldStandingTests(TestCase):
+    '''Check the precomputed finish distributions and the standings read from them.'''
+
+    def setUp(self):
+        '''Create runners in two divisions (and one with no division), and
+        build the distributions.
+        '''
+
+        # every test database starts back at version 1, so forget earlier tests' copies
+        cache.clear()
+        chart_cache.clear()
+
+        self.runners = [
+            make_result(bib=1, gender='F', division='30-34', finish_seconds=3 * 3600),
+            make_result(bib=2, gender='F', division='30-34', finish_seconds=4 * 3600),
+            make_result(bib=3, gender='F', division='35-39', finish_seconds=5 * 3600),
+            make_result(bib=4, gender='F', division='', finish_seconds=6 * 3600),
+            make_result(bib=5, gender='M', division='30-34', finish_seconds=2 * 3600),
+        ]
+
+        rebuild_finish_distributions()
+
+    def test_blank_division_is_only_counted_once(self):
+        '''A runner with a blank division counts once towards their gender.'''
+
+        self.assertEqual(get_finish_distribution('F')['runners'], 4)
+        self.assertEqual(get_finish_distribution()['runners'], 5)
+        self.assertEqual(FinishDistribution.objects.count(), 6)
+
+    def test_standing(self):
+        '''A runner is placed in their division, their gender and the field.'''
+
+        standing = get_field_standing(self.runners[1])
+
+        self.assertEqual(standing['faster_than_division'], 0)
+        self.assertAlmostEqual(standing['faster_than_gender'], 200 / 3)
+        self.assertEqual(standing['faster_than_overall'], 50)
+
+    def test_standing_without_division(self):
+        '''A runner with a blank division is only placed in their gender and the field.'''
+
+        standing = get_field_standing(self.runners[3])
+
+        self.assertNotIn('faster_than_division', standing)
+        self.assertEqual(standing['faster_than_gender'], 0)
+        self.assertEqual(standing['faster_than_overall'], 0)
+
+
+class KeysetPaginatorTests(TestCase):
+    '''Check paging forwards and backwards by keyset, and stale cursors.'''
+
+    def setUp(self):
+        '''Create five runners, paged two at a time by bib.'''
+
+        for bib in range(1, 6):
+            make_result(bib=bib)
+
+        self.paginator = KeysetPaginator(Result.objects.all(), 2, 'bib')
+
+    def bibs(self, page):
+        '''Return the bibs on a page.'''
+
+        return [result.bib for result in page]
+
+    def test_first_page(self):
+        '''The first page has a next page but no previous one.'''
+
+        page = self.paginator.page()
+
+        self.assertEqual(self.bibs(page), [1, 2])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.previous_cursor())
+
+    def test_forwards_to_the_last_page_and_back(self):
+        '''Following the cursors walks every page, both ways.'''
+
+        second = self.paginator.page(self.paginator.page().next_cursor())
+        last = self.paginator.page(second.next_cursor())
+
+        self.assertEqual(self.bibs(second), [3, 4])
+        self.assertEqual(self.bibs(last), [5])
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+        self.assertIsNone(last.next_cursor())
+
+        back = self.paginator.page(last.previous_cursor())
+        self.assertEqual(self.bibs(back), [3, 4])
+        self.assertTrue(back.has_next())
+        self.assertTrue(back.has_previous())
+
+        first = self.paginator.page(back.previous_cursor())
+        self.assertEqual(self.bibs(first), [1, 2])
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+
+    def test_stale_cursors_fall_back_to_the_first_page(self):
+        '''A cursor pointing past either end of the rows gets the first page.'''
+
+        for cursor in (encode_cursor(NEXT, [999]), encode_cursor(PREVIOUS, [0])):
+            with self.subTest(cursor=cursor):
+                page = self.paginator.page(cursor)
+
+                self.assertEqual(self.bibs(page), [1, 2])
+                self.assertFalse(page.has_previous())
+
+                response = self.client.get('/marathon_analytics/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+    def test_empty_page(self):
+        '''With no rows at all, a page is empty and has no neighbours.'''
+
+        paginator = KeysetPaginator(Result.objects.none(), 2, 'bib')
+
+        for page in (paginator.page(), paginator.page(encode_cursor(NEXT, [3]))):
+            self.assertEqual(self.bibs(page), [])
+            self.assertFalse(page.has_other_pages())
+            self.assertIsNone(page.next_cursor())
+            self.assertIsNone(page.previous_cursor())
+
+
+class FinishPercentilesTests(TestCase):
+    '''Check the percentiles of finish time worked out in SQL.'''
+
+    def setUp(self):
+        '''Create 101 women and 37 men with random (distinct) finish times.'''
+
+        rng = random.Random(412)
+        seconds = rng.sample(range(2 * 3600, 6 * 3600), 138)
+
+        self.times = {'F': sorted(seconds[:101]), 'M': sorted(seconds[101:])}
+
+        for bib, finish in enumerate(seconds):
+            make_result(bib=bib, gender='F' if bib < 101 else 'M', finish_seconds=finish)
+
+    def test_matches_statistics_quantiles(self):
+        '''With 101 runners, nearest-rank percentiles land exactly on the
+        points that statistics.quantiles() interpolates between, so the two agree.
+        '''
+
+        (women,) = finish_time_percentiles(['gender'], gender='F')
+        quantiles = statistics.quantiles(self.times['F'], n=100, method='inclusive')
+
+        self.assertEqual(women['runners'], 101)
+        self.assertEqual((women['fastest'], women['slowest']), (self.times['F'][0], self.times['F'][-1]))
+        self.assertAlmostEqual(women['mean'], statistics.mean(self.times['F']))
+
+        for p in PERCENTILES:
+            self.assertEqual(women[f'p{p}'], quantiles[p - 1])
+
+    def test_groups_match_nearest_rank(self):
+        '''Every group (and the whole field) gets its own nearest-rank percentiles.'''
+
+        groups = {row['gender']: row for row in finish_time_percentiles(['gender'])}
+        (field,) = finish_time_percentiles([])
+
+        everyone = sorted(self.times['F'] + self.times['M'])
+
+        for gender, row in list(groups.items()) + [('', field)]:
+            with self.subTest(gender=gender):
+                table = percentile_table(self.times[gender] if gender else everyone)
+
+                self.assertEqual([row[f'p{p}'] for p in PERCENTILES], [table[p] for p in PERCENTILES])
+
+    def test_view(self):
+        '''The endpoint returns the same rows as JSON, and rejects bad groupings.'''
+
+        response = self.client.get('/marathon_analytics/percentiles', {'group_by': 'gender', 'gender': 'M'})
+
+        self.assertEqual(response.json(), {
+            'group_by': ['gender'],
+            'groups': finish_time_percentiles(['gender'], gender='M'),
+        })
+        self.assertEqual(response.json()['groups'][0]['runners'], 37)
+
+        response = self.client.get('/marathon_analytics/percentiles', {'group_by': 'city'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RenderedChartCacheTests(SimpleTestCase):
+    '''Check the size-capped LRU of rendered charts.'''
+
+    def test_least_recently_used_is_evicted(self):
+        '''Going over the cap evicts whatever was used longest ago.'''
+
+        charts = RenderedChartCache(max_bytes=10)
+
+        charts.add('a', {'div': 'aaaa'})
+        charts.add('b', {'div': 'bbbb'})
+
+        # using a makes b the least recently used
+        self.assertEqual(charts.get_or_render('a', lambda: self.fail('a was cached')), {'div': 'aaaa'})
+        charts.add('c', {'div': 'cccc'})
+
+        self.assertEqual(list(charts.entries), ['a', 'c'])
+        self.assertEqual(charts.size, 8)
+
+    def test_size_is_kept_right(self):
+        '''Replacing an entry counts its new size, and oversized entries aren't kept.'''
+
+        charts = RenderedChartCache(max_bytes=10)
+
+        charts.add('a', {'div': 'aaaa'})
+        charts.add('a', {'div': 'aa', 'other': 'aa'})
+        charts.add('huge', {'div': 'x' * 11})
+
+        self.assertEqual(list(charts.entries), ['a'])
+        self.assertEqual(charts.size, 4)
+
+        charts.clear()
+        self.assertEqual((list(charts.entries), charts.size), ([], 0))
+
+
+class ResultChartTests(TestCase):
+    '''Check the charts on the result page, and when the shared ones are re-rendered.'''
+
+    def setUp(self):
+        '''Create a division of three runners and build the distributions.'''
+
+        cache.clear()
+        chart_cache.clear()
+
+        self.runners = [
+            make_result(bib=bib, finish_seconds=(3 + bib) * 3600, runners_passed=0, runners_passed_by=0)
+            for bib in range(3)
+        ]
+
+        rebuild_finish_distributions()
+
+    def get_page(self, runner):
+        '''Return the result page of a runner.'''
+
+        return self.client.get(f'/marathon_analytics/result/{runner.pk}')
+
+    def test_plotly_is_loaded_once(self):
+        '''The page loads plotly.js from one script tag instead of in every chart.'''
+
+        content = self.get_page(self.runners[0]).content.decode()
+
+        self.assertEqual(content.count(PLOTLYJS_URL), 1)
+        self.assertEqual(content.count('Plotly.newPlot'), 3)
+        self.assertLess(len(content), 100_000)
+
+    def test_histogram_is_shared_until_a_rebuild(self):
+        '''Every runner in the division gets the same cached histogram, until
+        the distributions are rebuilt.
+        '''
+
+        with mock.patch(
+            'marathon_analytics.views.render_division_histogram', wraps=render_division_histogram,
+        ) as render:
+            for runner in self.runners:
+                self.get_page(runner)
+            self.assertEqual(render.call_count, 1)
+
+            rebuild_finish_distributions()
+
+            self.get_page(self.runners[0])
+            self.assertEqual(render.call_count, 2)
+
+    def test_standing_reads_the_versions_once(self):
+        '''Once the distributions are cached, placing a runner in all three
+        groups costs a single query, for their versions.
+        '''
+
+        get_field_standing(self.runners[0])
+
+        with self.assertNumQueries(1):
+            standing = get_field_standing(self.runners[1])
+
+        self.assertEqual(standing['faster_than_division'], standing['faster_than_overall'])
+
+    def test_division_percentiles_are_shown(self):
+        '''The page shows the division's finish times at the PERCENTILES.'''
+
+        response = self.get_page(self.runners[0])
+
+        self.assertEqual(response.context['division_percentiles'], [
+            (10, time(3, 0)), (25, time(3, 0)), (50, time(4, 0)), (75, time(5, 0)), (90, time(5, 0)),
+        ])
+        self.assertContains(response, '<th>50th percentile</th>')
+        self.assertContains(response, '<td>04:00:00</td>')
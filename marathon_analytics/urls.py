@@ -8,4 +8,5 @@ urlpatterns = [
 	path(r'', views.ResultsListView.as_view(), name='home'),
     path(r'results', views.ResultsListView.as_view(), name='results_list'),
     path(r'result/<int:pk>', views.ResultDetailView.as_view(), name='result_detail'),
+    path(r'percentiles', views.FinishPercentilesView.as_view(), name='finish_percentiles'),
 ]
\ No newline at end of file
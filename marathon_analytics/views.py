@@ -2,17 +2,35 @@
 
 from django.db.models.query import QuerySet
 from django.shortcuts import render
-from django.views.generic import ListView, DetailView
-from . models import Result
+from django.http import JsonResponse
+from django.views.generic import ListView, DetailView, View
+from . models import (
+    Result, PERCENTILES, PERCENTILE_GROUPS, finish_time_percentiles, get_finish_distributions,
+)
+from . loader import HISTOGRAM_BUCKET_SECONDS, percent_faster_than
+from . forms import ResultSearchForm
+from django.db.models.functions import Lower
+from datetime import time
 
 # import plotly library for graphing
 import plotly
 import plotly.graph_objects as go
 
+from cs412.chart_cache import chart_cache
+from cs412.pagination import KeysetPaginationMixin
+
 # Create your views here.
 
-class ResultsListView(ListView):
-    """View to display marathon results."""
+# where the result page loads plotly.js from
+PLOTLYJS_URL = f'https://cdn.plot.ly/plotly-{plotly.offline.get_plotlyjs_version()}.min.js'
+
+# search fields matched case-insensitively by prefix, and matched exactly
+PREFIX_FIELDS = ['first_name', 'last_name', 'city']
+EXACT_FIELDS = ['gender', 'division', 'state', 'ctz']
+
+
+class ResultsListView(KeysetPaginationMixin, ListView):
+    """View to display marathon results, paged by primary key (?cursor=...)."""
 
     model = Result
     template_name = 'marathon_analytics/results.html'
@@ -22,7 +40,7 @@ class ResultsListView(ListView):
     paginate_by = 25
 
     def get_queryset(self):
-        """Limit the result queryset (for now)."""
+        """Filter the results by whatever search parameters were submitted."""
 
         # get all the results
         results = super().get_queryset()
@@ -30,15 +48,95 @@ class ResultsListView(ListView):
         # slice to only return first 25 records
         # return results[:25]
 
-        # look for URL parameters to filter by:
-        if 'city' in self.request.GET:
-            city = self.request.GET['city']
+        # look for URL parameters to filter by (ignoring any that don't validate)
+        form = ResultSearchForm(self.request.GET)
+        form.is_valid()
 
-            if city:
-                results = results.filter(city=city)
+        return search_results(results, form.cleaned_data)
+
+    def get_context_data(self, **kwargs):
+        """Add the submitted search values to the context, to refill the search form."""
+
+        context = super().get_context_data(**kwargs)
+        context['search'] = self.request.GET
+
+        return context
+
+
+def prefix_filter(results, field, prefix):
+    """Filter results to those whose field starts with prefix, ignoring case.
+
+    This is written as a range over LOWER(field) (prefix <= value < next prefix)
+    rather than as LIKE/istartswith, so the database can answer it with an
+    index range scan over the functional lower-case index.
+    """
+
+    # SQLite's LOWER() only folds ASCII letters, so for anything else it
+    # wouldn't agree with Python's lower(); match those with LIKE instead
+    # (this also covers a last character like U+10FFFF that has nothing after it)
+    if not prefix.isascii():
+        return results.filter(**{f'{field}__istartswith': prefix})
+
+    prefix = prefix.lower()
+
+    # the smallest string that sorts after every string starting with prefix
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    alias = f'{field}_lower'
+
+    return results.alias(**{alias: Lower(field)}).filter(**{
+        f'{alias}__gte': prefix,
+        f'{alias}__lt': upper,
+    })
+
+
+def search_results(results, params):
+    """Filter the results queryset by the cleaned data of a ResultSearchForm."""
+
+    for field in PREFIX_FIELDS:
+        if params.get(field):
+            results = prefix_filter(results, field, params[field])
+
+    for field in EXACT_FIELDS:
+        if params.get(field):
+            results = results.filter(**{field: params[field]})
+
+    if params.get('min_finish'):
+        results = results.filter(time_finish__gte=params['min_finish'])
+
+    if params.get('max_finish'):
+        results = results.filter(time_finish__lte=params['max_finish'])
+
+    return results
+
+
+class FinishPercentilesView(View):
+    """View to return percentiles of finish time (in seconds) as JSON, computed
+    in the database. ?group_by=gender,division picks the grouping (the
+    default; an empty value gives one row for the whole field), and
+    ?gender=... / ?division=... limit which runners are included.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Respond to a GET request with one row of percentiles per group."""
+
+        group_by = request.GET.get('group_by', 'gender,division')
+        group_by = [column for column in group_by.split(',') if column]
+
+        # only filter by the parameters that were actually filled in
+        filters = {
+            column: request.GET[column]
+            for column in PERCENTILE_GROUPS
+            if request.GET.get(column)
+        }
+
+        try:
+            groups = finish_time_percentiles(group_by, **filters)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse({'group_by': group_by, 'groups': groups})
 
-        return results
-    
 
 class ResultDetailView(DetailView):
     """Display results for a single runner."""
@@ -54,56 +152,161 @@ class ResultDetailView(DetailView):
 
         r = context['r'] # Result for one runner
 
-        # create a graph of first half / second half time as pie chart
-        first_half_seconds = (r.time_half1.hour * 60 + r.time_half1.minute) * 60 + r.time_half1.second
-        second_half_seconds = (r.time_half2.hour * 60 + r.time_half2.minute) * 60 + r.time_half2.second
-
-        print(f'r={r}; first_half_seconds={first_half_seconds}; second_half_seconds={second_half_seconds}')
-
-        # create the plotly graph object:
-        labels = ['first_half_seconds', 'second_half_seconds']
-        values = [first_half_seconds, second_half_seconds]
-
-        # generate the Pie chart:
-        fig = go.Pie(labels=labels, values=values)
-        title_text = 'Half Marathon Splits (seconds)'
-
-        # obtain the graph as an HTML div (returns a string containing HTML code)
-        graph_div_splits = plotly.offline.plot(
-            {
-                'data': [fig],
-                'layout_title_text': title_text,
-            },
-            auto_open=False,
-            output_type='div',
-        )
-
-        # add pie chart to context
-        context['graph_div_splits'] = graph_div_splits
-
-        # create a bar chart with count of runners passed/passed by
-        x = [
-            f'Runners Passed by {r.first_name}',
-            f'Runners who Passed {r.first_name}',
-        ]
-        y = [
-            r.get_runners_passed(),
-            r.get_runners_passed_by(),
-        ]
-
-        fig = go.Bar(x=x, y=y)
-        title_text = 'Runners Passed/Passed By'
-
-        graph_div_passed = plotly.offline.plot(
-            {
-                'data': fig,
-                'layout_title_text': title_text,
-            },
-            auto_open=False,
-            output_type='div',
-        )
-
-        # add bar chart to context
-        context['graph_div_passed'] = graph_div_passed
-
-        return context
\ No newline at end of file
+        # the page loads plotly.js once (the same version plotly renders for),
+        # so the divs only hold their figures' data
+        context['plotlyjs_url'] = PLOTLYJS_URL
+
+        # this runner's own charts are small without plotly.js, and nobody
+        # else shares them, so they're rendered every time rather than cached
+        context.update(render_result_graphs(r))
+
+        # where this runner stands in their division, gender, and the whole field
+        context.update(get_field_standing(r))
+
+        return context
+    
+
+def get_field_standing(r):
+    """Work out what percentage of their division, their gender, and the whole
+    field a runner finished faster than, from the precomputed (and cached)
+    FinishDistributions, plus a histogram of their division's finish times
+    and its finish times at the PERCENTILES.
+    """
+
+    standing = {}
+
+    # results loaded before the durations were stored can't be placed
+    if r.finish_seconds is None:
+        return standing
+
+    # a blank gender/division has no group of its own (its key would be the
+    # wider group's), so such runners are only placed in the wider groups
+    groups = {'overall': ('', '')}
+
+    if r.gender:
+        groups['gender'] = (r.gender, '')
+
+        if r.division:
+            groups['division'] = (r.gender, r.division)
+
+    # one query for all the groups' versions; the rest comes from the cache
+    distributions = get_finish_distributions(groups.values())
+
+    for name, (gender, division) in groups.items():
+        distribution = distributions[(gender, division)]
+
+        if distribution is not None:
+            # binary search over the sorted times instead of a COUNT query
+            standing[f'faster_than_{name}'] = percent_faster_than(
+                distribution['finish_seconds'], r.finish_seconds,
+            )
+
+            if name == 'division':
+                # the division's finish times at a few percentiles, to compare with
+                standing['division_percentiles'] = [
+                    (p, seconds_to_time(distribution['percentiles'][p])) for p in PERCENTILES
+                ]
+
+                # the histogram is the same for everyone in the division, so
+                # it's cached per division (and rebuild), not per runner
+                key = ('marathon_analytics:histogram', gender, division, distribution['version'])
+                standing.update(chart_cache.get_or_render(
+                    key, lambda: render_division_histogram(distribution),
+                ))
+
+    return standing
+
+
+def seconds_to_time(seconds):
+    """Turn a number of seconds (under a day) into a datetime.time to display."""
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return time(hours, minutes, seconds)
+
+
+def render_division_histogram(distribution):
+    """Render a bar chart of a FinishDistribution's histogram, returned as a
+    dict holding the HTML div.
+    """
+
+    # label each bucket with the finish time (in minutes) that it starts at
+    start = distribution['histogram_start']
+    x = [
+        (start + i * HISTOGRAM_BUCKET_SECONDS) / 60
+        for i in range(len(distribution['histogram']))
+    ]
+
+    fig = go.Bar(x=x, y=distribution['histogram'])
+    title_text = f'Finish Times in {distribution["gender"]} {distribution["division"]} (minutes)'
+
+    graph_div_histogram = plotly.offline.plot(
+        {
+            'data': fig,
+            'layout_title_text': title_text,
+        },
+        auto_open=False,
+        output_type='div',
+        include_plotlyjs=False,
+    )
+
+    return {'graph_div_histogram': graph_div_histogram}
+
+
+def render_result_graphs(r):
+    """Render the split times pie chart and the runners passed/passed by 
+    bar chart for a single Result, returned as a dict of HTML divs.
+    """
+
+    # create a graph of first half / second half time as pie chart
+    # (the durations in seconds are worked out once, when the results are loaded)
+    first_half_seconds = r.half1_seconds
+    second_half_seconds = r.half2_seconds
+
+    # create the plotly graph object:
+    labels = ['first_half_seconds', 'second_half_seconds']
+    values = [first_half_seconds, second_half_seconds]
+
+    # generate the Pie chart:
+    fig = go.Pie(labels=labels, values=values)
+    title_text = 'Half Marathon Splits (seconds)'
+
+    # obtain the graph as an HTML div (returns a string containing HTML code)
+    graph_div_splits = plotly.offline.plot(
+        {
+            'data': [fig],
+            'layout_title_text': title_text,
+        },
+        auto_open=False,
+        output_type='div',
+        include_plotlyjs=False,
+    )
+
+    # create a bar chart with count of runners passed/passed by
+    x = [
+        f'Runners Passed by {r.first_name}',
+        f'Runners who Passed {r.first_name}',
+    ]
+    y = [
+        r.get_runners_passed(),
+        r.get_runners_passed_by(),
+    ]
+
+    fig = go.Bar(x=x, y=y)
+    title_text = 'Runners Passed/Passed By'
+
+    graph_div_passed = plotly.offline.plot(
+        {
+            'data': fig,
+            'layout_title_text': title_text,
+        },
+        auto_open=False,
+        output_type='div',
+        include_plotlyjs=False,
+    )
+
+    return {
+        'graph_div_splits': graph_div_splits,
+        'graph_div_passed': graph_div_passed,
+    }
@@ -11,4 +11,5 @@ admin.site.register(Post)
 admin.site.register(Photo)
 admin.site.register(Follow)
 admin.site.register(Comment)
-admin.site.register(Like)
\ No newline at end of file
+admin.site.register(Like)
+admin.site.register(TimelineEntry)
\ No newline at end of file
@@ -0,0 +1,139 @@
+# File: mini_insta/graph.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: A cached adjacency index of the Mini Insta follow graph, and
+# the "people you may know" suggestions worked out from it.
+#
+# Each Profile's set of followed Profiles is cached under that Profile's
+# follow_version, a random token stored in the database and replaced (in the
+# same transaction) whenever the Profile follows or unfollows someone. A cache
+# entry is never deleted, just no longer asked for, so every process (each
+# with its own cache) sees a follow as soon as it's committed, and a reader
+# racing with a follow can only ever write the old edges under the old version.
+
+from collections import Counter
+from uuid import uuid4
+from django.core.cache import cache
+from .models import Follow, Profile
+
+# how long (in seconds) to cache each Profile's adjacency set for; a follow
+# or unfollow moves the Profile on to a new version right away anyway
+FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+
+# how far (in follows) the suggestions search goes out from a Profile, and
+# the most Profiles it will expand along the way, so a Profile that follows
+# (or is followed by) thousands of others can't make a request slow
+SUGGESTION_DEPTH = 2
+SUGGESTION_MAX_EXPANDED = 200
+
+
+def following_key(pk, version):
+    """Return the cache key of the set of Profile PKs that Profile pk follows
+    (as of the given follow_version of it).
+    """
+
+    return f'mini_insta:follow_graph:following:{pk}:{version}'
+
+
+def get_following_id_sets(versions):
+    """Given a dict of {Profile PK: its follow_version}, return a dict of
+    {Profile PK: the set of PKs of the Profiles it follows}, from the cache
+    where they're there, and otherwise with one query for all the rest
+    (which are then cached).
+    """
+
+    keys = {pk: following_key(pk, version) for pk, version in versions.items()}
+    cached = cache.get_many(keys.values())
+
+    sets = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in sets]
+
+    if missing:
+        loaded = {pk: set() for pk in missing}
+
+        for follower, followed in Follow.objects.filter(follower_profile__in=missing).values_list(
+            'follower_profile', 'profile',
+        ):
+            loaded[follower].add(followed)
+
+        cache.set_many({keys[pk]: following for pk, following in loaded.items()}, FOLLOW_GRAPH_TIMEOUT)
+        sets.update(loaded)
+
+    return sets
+
+
+def get_following_ids(pk, version=None):
+    """Return the set of PKs of the Profiles that Profile pk follows (see
+    get_following_id_sets). Pass the Profile's follow_version if it's
+    already loaded; otherwise it's read from the database.
+    """
+
+    if version is None:
+        version = Profile.objects.filter(pk=pk).values_list('follow_version', flat=True).first() or ''
+
+    return get_following_id_sets({pk: version})[pk]
+
+
+def follows(follower_pk, pk):
+    """Return whether Profile follower_pk follows Profile pk (a set lookup)."""
+
+    return pk in get_following_ids(follower_pk)
+
+
+def follow_changed(follower):
+    """Move a Profile that just followed or unfollowed someone on to a new
+    follow_version, so its cached follows are reloaded the next time they're
+    needed (in every process); the rest of the graph stays cached.
+    Call it in the same transaction as the change to the Follows.
+    """
+
+    # a fresh token, not a count: a version that was rolled back (or written
+    # back by a stale save) must never come back with other follows under it
+    version = uuid4().hex
+    Profile.objects.filter(pk=follower.pk).update(follow_version=version)
+
+    # keep this instance in step with the database
+    follower.follow_version = version
+    follower.__dict__.pop('_following_ids', None)
+
+
+def suggest_profile_ids(pk, limit=10):
+    """Return up to limit PKs of Profiles that Profile pk may know, best first.
+
+    Starting from the Profiles that pk follows, this runs a breadth-first
+    search out along the follow edges (at most SUGGESTION_DEPTH follows away,
+    expanding at most SUGGESTION_MAX_EXPANDED Profiles), scoring every
+    Profile it reaches that pk doesn't already follow by how many of the
+    Profiles on the level before it follow them. Closer Profiles rank first,
+    then higher scores, then lower PKs. Each level's follows are looked up
+    all at once.
+    Returns a list of (pk, score) tuples.
+    """
+
+    following = get_following_ids(pk)
+
+    seen = {pk} | following
+    frontier = sorted(following)
+    expanded = 0
+    suggestions = []
+
+    for _ in range(SUGGESTION_DEPTH - 1):
+        nodes = frontier[:SUGGESTION_MAX_EXPANDED - expanded]
+        expanded += len(nodes)
+
+        versions = dict(Profile.objects.filter(pk__in=nodes).values_list('pk', 'follow_version'))
+
+        scores = Counter()
+        for node_following in get_following_id_sets(versions).values():
+            scores.update(other for other in node_following if other not in seen)
+
+        # everything on this level beats everything further away
+        level = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        suggestions += level
+
+        if len(suggestions) >= limit or not level or expanded >= SUGGESTION_MAX_EXPANDED:
+            break
+
+        seen.update(scores)
+        frontier = [node for node, _ in level]
+
+    return suggestions[:limit]
@@ -0,0 +1,119 @@
+# File: mini_insta/images.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Generates the resized, re-encoded renditions of uploaded Photos
+# (see Photo.get_image_url) in background threads, so uploading a Post
+# doesn't wait for the images to be processed. The queue is in memory, so
+# jobs still waiting when the process stops are lost: their Photos are served
+# the original image until `python manage.py generate_renditions` retries them.
+
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from .models import Photo, RENDITIONS
+
+logger = logging.getLogger(__name__)
+
+# renditions are saved as progressive JPEGs at this quality
+JPEG_QUALITY = 85
+
+# the background worker threads that generate renditions
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mini_insta_images')
+
+
+def rendition_name(name, size):
+    """Return the file name to store the size rendition of the image called name under."""
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+
+    return f'renditions/{size}/{stem}.jpg'
+
+
+def render(image, max_side):
+    """Return image shrunk to fit in a max_side square (never enlarged) and
+    encoded as a JPEG, as bytes.
+    """
+
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    # JPEGs have no transparency, so flatten anything transparent onto white
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    return output.getvalue()
+
+
+def generate_renditions(photo_pk):
+    """Generate and save every rendition of one Photo's uploaded image file.
+    Does nothing for Photos that only have an image URL (or were deleted).
+    """
+
+    try:
+        photo = Photo.objects.filter(pk=photo_pk).first()
+
+        if photo is None or not photo.image_file:
+            return
+
+        with photo.image_file.open('rb') as f:
+            image = Image.open(f)
+
+            # turn phone photos the right way up before their EXIF data is lost
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+        storage = photo.image_file.storage
+        names = {}
+
+        for size, max_side in RENDITIONS.items():
+            name = rendition_name(photo.image_file.name, size)
+            names[f'{size}_file'] = storage.save(name, ContentFile(render(image, max_side)))
+
+        # only touch the rendition columns, in case the Photo changed meanwhile
+        Photo.objects.filter(pk=photo_pk).update(**names)
+
+        # an update() sends no signals, so release any renditions replaced here ourselves
+        storage.release([
+            getattr(photo, field_name).name for field_name, name in names.items()
+            if getattr(photo, field_name).name != name
+        ])
+
+    except Exception:
+        # the original image is still served until the renditions exist
+        logger.exception('Could not generate renditions of Photo %s', photo_pk)
+
+
+def generate_renditions_in_worker(photo_pk):
+    """Run generate_renditions() in a worker thread, then close the database
+    connections that thread opened (each thread gets its own), so they don't leak.
+    """
+
+    try:
+        generate_renditions(photo_pk)
+    finally:
+        connections.close_all()
+
+
+def queue_renditions(photos):
+    """Generate the renditions of some (just saved) Photos in the background,
+    once the current transaction has committed (so the workers can see them).
+    """
+
+    pks = [photo.pk for photo in photos if photo.image_file]
+
+    def submit():
+        for pk in pks:
+            executor.submit(generate_renditions_in_worker, pk)
+
+    transaction.on_commit(submit)
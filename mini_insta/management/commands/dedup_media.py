@@ -0,0 +1,73 @@
+# File: mini_insta/management/commands/dedup_media.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that moves the media files uploaded before
+# the content-addressed storage (cs412/storage.py) into it
+# (python manage.py dedup_media), so every distinct file is stored once.
+# It covers every field using that storage, in any app (Photos, blog
+# Articles, and the project's Boxes, Items and Players).
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from cs412.storage import media_storage, BLOB_DIRECTORY
+
+
+class Command(BaseCommand):
+    """Store every uploaded file by its contents and delete the duplicates."""
+
+    help = 'Move uploaded media files into the content-addressed store, deleting duplicates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be moved, without changing anything.',
+        )
+
+    def handle(self, *args, **options):
+        """Point each row at the blob of its file, then delete the old files
+        and any blobs that nothing references.
+        """
+
+        storage = media_storage
+        dry_run = options['dry_run']
+
+        moved = 0
+        missing = 0
+        old_sizes = {} # the size of each old file moved
+        blob_sizes = {} # the size of each blob those files ended up in
+
+        for model, field_name in storage.fields:
+            rows = (
+                model._default_manager
+                .exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__startswith': f'{BLOB_DIRECTORY}/'})
+                .values_list('pk', field_name)
+            )
+
+            for pk, name in rows:
+                if not storage.exists(name):
+                    missing += 1
+                    continue
+
+                with storage.open(name, 'rb') as f:
+                    if dry_run:
+                        blob = storage.blob_name(storage.hash_content(File(f)), name)
+                    else:
+                        # store the file (or find its blob), then repoint the row
+                        blob = storage.save(name, File(f))
+                        model._default_manager.filter(pk=pk).update(**{field_name: blob})
+
+                old_sizes[name] = blob_sizes[blob] = storage.size(name)
+                moved += 1
+
+        if not dry_run:
+            # the old files are only deleted if nothing references them any more
+            for name in old_sizes:
+                storage.delete(name)
+
+        swept = 0 if dry_run else storage.sweep()
+
+        self.stdout.write(
+            f'{"Would move" if dry_run else "Moved"} {moved} references from {len(old_sizes)} files '
+            f'({sum(old_sizes.values())} bytes) to {len(blob_sizes)} blobs ({sum(blob_sizes.values())} bytes); '
+            f'{missing} referenced files were missing and {swept} unreferenced blobs were deleted.'
+        )
@@ -0,0 +1,42 @@
+# File: mini_insta/management/commands/generate_renditions.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that generates the resized renditions of
+# uploaded Photos (python manage.py generate_renditions), e.g. for Photos
+# uploaded before renditions existed. New uploads get theirs in the
+# background on their own, but those jobs only live in the server process's
+# memory (see images.py): a job lost to a restart, or one that failed, leaves
+# its Photo missing some renditions until this is run again, so it should be
+# run on a schedule (e.g. hourly from cron) as well as after a deploy.
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from mini_insta.models import Photo
+from mini_insta.images import generate_renditions
+
+
+class Command(BaseCommand):
+    """Generate the renditions of uploaded Photos that don't have them yet."""
+
+    help = 'Generate the resized renditions of uploaded Mini Insta Photos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate the renditions of every Photo, not just the missing ones.',
+        )
+
+    def handle(self, *args, **options):
+        """Generate the renditions of each Photo in turn, in this process."""
+
+        photos = Photo.objects.exclude(image_file='')
+
+        if not options['all']:
+            # any rendition missing, since a job can die part way through
+            photos = photos.filter(Q(thumbnail_file='') | Q(feed_file='') | Q(full_file=''))
+
+        pks = list(photos.values_list('pk', flat=True))
+
+        for pk in pks:
+            generate_renditions(pk)
+
+        self.stdout.write(f'Generated the renditions of {len(pks)} Photos.')
@@ -0,0 +1,26 @@
+# File: mini_insta/management/commands/rebuild_search_index.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that reindexes every Profile and Post for
+# search (python manage.py rebuild_search_index). Signals keep the index up
+# to date on their own; this is for when rows were changed without them
+# (e.g. queryset.update() or raw SQL).
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from mini_insta.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """Rebuild the search index from the Profiles and Posts."""
+
+    help = 'Reindex every Mini Insta Profile and Post for search.'
+
+    def handle(self, *args, **options):
+        """Rebuild the index with whichever backend is configured."""
+
+        backend = get_search_backend()
+
+        with transaction.atomic():
+            backend.rebuild()
+
+        self.stdout.write(f'Rebuilt the search index ({type(backend).__name__}).')
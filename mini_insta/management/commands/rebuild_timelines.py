@@ -0,0 +1,27 @@
+# File: mini_insta/management/commands/rebuild_timelines.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that rebuilds every Profile's feed timeline
+# from scratch (python manage.py rebuild_timelines). The views keep timelines
+# up to date on their own; this is for when Posts or Follows were changed
+# some other way (e.g. through the admin site).
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from mini_insta.models import Profile
+
+
+class Command(BaseCommand):
+    """Recompute the TimelineEntries of every Profile."""
+
+    help = "Rebuild every Profile's feed timeline from the Posts and Follows."
+
+    def handle(self, *args, **options):
+        """Rebuild each timeline and report how many entries were made."""
+
+        entries = 0
+
+        with transaction.atomic():
+            for profile in Profile.objects.all():
+                entries += profile.build_timeline()
+
+        self.stdout.write(f'Rebuilt the feed timelines ({entries} entries).')
@@ -0,0 +1,23 @@
+# File: mini_insta/management/commands/recount_profiles.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that recomputes every Profile's follower,
+# following and post counts (python manage.py recount_profiles). The views
+# keep the counts up to date on their own; this is for when Follows or Posts
+# were changed some other way (e.g. through the admin site, or by deleting
+# a Profile, which deletes its Follows along with it).
+
+from django.core.management.base import BaseCommand
+from mini_insta.models import recount_profiles
+
+
+class Command(BaseCommand):
+    """Recompute the denormalized counts of every Profile."""
+
+    help = 'Recompute the follower, following and post counts of every Profile.'
+
+    def handle(self, *args, **options):
+        """Recount and report how many Profiles were updated."""
+
+        updated = recount_profiles()
+
+        self.stdout.write(f'Recounted {updated} profiles.')
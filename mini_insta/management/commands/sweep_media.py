@@ -0,0 +1,25 @@
+# File: mini_insta/management/commands/sweep_media.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Management command that deletes the blobs of the
+# content-addressed storage (cs412/storage.py) that nothing references any
+# more (python manage.py sweep_media). A blob released within its grace
+# period is kept on disk, and only this (or dedup_media) deletes it later, so
+# it should be run on a schedule, e.g. hourly from cron:
+#
+#     0 * * * * cd /path/to/cs412 && python manage.py sweep_media
+
+from django.core.management.base import BaseCommand
+from cs412.storage import media_storage
+
+
+class Command(BaseCommand):
+    """Delete every blob that nothing references."""
+
+    help = 'Delete the stored media blobs that nothing references any more.'
+
+    def handle(self, *args, **options):
+        """Sweep the shared storage and report how many blobs were deleted."""
+
+        swept = media_storage.sweep()
+
+        self.stdout.write(f'Deleted {swept} unreferenced blobs.')
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_timelines(apps, schema_editor):
+    """Fill in the timelines of the Profiles that already exist."""
+
+    Profile = apps.get_model("mini_insta", "Profile")
+    Post = apps.get_model("mini_insta", "Post")
+    Follow = apps.get_model("mini_insta", "Follow")
+    TimelineEntry = apps.get_model("mini_insta", "TimelineEntry")
+
+    posts = list(Post.objects.values_list("pk", "profile", "timestamp"))
+    follows = set(Follow.objects.values_list("follower_profile", "profile"))
+
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(
+            owner_id=owner,
+            post_id=pk,
+            followed=(owner, profile) in follows,
+            timestamp=timestamp,
+        )
+        for owner in Profile.objects.values_list("pk", flat=True)
+        for pk, profile, timestamp in posts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0011_alter_profile_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("followed", models.BooleanField(default=False)),
+                ("timestamp", models.DateTimeField()),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to="mini_insta.profile",
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="mini_insta.post",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-followed", "-timestamp", "-post"],
+                        name="timeline_feed_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "post"),
+                        name="timeline_entry_owner_post_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:25
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_profiles(apps, schema_editor):
+    """Fill in the new counts for the Profiles that already exist."""
+
+    Profile = apps.get_model("mini_insta", "Profile")
+    Post = apps.get_model("mini_insta", "Post")
+    Follow = apps.get_model("mini_insta", "Follow")
+
+    def count_of(model, field, distinct_field):
+        rows = model.objects.filter(**{field: models.OuterRef("pk")}).order_by()
+        rows = rows.values(field).annotate(
+            count=models.Count(distinct_field, distinct=True)
+        )
+        return Coalesce(models.Subquery(rows.values("count")), 0)
+
+    Profile.objects.update(
+        num_followers=count_of(Follow, "profile", "follower_profile"),
+        num_following=count_of(Follow, "follower_profile", "profile"),
+        num_posts=count_of(Post, "profile", "pk"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0012_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="num_followers",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="num_following",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="num_posts",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:24
+
+from django.db import migrations
+
+# the FTS5 tables searched by mini_insta.search.SQLiteFTSSearchBackend; each
+# row's rowid is the PK of the Profile/Post it mirrors
+CREATE_TABLES = [
+    "CREATE VIRTUAL TABLE mini_insta_profile_fts USING fts5(username, display_name, bio_text)",
+    "CREATE VIRTUAL TABLE mini_insta_post_fts USING fts5(caption)",
+]
+DROP_TABLES = [
+    "DROP TABLE IF EXISTS mini_insta_profile_fts",
+    "DROP TABLE IF EXISTS mini_insta_post_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 tables (on SQLite only) and index what's already there."""
+
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    Profile = apps.get_model("mini_insta", "Profile")
+    Post = apps.get_model("mini_insta", "Post")
+
+    for sql in CREATE_TABLES:
+        schema_editor.execute(sql)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO mini_insta_profile_fts (rowid, username, display_name, bio_text) "
+            "VALUES (%s, %s, %s, %s)",
+            list(
+                Profile.objects.values_list(
+                    "pk", "username", "display_name", "bio_text"
+                )
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO mini_insta_post_fts (rowid, caption) VALUES (%s, %s)",
+            list(Post.objects.values_list("pk", "caption")),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the FTS5 tables again."""
+
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    for sql in DROP_TABLES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0013_profile_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
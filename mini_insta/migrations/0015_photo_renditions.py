@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0014_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="feed_file",
+            field=models.ImageField(blank=True, upload_to=""),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="full_file",
+            field=models.ImageField(blank=True, upload_to=""),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="thumbnail_file",
+            field=models.ImageField(blank=True, upload_to=""),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:33
+
+import cs412.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0015_photo_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="photo",
+            name="feed_file",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="full_file",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="image_file",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="thumbnail_file",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+    ]
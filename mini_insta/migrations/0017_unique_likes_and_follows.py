@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(apps, schema_editor):
+    """Keep only the first Like of each Post by each Profile, and the first
+    Follow of each Profile by each follower, so the constraints can be added.
+    """
+
+    for model_name, fields in (
+        ("Like", ("post", "profile")),
+        ("Follow", ("profile", "follower_profile")),
+    ):
+        model = apps.get_model("mini_insta", model_name)
+        first = (
+            model.objects.order_by().values(*fields).annotate(first=models.Min("pk"))
+        )
+
+        model.objects.exclude(pk__in=first.values("first")).delete()
+
+
+def recount_follows(apps, schema_editor):
+    """Recount the Profiles' follow counts, which duplicate Follows inflated."""
+
+    Profile = apps.get_model("mini_insta", "Profile")
+    Follow = apps.get_model("mini_insta", "Follow")
+
+    def count_of(field):
+        rows = Follow.objects.filter(**{field: models.OuterRef("pk")}).order_by()
+        rows = rows.values(field).annotate(count=models.Count("pk"))
+        return Coalesce(models.Subquery(rows.values("count")), 0)
+
+    Profile.objects.update(
+        num_followers=count_of("profile"),
+        num_following=count_of("follower_profile"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0016_media_storage"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(recount_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(
+                fields=("profile", "follower_profile"),
+                name="follow_profile_follower_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(
+                fields=("post", "profile"), name="like_post_profile_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0017_unique_likes_and_follows"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="follow_version",
+            field=models.IntegerField(default=0),
+        ),
+    ]
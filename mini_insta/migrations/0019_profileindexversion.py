@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0018_profile_follow_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileIndexVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.CharField(max_length=32)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
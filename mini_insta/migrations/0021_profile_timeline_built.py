@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+def rebuild_timelines(apps, schema_editor):
+    """Rebuild the timelines of the Profiles that already exist (those created
+    outside the views may be missing older Posts), and mark them as built.
+    """
+
+    Profile = apps.get_model("mini_insta", "Profile")
+    Post = apps.get_model("mini_insta", "Post")
+    Follow = apps.get_model("mini_insta", "Follow")
+    TimelineEntry = apps.get_model("mini_insta", "TimelineEntry")
+
+    posts = list(Post.objects.values_list("pk", "profile", "timestamp"))
+    follows = set(Follow.objects.values_list("follower_profile", "profile"))
+
+    TimelineEntry.objects.all().delete()
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(
+            owner_id=owner,
+            post_id=pk,
+            followed=(owner, profile) in follows,
+            timestamp=timestamp,
+        )
+        for owner in Profile.objects.values_list("pk", flat=True)
+        for pk, profile, timestamp in posts
+    )
+
+    Profile.objects.update(timeline_built=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0020_uploadprogress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="timeline_built",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(rebuild_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:06
+
+from uuid import uuid4
+
+from django.db import migrations, models
+
+
+def new_follow_versions(apps, schema_editor):
+    """Give every Profile a random follow_version token, so none of the
+    follow sets cached under the old counter values is ever read again.
+    """
+
+    Profile = apps.get_model("mini_insta", "Profile")
+
+    for pk in Profile.objects.values_list("pk", flat=True):
+        Profile.objects.filter(pk=pk).update(follow_version=uuid4().hex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mini_insta", "0021_profile_timeline_built"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="follow_version",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.RunPython(new_follow_versions, migrations.RunPython.noop),
+    ]
@@ -3,9 +3,25 @@
 # Description: Defines what attributes the Mini Insta models 
 # in the database should have.
 
-from django.db import models
+from uuid import uuid4
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.contrib.auth.models import User
+from cs412.storage import get_media_storage
+
+
+# how a Profile's feed is sorted: followed Profiles' Posts first, then newest
+# first (with the Post's PK breaking ties, so every Post has a unique place)
+FEED_ORDER = ('-followed', '-feed_timestamp', '-feed_post')
+
+# the resized renditions generated for every uploaded Photo (see images.py),
+# with the longest side (in pixels) each one is shrunk to fit
+RENDITIONS = {
+    'thumbnail': 320,
+    'feed': 1080,
+    'full': 2048,
+}
 
 
 class Profile(models.Model):
@@ -18,6 +34,22 @@ class Profile(models.Model):
     join_date = models.DateField(auto_now_add=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
+    # denormalized counts, kept up to date by the views that follow/unfollow
+    # and create/delete Posts (see add_to_counts), so showing a Profile
+    # doesn't have to count anything; recount_profiles() repairs them
+    num_followers = models.IntegerField(default=0)
+    num_following = models.IntegerField(default=0)
+    num_posts = models.IntegerField(default=0)
+
+    # a new random token whenever this Profile follows or unfollows someone,
+    # so the cached copies of who it follows (see graph.py) are replaced in
+    # every process; never a counter, so no version is ever used twice
+    follow_version = models.CharField(max_length=32, blank=True)
+
+    # whether this Profile's feed timeline (see TimelineEntry) has been built;
+    # until it has, its feed is ranked on the fly instead
+    timeline_built = models.BooleanField(default=False)
+
     def __str__(self):
         """Return a string representation of this Profile model instance."""
 
@@ -36,6 +68,11 @@ class Profile(models.Model):
 
         return posts
     
+    def get_num_posts(self):
+        """Return how many Posts are on this Profile."""
+
+        return self.num_posts
+    
     def get_followers(self):
         """Return a list of Profiles who follow this Profile."""
 
@@ -54,7 +91,7 @@ class Profile(models.Model):
     def get_num_followers(self):
         """Return how many Profiles follow this Profile."""
 
-        return len(self.get_followers())
+        return self.num_followers
     
     def get_following(self):
         """Return a list of Profiles followed by this Profile."""
@@ -74,50 +111,157 @@ class Profile(models.Model):
     def get_num_following(self):
         """Return how many Profiles this Profile follows."""
 
-        return len(self.get_following())
+        return self.num_following
+    
+    def add_to_counts(self, **amounts):
+        """Add to this Profile's denormalized counts, e.g. add_to_counts(num_posts=1),
+        with a single UPDATE that does the addition in the database (so two
+        requests changing the same count at once can't undo each other).
+        Call it in the same transaction as the change being counted.
+        """
+
+        Profile.objects.filter(pk=self.pk).update(**{
+            name: models.F(name) + amount for name, amount in amounts.items()
+        })
+
+        # keep this instance in step with the database
+        for name, amount in amounts.items():
+            setattr(self, name, getattr(self, name) + amount)
     
     def already_followed(self, profile):
         """Return the Follow instance if this Profile follows the other Profile
         specified in the parameter. Otherwise, return None.
         """
 
-        try:
-            return Follow.objects.get(profile=profile, follower_profile=self)
-        except:
-            return None
+        return Follow.objects.filter(profile=profile, follower_profile=self).first()
     
     def already_liked(self, post):
         """Return the Like instance if this Profile has liked the Post
         specified in the parameter. Otherwise, return None.
         """
 
-        try:
-            return Like.objects.get(post=post, profile=self)
-        except:
-            return None
+        return Like.objects.filter(post=post, profile=self).first()
+
+    def liked_post_ids(self, post_ids):
+        """Return the set of the given Post PKs that this Profile has liked,
+        with one query for all of them.
+
+        Answers are remembered on this instance, and only Posts it hasn't been
+        asked about before are queried, so asking again (e.g. once per Post
+        while rendering a page) is free. The logged in Profile is loaded once
+        per request, so this lasts exactly as long as the request.
+        """
+
+        known = self.__dict__.setdefault('_liked_post_ids', {})
+        unknown = {pk for pk in post_ids if pk not in known}
+
+        if unknown:
+            liked = set(Like.objects.filter(profile=self, post__in=unknown).values_list('post', flat=True))
+            known.update((pk, pk in liked) for pk in unknown)
+
+        return {pk for pk in post_ids if known[pk]}
+
+    def has_liked(self, post):
+        """Return whether this Profile has liked the Post (see liked_post_ids)."""
+
+        return post.pk in self.liked_post_ids([post.pk])
+
+    def followed_profile_ids(self, profile_ids):
+        """Return the set of the given Profile PKs that this Profile follows.
+
+        Answered from the cached follow graph (at most one query, to load this
+        Profile's follows if they aren't cached yet), remembered on this
+        instance for the rest of the request.
+        """
+
+        # graph.py imports this module, so import it here instead
+        from .graph import get_following_ids
+
+        if '_following_ids' not in self.__dict__:
+            self._following_ids = get_following_ids(self.pk, self.follow_version)
+
+        return self._following_ids.intersection(profile_ids)
+
+    def is_following(self, profile):
+        """Return whether this Profile follows the other Profile (see followed_profile_ids)."""
+
+        return profile.pk in self.followed_profile_ids([profile.pk])
     
     def get_post_feed(self):
-        """Return a list (or QuerySet) of Posts, specifically for the Profiles 
-        being followed by the Profile on which the method was called.
+        """Return a QuerySet of Posts for this Profile's feed: Posts from the
+        Profiles it follows first, then everyone else's, newest first.
+
+        The feed is read from this Profile's materialized timeline (see
+        TimelineEntry), which is kept up to date as Posts are created and
+        Profiles are followed/unfollowed, so it's a single indexed query.
+        If this Profile's timeline hasn't been built yet, the feed is ranked
+        on the fly instead (see get_ranked_post_feed). Either way, every Post is
+        annotated with the FEED_ORDER keys: followed, feed_timestamp and feed_post.
         """
 
-        post_feed = [] # the post feed, a list of Posts to be returned
-        following = self.get_following() # a list of Profiles that this Profile follows
+        if not self.timeline_built:
+            return self.get_ranked_post_feed()
 
-        # a list of Profiles that this Profile does NOT follow
-        not_following = Profile.objects.exclude(pk__in=following)
+        # sort by the timeline's own columns, so its index covers the ordering
+        feed = Post.objects.filter(timeline_entries__owner=self).annotate(
+            followed=models.F('timeline_entries__followed'),
+            feed_timestamp=models.F('timeline_entries__timestamp'),
+            feed_post=models.F('timeline_entries__post'),
+        )
 
-        # first, process the following list to include every Post from every Profile 
-        # that this profile follows
-        for f in following:
-            post_feed += Post.objects.filter(profile=f).order_by('-timestamp')
+        return feed.select_related('profile').order_by(*FEED_ORDER)
+    
+    def get_ranked_post_feed(self):
+        """Return the same feed as get_post_feed, worked out directly from the
+        Posts and Follows with a single SQL statement: each Post is annotated
+        with whether this Profile follows its creator (an EXISTS subquery),
+        then sorted on that first.
+        """
+
+        follows = Follow.objects.filter(profile=models.OuterRef('profile'), follower_profile=self)
+
+        feed = Post.objects.annotate(
+            followed=models.Exists(follows),
+            feed_timestamp=models.F('timestamp'),
+            feed_post=models.F('pk'),
+        )
+
+        return feed.select_related('profile').order_by(*FEED_ORDER)
+    
+    def build_timeline(self):
+        """(Re)build this Profile's timeline from scratch, with an entry for
+        every Post in the system, and mark it as built. Returns the number of
+        entries created.
+        """
+
+        # all at once, so the feed never sees the timeline half rebuilt
+        with transaction.atomic():
+            # the PKs of the Profiles that this Profile follows
+            following = set(
+                Follow.objects.filter(follower_profile=self).values_list('profile', flat=True)
+            )
 
-        # second, process the not_following list to include every Post from every Profile 
-        # that this profile does NOT follow
-        for nf in not_following:
-            post_feed += Post.objects.filter(profile=nf).order_by('-timestamp')
+            entries = [
+                TimelineEntry(owner=self, post_id=pk, followed=profile_id in following, timestamp=timestamp)
+                for pk, profile_id, timestamp in Post.objects.values_list('pk', 'profile', 'timestamp')
+            ]
 
-        return post_feed
+            TimelineEntry.objects.filter(owner=self).delete()
+
+            # a Post being fanned out at the same time may have added its entry already
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+            Profile.objects.filter(pk=self.pk).update(timeline_built=True)
+            self.timeline_built = True
+
+        return len(entries)
+    
+    def set_followed_in_timeline(self, profile, followed):
+        """Move every Post by the given Profile into (or out of) the followed
+        section of this Profile's timeline, after a follow (or an unfollow).
+        """
+
+        TimelineEntry.objects.filter(owner=self, post__profile=profile).update(followed=followed)
 
 
 class Post(models.Model):
@@ -138,8 +282,19 @@ class Post(models.Model):
 
         return reverse('show_post', kwargs={'pk': self.pk})
     
+    def is_prefetched(self, name):
+        """Return whether the related objects called name (e.g. 'photo_set')
+        were already fetched for this Post, e.g. by get_feed_prefetches().
+        """
+
+        return name in getattr(self, '_prefetched_objects_cache', {})
+    
     def get_all_photos(self):
         """Return a QuerySet of all Photos on this Post."""
+
+        # reuse the Photos if they were prefetched (already newest first)
+        if self.is_prefetched('photo_set'):
+            return self.photo_set.all()
     
         # Photos are ordered by newest first
         photos = Photo.objects.filter(post=self).order_by('-timestamp')
@@ -149,12 +304,44 @@ class Post(models.Model):
     def get_all_comments(self):
         """Return a QuerySet of all Comments on this Post."""
 
+        # reuse the Comments if they were prefetched (already newest first)
+        if self.is_prefetched('comment_set'):
+            return self.comment_set.all()
+
         return Comment.objects.filter(post=self).order_by('-timestamp')
     
     def get_likes(self):
         """Return a QuerySet of all Likes on this Post."""
+
+        # reuse the Likes if they were prefetched (already newest first)
+        if self.is_prefetched('like_set'):
+            return self.like_set.all()
         
         return Like.objects.filter(post=self).order_by('-timestamp')
+    
+    def get_num_likes(self):
+        """Return how many Likes this Post has."""
+
+        # use the count annotated by get_feed_prefetches(), if there is one
+        if hasattr(self, 'num_likes'):
+            return self.num_likes
+
+        return self.get_likes().count()
+    
+    def fan_out(self):
+        """Add this (newly created) Post to every Profile's timeline, marked as
+        followed for the Profiles that follow its creator.
+        """
+
+        # the PKs of the Profiles that follow this Post's creator
+        followers = set(
+            Follow.objects.filter(profile=self.profile).values_list('follower_profile', flat=True)
+        )
+
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(owner_id=pk, post=self, followed=pk in followers, timestamp=self.timestamp)
+            for pk in Profile.objects.values_list('pk', flat=True)
+        ], ignore_conflicts=True)
 
 
 class Photo(models.Model):
@@ -163,26 +350,49 @@ class Photo(models.Model):
     # the foreign key to indicate the relationship to the Post to which this Photo is associated
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     image_url = models.URLField(blank=True) # a valid URL to an image stored on the public world-wide web
-    image_file = models.ImageField(blank=True) # an image stored as a media file
+    image_file = models.ImageField(blank=True, storage=get_media_storage) # an image stored as a media file
     timestamp = models.DateTimeField(auto_now_add=True) # the time at which this Photo was created/saved
 
+    # the RENDITIONS of image_file, generated in the background after upload
+    # (blank until they're ready, or if the Photo only has an image_url)
+    thumbnail_file = models.ImageField(blank=True, storage=get_media_storage)
+    feed_file = models.ImageField(blank=True, storage=get_media_storage)
+    full_file = models.ImageField(blank=True, storage=get_media_storage)
+
     def __str__(self):
         """Return a string representation of this Photo model instance."""
 
         return f'{self.post.profile} | {self.post.caption} | Photo {self.pk}'
     
-    def get_image_url(self):
+    def get_image_url(self, size='full'):
         """Returns either the URL stored in the image_url attribute 
-        (if it exists), or else the URL to the image_file attribute.
+        (if it exists), or else the URL to the given size rendition of the
+        image_file attribute (or to image_file itself, until the rendition
+        has been generated).
         If no photo exists, return None.
         """
 
         if self.image_url:
             return self.image_url
+
+        rendition = getattr(self, f'{size}_file')
+
+        if rendition:
+            return rendition.url
         elif self.image_file:
             return self.image_file.url
         else:
             return None
+
+    def get_thumbnail_url(self):
+        """Returns the URL of the small version of this Photo, for grids."""
+
+        return self.get_image_url('thumbnail')
+
+    def get_feed_url(self):
+        """Returns the URL of the version of this Photo shown in the feed."""
+
+        return self.get_image_url('feed')
         
 
 class Follow(models.Model):
@@ -200,6 +410,15 @@ class Follow(models.Model):
     # the time at which the follower began following the other profile
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        """A Profile can only follow another Profile once (the database
+        enforces it, so two requests at once can't both create a Follow).
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'follower_profile'], name='follow_profile_follower_unique'),
+        ]
+
     def __str__(self):
         """Return a string representation of this Follow model instance."""
 
@@ -229,7 +448,149 @@ class Like(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE) # the Profile that's doing the liking
     timestamp = models.DateTimeField(auto_now_add=True) # the time at which this Like was created
 
+    class Meta:
+        """A Profile can only like a Post once (the database enforces it,
+        so two requests at once can't both create a Like).
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'profile'], name='like_post_profile_unique'),
+        ]
+
     def __str__(self):
         """Return a string representation of this Like model instance."""
 
-        return f'{self.profile.display_name} liked "{self.post.caption}"'
\ No newline at end of file
+        return f'{self.profile.display_name} liked "{self.post.caption}"'
+    
+
+class TimelineEntry(models.Model):
+    """Encapsulates one Post appearing in one Profile's feed. Each Profile's
+    timeline is materialized ahead of time (fan-out on write), so reading a
+    feed is one indexed query no matter how many Profiles there are.
+    """
+
+    owner = models.ForeignKey(Profile, related_name="timeline", on_delete=models.CASCADE) # whose feed this is in
+    post = models.ForeignKey(Post, related_name="timeline_entries", on_delete=models.CASCADE) # the Post being shown
+    followed = models.BooleanField(default=False) # whether the owner follows the Post's creator
+    timestamp = models.DateTimeField() # a copy of the Post's timestamp, so the index can sort by it
+
+    class Meta:
+        """Each Post shows up once per feed, and feeds are read newest first
+        with the followed Posts before everyone else's.
+        """
+
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='timeline_entry_owner_post_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-followed', '-timestamp', '-post'], name='timeline_feed_idx'),
+        ]
+
+    def __str__(self):
+        """Return a string representation of this TimelineEntry model instance."""
+
+        return f'{self.owner.username} sees "{self.post.caption}"'
+
+
+class ProfileIndexVersion(models.Model):
+    """Store a token that changes every time a Profile is saved or deleted.
+    Each process keeps its own in-memory autocomplete index of the Profiles
+    (see search.py), and rebuilds it when this version has changed, so a
+    change made in any process reaches all of them.
+    """
+
+    # a random token rather than a counter: a bump that gets rolled back must
+    # never come back as the version of some other (committed) change
+    version = models.CharField(max_length=32)
+    updated = models.DateTimeField(auto_now=True) # when the version was last bumped
+
+    def __str__(self):
+        """Return a string representation of this ProfileIndexVersion."""
+
+        return f'Profile index version {self.version} ({self.updated})'
+
+
+def get_profile_index_version():
+    """Return the current version of the Profiles ('' if it was never bumped)."""
+
+    version = ProfileIndexVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+
+    return version or ''
+
+
+def bump_profile_index_version():
+    """Mark the Profiles as changed, so every autocomplete index is rebuilt.
+    Call it in the same transaction as the change.
+    """
+
+    version = uuid4().hex
+
+    # there's only ever one ProfileIndexVersion row; create it the first time around
+    if not ProfileIndexVersion.objects.filter(pk=1).update(version=version):
+        ProfileIndexVersion.objects.create(pk=1, version=version)
+
+
+class UploadProgress(models.Model):
+    """Encapsulates how far along one user's photo upload is (see uploads.py).
+    It's kept in the database rather than a cache, so the polls for it can
+    be answered by any process, not just the one receiving the upload.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE) # the user doing the upload
+    progress_id = models.CharField(max_length=64) # the ID the uploading page gave the upload
+    progress = models.JSONField() # the bytes received so far, overall and for each file
+    updated = models.DateTimeField(auto_now=True) # when the progress was last recorded
+
+    class Meta:
+        """Each of a user's uploads has its own ID."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'progress_id'], name='upload_progress_user_id_unique'),
+        ]
+
+    def __str__(self):
+        """Return a string representation of this UploadProgress model instance."""
+
+        return f'{self.user.username}\'s upload {self.progress_id} ({self.updated})'
+
+
+def get_feed_prefetches(posts):
+    """Add everything a list of Posts (like the feed) shows about each Post
+    to the posts QuerySet, so rendering them takes a fixed number of queries
+    rather than a few per Post: the creator's Profile, the Photos, the Likes
+    and Comments along with their Profiles, and the number of Likes.
+    """
+
+    # the number of Likes on each Post, as a subquery (a JOIN and GROUP BY
+    # would get in the way of the feed's index)
+    num_likes = Like.objects.filter(post=models.OuterRef('pk')).order_by().values('post')
+    num_likes = num_likes.annotate(count=models.Count('pk')).values('count')
+
+    return posts.select_related('profile').prefetch_related(
+        models.Prefetch('photo_set', queryset=Photo.objects.order_by('-timestamp')),
+        models.Prefetch('like_set', queryset=Like.objects.select_related('profile').order_by('-timestamp')),
+        models.Prefetch('comment_set', queryset=Comment.objects.select_related('profile').order_by('-timestamp')),
+    ).annotate(
+        num_likes=Coalesce(models.Subquery(num_likes), 0),
+    )
+
+
+def recount_profiles():
+    """Recompute the denormalized counts of every Profile from the Follows
+    and Posts, with one UPDATE (a count subquery per column).
+    Returns the number of Profiles updated.
+    """
+
+    def count_of(model, field, distinct_field):
+        """A subquery counting the model rows whose field is the outer Profile."""
+
+        rows = model.objects.filter(**{field: models.OuterRef('pk')}).order_by().values(field)
+        rows = rows.annotate(count=models.Count(distinct_field, distinct=True)).values('count')
+
+        return Coalesce(models.Subquery(rows), 0)
+
+    return Profile.objects.update(
+        num_followers=count_of(Follow, 'profile', 'follower_profile'),
+        num_following=count_of(Follow, 'follower_profile', 'profile'),
+        num_posts=count_of(Post, 'profile', 'pk'),
+    )
@@ -0,0 +1,325 @@
+# File: mini_insta/search.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Full-text search over Mini Insta Profiles and Posts. The search
+# backend is pluggable (settings.MINI_INSTA_SEARCH_BACKEND); on SQLite the
+# default keeps FTS5 indexes that signals.py updates as Profiles and Posts
+# are saved and deleted, so searching never scans the whole table.
+
+import bisect
+import re
+from threading import Lock
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+from .models import Profile, Post, bump_profile_index_version, get_profile_index_version
+
+# the most matches a single search ranks (and so can page through)
+MAX_RESULTS = 1000
+
+
+class RankedResults:
+    """A lazy, read-only list of the model instances with the given PKs, in
+    that (ranked) order. Only the slices that are asked for (e.g. one page,
+    by a Paginator) are fetched from the database.
+    """
+
+    def __init__(self, queryset, pks):
+        self.queryset = queryset
+        self.pks = list(pks)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def __getitem__(self, index):
+        """Return the instance at index, or a list of them for a slice."""
+
+        if isinstance(index, slice):
+            pks = self.pks[index]
+            objects = self.queryset.in_bulk(pks)
+
+            # anything deleted since the search ran is just left out
+            return [objects[pk] for pk in pks if pk in objects]
+
+        return self[index:index + 1][0]
+
+
+class SearchBackend:
+    """The interface every search backend implements. Subclasses that keep
+    an index override the index_*/remove_* hooks and rebuild().
+    """
+
+    def index_profile(self, profile):
+        """Add (or update) a Profile in the index."""
+
+    def remove_profile(self, pk):
+        """Take the Profile with this PK out of the index."""
+
+    def index_post(self, post):
+        """Add (or update) a Post in the index."""
+
+    def remove_post(self, pk):
+        """Take the Post with this PK out of the index."""
+
+    def rebuild(self):
+        """Reindex every Profile and Post from scratch."""
+
+    def search_profile_ids(self, query):
+        """Return the PKs of the Profiles that match query, best first."""
+
+        raise NotImplementedError
+
+    def search_post_ids(self, query):
+        """Return the PKs of the Posts that match query, best first."""
+
+        raise NotImplementedError
+
+    def search_profiles(self, query, queryset=None):
+        """Return the Profiles that match query as RankedResults."""
+
+        if queryset is None:
+            queryset = Profile.objects.all()
+
+        return RankedResults(queryset, self.search_profile_ids(query))
+
+    def search_posts(self, query, queryset=None):
+        """Return the Posts that match query as RankedResults."""
+
+        if queryset is None:
+            queryset = Post.objects.all()
+
+        return RankedResults(queryset, self.search_post_ids(query))
+
+
+class ContainsSearchBackend(SearchBackend):
+    """Search with plain substring matches (the original behaviour), for
+    databases without a full-text index. Keeps no index of its own.
+    """
+
+    def search_profile_ids(self, query):
+        matches = (
+            Profile.objects.filter(username__contains=query) |
+            Profile.objects.filter(display_name__contains=query) |
+            Profile.objects.filter(bio_text__contains=query)
+        )
+
+        return matches.order_by('pk').values_list('pk', flat=True)[:MAX_RESULTS]
+
+    def search_post_ids(self, query):
+        matches = Post.objects.filter(caption__contains=query).order_by('-timestamp')
+
+        return matches.values_list('pk', flat=True)[:MAX_RESULTS]
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """Search SQLite FTS5 tables that mirror the searchable columns (each row's
+    rowid is the PK of the Profile/Post it came from), ranked by BM25.
+    The tables are created by migration 0014_search_index.
+    """
+
+    profile_table = 'mini_insta_profile_fts'
+    post_table = 'mini_insta_post_fts'
+
+    # how much a match in each profile column counts towards the ranking
+    # (username, display_name, bio_text)
+    profile_weights = (10.0, 5.0, 1.0)
+
+    @staticmethod
+    def match_expression(query):
+        """Turn what the user typed into an FTS5 query that matches every word
+        (as a prefix, so "hik" finds "hiking"). Each word is quoted, so the
+        user can't type FTS5 syntax. Returns None if there are no words.
+        """
+
+        words = re.findall(r'\w+', query)
+
+        if not words:
+            return None
+
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, table, query, weights=()):
+        """Return the rowids of the rows of an FTS5 table matching query, best first."""
+
+        match = self.match_expression(query)
+
+        if match is None:
+            return []
+
+        rank = f'bm25({table}{"".join(f", {w}" for w in weights)})'
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY {rank}, rowid LIMIT %s',
+                [match, MAX_RESULTS],
+            )
+
+            return [row[0] for row in cursor.fetchall()]
+
+    def search_profile_ids(self, query):
+        return self.search(self.profile_table, query, self.profile_weights)
+
+    def search_post_ids(self, query):
+        return self.search(self.post_table, query)
+
+    def index_profile(self, profile):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.profile_table} WHERE rowid = %s', [profile.pk])
+            cursor.execute(
+                f'INSERT INTO {self.profile_table} (rowid, username, display_name, bio_text) VALUES (%s, %s, %s, %s)',
+                [profile.pk, profile.username, profile.display_name, profile.bio_text],
+            )
+
+    def remove_profile(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.profile_table} WHERE rowid = %s', [pk])
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.post_table} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.post_table} (rowid, caption) VALUES (%s, %s)',
+                [post.pk, post.caption],
+            )
+
+    def remove_post(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.post_table} WHERE rowid = %s', [pk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.profile_table}')
+            cursor.executemany(
+                f'INSERT INTO {self.profile_table} (rowid, username, display_name, bio_text) VALUES (%s, %s, %s, %s)',
+                list(Profile.objects.values_list('pk', 'username', 'display_name', 'bio_text')),
+            )
+
+            cursor.execute(f'DELETE FROM {self.post_table}')
+            cursor.executemany(
+                f'INSERT INTO {self.post_table} (rowid, caption) VALUES (%s, %s)',
+                list(Post.objects.values_list('pk', 'caption')),
+            )
+
+
+def get_search_backend():
+    """Return the search backend named by settings.MINI_INSTA_SEARCH_BACKEND
+    (a dotted path to a SearchBackend class), or by default the FTS5 one on
+    SQLite and the substring one anywhere else.
+    """
+
+    path = getattr(settings, 'MINI_INSTA_SEARCH_BACKEND', None)
+
+    if path is None:
+        if connection.vendor == 'sqlite':
+            return SQLiteFTSSearchBackend()
+
+        return ContainsSearchBackend()
+
+    return import_string(path)()
+
+
+class ProfilePrefixIndex:
+    """An in-memory index for autocompleting Profiles by the start of their
+    username, or of any word in their display name.
+
+    Each is kept as a sorted list of (lower-case key, PK) pairs, so all the
+    keys starting with a prefix sit next to each other and the first is
+    found by binary search; a lookup costs O(log n + k), plus one small
+    query for the version of the Profiles. The index is rebuilt (in one
+    query) the first time it's used after a Profile is saved or deleted
+    (see profiles_changed).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.usernames = []
+        self.names = []
+        self.profiles = {}
+        self.lock = Lock()
+
+    def build(self):
+        """Rebuild the sorted keys and the Profile details from the database."""
+
+        usernames = []
+        names = []
+        profiles = {}
+
+        for pk, username, display_name, image_url in Profile.objects.values_list(
+            'pk', 'username', 'display_name', 'profile_image_url',
+        ):
+            usernames.append((username.lower(), pk))
+            names.extend((word, pk) for word in set(display_name.lower().split()))
+            profiles[pk] = {
+                'pk': pk,
+                'username': username,
+                'display_name': display_name,
+                'profile_image_url': image_url,
+            }
+
+        usernames.sort()
+        names.sort()
+
+        # swap the new lists in all at once, so lookups never see half an index
+        self.usernames, self.names, self.profiles = usernames, names, profiles
+
+    def refresh(self):
+        """Rebuild the index if the Profiles changed since it was last built
+        (in any process: the version is read from the database).
+        """
+
+        # read the version before the Profiles, so a change committed in
+        # between can only make the index look older than it is
+        version = get_profile_index_version()
+
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build()
+                    self.version = version
+
+    @staticmethod
+    def prefix_matches(keys, prefix):
+        """Yield the PKs of the (key, PK) pairs whose key starts with prefix."""
+
+        i = bisect.bisect_left(keys, (prefix,))
+
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i][1]
+            i += 1
+
+    def complete(self, prefix, limit=8):
+        """Return up to limit Profiles (as dicts) whose username, or a word of
+        whose display name, starts with prefix (ignoring case). Username
+        matches come first, each group in alphabetical order.
+        """
+
+        prefix = prefix.strip().lower()
+
+        if not prefix:
+            return []
+
+        self.refresh()
+
+        usernames, names, profiles = self.usernames, self.names, self.profiles
+        found = []
+
+        for matches in (self.prefix_matches(usernames, prefix), self.prefix_matches(names, prefix)):
+            for pk in matches:
+                if len(found) >= limit:
+                    return [profiles[pk] for pk in found]
+
+                if pk not in found:
+                    found.append(pk)
+
+        return [profiles[pk] for pk in found]
+
+
+def profiles_changed():
+    """Mark the autocomplete index as stale, in every process (see
+    bump_profile_index_version; call it in the same transaction as the change).
+    """
+
+    bump_profile_index_version()
+
+
+# the autocomplete index of this process
+profile_prefix_index = ProfilePrefixIndex()
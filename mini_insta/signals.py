@@ -0,0 +1,53 @@
+# File: mini_insta/signals.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Signal handlers that keep the search and autocomplete indexes
+# (see search.py) in step with the Profiles and Posts, however they're saved
+# or deleted, and give every new Profile its feed timeline.
+# Connected in MiniInstaConfig.ready().
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Profile, Post
+from .search import get_search_backend, profiles_changed
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, raw=False, **kwargs):
+    """Reindex a Profile whenever it's saved (but not while loading fixtures)."""
+
+    if not raw:
+        get_search_backend().index_profile(instance)
+        profiles_changed()
+
+
+@receiver(post_save, sender=Profile)
+def build_new_timeline(sender, instance, created, raw=False, **kwargs):
+    """Build a new Profile's feed timeline out of the existing Posts, however
+    the Profile was created (but not while loading fixtures).
+    """
+
+    if created and not raw:
+        instance.build_timeline()
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile(sender, instance, **kwargs):
+    """Take a deleted Profile out of the search index."""
+
+    get_search_backend().remove_profile(instance.pk)
+    profiles_changed()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    """Reindex a Post whenever it's saved (but not while loading fixtures)."""
+
+    if not raw:
+        get_search_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Take a deleted Post out of the search index."""
+
+    get_search_backend().remove_post(instance.pk)
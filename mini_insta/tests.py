@@ -1,3 +1,665 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import *
+from .graph import follows, suggest_profile_ids
+from .search import ProfilePrefixIndex, get_search_backend
+from .images import generate_renditions
+from cs412.storage import media_storage
+
+
+class PostFeedQueryTests(TestCase):
+    """Check that rendering the feed takes the same number of queries
+    no matter how many Posts (and Photos, Likes and Comments) it shows.
+    """
+
+    def setUp(self):
+        """Create a logged in Profile that follows one of two other Profiles."""
+
+        self.profiles = []
+        for i in range(3):
+            user = User.objects.create_user(f'user{i}', password='password')
+            self.profiles.append(Profile.objects.create(user=user, username=f'user{i}'))
+
+        me, followed, _ = self.profiles
+        Follow.objects.create(profile=followed, follower_profile=me)
+
+        self.client.login(username='user0', password='password')
+
+    def add_posts(self, count):
+        """Create count Posts spread across the other Profiles, each with
+        a Photo, a Like and a Comment, and fan them out to every timeline.
+        """
+
+        _, followed, other = self.profiles
+
+        for i in range(count):
+            post = Post.objects.create(profile=[followed, other][i % 2], caption=f'post {i}')
+            post.fan_out()
+
+            Photo.objects.create(post=post, image_url=f'https://example.com/{i}.png')
+            Like.objects.create(post=post, profile=self.profiles[0])
+            Comment.objects.create(post=post, profile=self.profiles[0], text='nice')
+
+    def count_feed_queries(self):
+        """Render the feed and return how many queries it took."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('show_feed'))
+
+        self.assertEqual(response.status_code, 200)
+
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        """A feed page with 2 Posts and one with 10 take the same queries."""
+
+        self.add_posts(2)
+        few = self.count_feed_queries()
+
+        self.add_posts(8)
+        many = self.count_feed_queries()
+
+        self.assertEqual(few, many)
+
+    def test_feed_shows_followed_posts_first(self):
+        """Posts by followed Profiles come before everyone else's."""
+
+        self.add_posts(4)
+
+        response = self.client.get(reverse('show_feed'))
+        creators = [post.profile for post in response.context['post_feed']]
+
+        self.assertEqual(creators, [self.profiles[1]] * 2 + [self.profiles[2]] * 2)
+
+    def test_liked_posts_looked_up_at_once(self):
+        """Which Posts the viewer has liked takes one query, then none, and
+        the feed marks them.
+        """
+
+        self.add_posts(4)
+        me = self.profiles[0]
+
+        posts = list(Post.objects.order_by('pk'))
+        Like.objects.filter(post=posts[0]).delete()
+
+        with self.assertNumQueries(1):
+            liked = me.liked_post_ids([post.pk for post in posts])
+
+        with self.assertNumQueries(0):
+            self.assertFalse(me.has_liked(posts[0]))
+            self.assertTrue(me.has_liked(posts[1]))
+
+        self.assertEqual(liked, {post.pk for post in posts[1:]})
+
+        response = self.client.get(reverse('show_feed'))
+        self.assertEqual({post.pk for post in response.context['post_feed'] if post.liked}, liked)
+
+
+class TimelineTests(TestCase):
+    """Check that every Profile's materialized timeline shows the whole feed."""
+
+    def setUp(self):
+        """Create a logged in Profile and two others, one with two older Posts."""
+
+        self.profiles = []
+        for i in range(3):
+            user = User.objects.create_user(f'user{i}', password='password')
+            self.profiles.append(Profile.objects.create(user=user, username=f'user{i}'))
+
+        self.older_posts = [self.add_post(self.profiles[1], f'old {i}') for i in range(2)]
+
+        self.client.login(username='user0', password='password')
+
+    def add_post(self, profile, caption):
+        """Create a Post and fan it out, the way CreatePostView does."""
+
+        post = Post.objects.create(profile=profile, caption=caption)
+        post.fan_out()
+
+        return post
+
+    def get_feed(self):
+        """Return the Posts of the logged in Profile's feed, in order."""
+
+        return list(self.client.get(reverse('show_feed')).context['post_feed'])
+
+    def test_profile_created_outside_the_views(self):
+        """A Profile made straight through the ORM still sees the older Posts
+        once someone posts again.
+        """
+
+        user = User.objects.create_user('late', password='password')
+        late = Profile.objects.create(user=user, username='late')
+        newer = self.add_post(self.profiles[2], 'new')
+
+        self.assertTrue(late.timeline_built)
+        self.assertEqual(list(late.get_post_feed()), [newer] + self.older_posts[::-1])
+
+    def test_follow_and_unfollow_reorder_the_timeline(self):
+        """Following moves a Profile's Posts to the top, unfollowing moves them back."""
+
+        newer = self.add_post(self.profiles[2], 'new')
+        self.assertEqual(self.get_feed(), [newer] + self.older_posts[::-1])
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': self.profiles[1].pk}))
+        self.assertEqual(self.get_feed(), self.older_posts[::-1] + [newer])
+
+        self.client.get(reverse('unfollow_profile', kwargs={'pk': self.profiles[1].pk}))
+        self.assertEqual(self.get_feed(), [newer] + self.older_posts[::-1])
+
+
+class ProfileCountTests(TestCase):
+    """Check that the views keep the denormalized Profile counts right."""
+
+    def setUp(self):
+        """Create two Profiles and log in as the first."""
+
+        self.me, self.other = [
+            Profile.objects.create(user=User.objects.create_user(f'user{i}', password='password'), username=f'user{i}')
+            for i in range(2)
+        ]
+
+        self.client.login(username='user0', password='password')
+
+    def assert_counts_match_recount(self):
+        """The stored counts are the same as counting from scratch."""
+
+        stored = list(Profile.objects.order_by('pk').values_list('num_followers', 'num_following', 'num_posts'))
+        recount_profiles()
+        recounted = list(Profile.objects.order_by('pk').values_list('num_followers', 'num_following', 'num_posts'))
+
+        self.assertEqual(stored, recounted)
+
+    def test_follow_and_unfollow(self):
+        """Following (twice) and unfollowing update both Profiles' counts."""
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': self.other.pk}))
+        self.client.get(reverse('follow_profile', kwargs={'pk': self.other.pk}))
+
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.get_num_followers(), 1)
+        self.assert_counts_match_recount()
+
+        self.client.get(reverse('unfollow_profile', kwargs={'pk': self.other.pk}))
+
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.get_num_followers(), 0)
+        self.assert_counts_match_recount()
+
+    def test_create_and_delete_post(self):
+        """Creating and deleting a Post updates the creator's post count."""
+
+        self.client.post(reverse('create_post'), {'caption': 'hello'})
+
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.get_num_posts(), 1)
+        self.assert_counts_match_recount()
+
+        post = Post.objects.get(profile=self.me)
+        self.client.post(reverse('delete_post', kwargs={'pk': post.pk}))
+
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.get_num_posts(), 0)
+        self.assert_counts_match_recount()
+
+    def test_likes_and_follows_are_unique(self):
+        """Liking or following twice through the views makes one row, undoing
+        twice removes it once, the counts stay right throughout, and the
+        database refuses a second Follow.
+        """
+
+        post = Post.objects.create(profile=self.other, caption='hello')
+
+        # the Post was made without the views, so count it by hand
+        recount_profiles()
+
+        self.client.get(reverse('like_post', kwargs={'pk': post.pk}))
+        self.client.get(reverse('like_post', kwargs={'pk': post.pk}))
+        self.assertEqual(Like.objects.filter(post=post).count(), 1)
+
+        self.client.get(reverse('unlike_post', kwargs={'pk': post.pk}))
+        self.client.get(reverse('unlike_post', kwargs={'pk': post.pk}))
+        self.assertFalse(Like.objects.filter(post=post).exists())
+
+        for url_name, expected in (('follow_profile', 1), ('unfollow_profile', 0)):
+            for _ in range(2):
+                self.client.get(reverse(url_name, kwargs={'pk': self.other.pk}))
+
+                self.me.refresh_from_db()
+                self.other.refresh_from_db()
+                self.assertEqual(Follow.objects.filter(profile=self.other, follower_profile=self.me).count(), expected)
+                self.assertEqual((self.other.num_followers, self.me.num_following), (expected, expected))
+                self.assert_counts_match_recount()
+
+        Follow.objects.create(profile=self.other, follower_profile=self.me)
+
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(profile=self.other, follower_profile=self.me)
+
+
+    def test_counts_survive_a_profile_edit(self):
+        """Editing a Profile loaded before a follow and a Post doesn't put
+        its old counts back.
+        """
+
+        stale = Profile.objects.get(pk=self.me.pk)
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': self.other.pk}))
+        self.client.post(reverse('create_post'), {'caption': 'hello'})
+
+        with mock.patch('mini_insta.views.UpdateProfileView.get_object', return_value=stale):
+            self.client.post(reverse('update_profile'), {
+                'display_name': 'Renamed', 'profile_image_url': '', 'bio_text': '',
+            })
+
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.display_name, 'Renamed')
+        self.assertEqual((self.me.num_following, self.me.num_posts), (1, 1))
+        self.assert_counts_match_recount()
+
+    def test_recount_profiles_command(self):
+        """The command repairs counts that the views didn't keep."""
+
+        Follow.objects.create(profile=self.other, follower_profile=self.me)
+        Post.objects.create(profile=self.me, caption='hello')
+        Profile.objects.filter(pk=self.other.pk).update(num_following=5)
+
+        output = io.StringIO()
+        call_command('recount_profiles', stdout=output)
+
+        self.assertIn('Recounted 2 profiles.', output.getvalue())
+        self.assertEqual(
+            list(Profile.objects.order_by('pk').values_list('num_followers', 'num_following', 'num_posts')),
+            [(0, 1, 1), (1, 0, 0)],
+        )
+
+
+class FollowGraphTests(TestCase):
+    """Check the cached follow graph and the suggestions built on it."""
+
+    def setUp(self):
+        """Create four Profiles, where user0 follows user1, who follows
+        user2 and user3, and log in as user0.
+        """
+
+        cache.clear()
+
+        self.profiles = [
+            Profile.objects.create(user=User.objects.create_user(f'user{i}', password='password'), username=f'user{i}')
+            for i in range(4)
+        ]
+
+        Follow.objects.create(profile=self.profiles[1], follower_profile=self.profiles[0])
+        Follow.objects.create(profile=self.profiles[2], follower_profile=self.profiles[1])
+        Follow.objects.create(profile=self.profiles[3], follower_profile=self.profiles[1])
+
+        self.client.login(username='user0', password='password')
+
+    def test_follow_updates_cached_graph(self):
+        """Following through the view shows up in the (already cached) graph,
+        even in another process with its own cache.
+        """
+
+        me, _, other, _ = self.profiles
+
+        # another process's cache, which this process can't clear
+        other_process_cache = LocMemCache('other-process', {})
+
+        with mock.patch('mini_insta.graph.cache', other_process_cache):
+            self.assertFalse(follows(me.pk, other.pk))
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': other.pk}))
+
+        with mock.patch('mini_insta.graph.cache', other_process_cache):
+            self.assertTrue(follows(me.pk, other.pk))
+
+        self.client.get(reverse('unfollow_profile', kwargs={'pk': other.pk}))
+
+        with mock.patch('mini_insta.graph.cache', other_process_cache):
+            self.assertFalse(follows(me.pk, other.pk))
+
+    def test_profile_edit_between_follows(self):
+        """Editing a Profile loaded before a follow doesn't put its old
+        follow_version back, so the follows after it are seen.
+        """
+
+        me, _, other, last = self.profiles
+        stale = Profile.objects.get(pk=me.pk)
+        self.assertFalse(follows(me.pk, other.pk))
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': other.pk}))
+        self.assertTrue(follows(me.pk, other.pk))
+
+        # the edit is saved from a copy of the Profile loaded before the follow
+        with mock.patch('mini_insta.views.UpdateProfileView.get_object', return_value=stale):
+            self.client.post(reverse('update_profile'), {
+                'display_name': 'Renamed', 'profile_image_url': '', 'bio_text': '',
+            })
+
+        me.refresh_from_db()
+        self.assertEqual(me.display_name, 'Renamed')
+        self.assertTrue(follows(me.pk, other.pk))
+
+        self.client.get(reverse('follow_profile', kwargs={'pk': last.pk}))
+        self.assertTrue(follows(me.pk, other.pk))
+        self.assertTrue(follows(me.pk, last.pk))
+
+    def test_suggestions_are_friends_of_friends(self):
+        """Suggestions are the Profiles followed by the Profiles user0 follows."""
+
+        me, _, friend_of_friend, _ = self.profiles
+
+        self.assertEqual(suggest_profile_ids(me.pk), [(self.profiles[2].pk, 1), (self.profiles[3].pk, 1)])
+
+        response = self.client.get(reverse('suggestions'))
+        self.assertEqual(response.json()['suggestions'][0]['username'], friend_of_friend.username)
+
+
+class SearchTests(TestCase):
+    """Check that the search index follows the Profiles and Posts."""
+
+    def setUp(self):
+        """Create a Profile with a Post, and log in as it."""
+
+        user = User.objects.create_user('user0', password='password')
+        self.profile = Profile.objects.create(user=user, username='hiker', bio_text='I like mountains')
+        self.post = Post.objects.create(profile=self.profile, caption='Sunrise over the ridge')
+
+        self.client.login(username='user0', password='password')
+
+    def test_search_matches_word_prefixes(self):
+        """Searching for the start of a word finds the Profile and the Post."""
+
+        response = self.client.get(reverse('search'), {'query': 'mount'})
+        self.assertEqual(list(response.context['matching_profiles']), [self.profile])
+
+        response = self.client.get(reverse('search'), {'query': 'sunr'})
+        self.assertEqual(list(response.context['matching_posts']), [self.post])
+
+    def test_index_follows_saves_and_deletes(self):
+        """Editing and deleting rows changes what the search finds."""
+
+        backend = get_search_backend()
+
+        self.post.caption = 'Sunset instead'
+        self.post.save()
+        self.assertEqual(backend.search_post_ids('sunrise'), [])
+        self.assertEqual(backend.search_post_ids('sunset'), [self.post.pk])
+
+        self.post.delete()
+        self.assertEqual(backend.search_post_ids('sunset'), [])
+
+    def test_autocomplete_finds_new_profiles(self):
+        """A Profile shows up in autocomplete as soon as it's created."""
+
+        response = self.client.get(reverse('autocomplete'), {'q': 'tra'})
+        self.assertEqual(response.json()['matches'], [])
+
+        user = User.objects.create_user('user1', password='password')
+        Profile.objects.create(user=user, username='walker', display_name='Trail Runner')
+
+        response = self.client.get(reverse('autocomplete'), {'q': 'tra'})
+        self.assertEqual([m['username'] for m in response.json()['matches']], ['walker'])
+
+    def test_autocomplete_sees_changes_from_other_processes(self):
+        """An index built in another process (with its own cache) sees every
+        Profile saved or deleted here.
+        """
+
+        other_index = ProfilePrefixIndex()
+        self.assertEqual(other_index.complete('tra'), [])
+
+        user = User.objects.create_user('user1', password='password')
+        profile = Profile.objects.create(user=user, username='walker', display_name='Trail Runner')
+
+        # nothing about the change is in the other process's cache
+        cache.clear()
+        self.assertEqual([m['username'] for m in other_index.complete('tra')], ['walker'])
+
+        profile.display_name = 'Quiet Walker'
+        profile.save()
+        self.assertEqual(other_index.complete('tra'), [])
+        self.assertEqual([m['username'] for m in other_index.complete('qui')], ['walker'])
+
+        profile.delete()
+        self.assertEqual(other_index.complete('qui'), [])
+
+
+class MediaTestCase(TestCase):
+    """A TestCase that stores uploaded media in a temporary directory."""
+
+    def setUp(self):
+        """Store media in a temporary directory, and log in as a new Profile."""
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user('user0', password='password')
+        self.profile = Profile.objects.create(user=user, username='user0')
+
+        self.client.login(username='user0', password='password')
+
+    def upload(self, filename, size, format):
+        """Return a new upload of a red image of the given size and format."""
+
+        image = io.BytesIO()
+        Image.new('RGBA', size, 'red').save(image, format)
+
+        return SimpleUploadedFile(filename, image.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class PhotoRenditionTests(MediaTestCase):
+    """Check that uploaded Photos get resized renditions."""
+
+    def test_upload_gets_renditions(self):
+        """A big upload is served resized, once its renditions are generated."""
+
+        upload = self.upload('big.png', (3000, 1500), 'PNG')
+
+        # run the (background) rendition jobs right here instead
+        with mock.patch('mini_insta.images.executor.submit', lambda fn, pk: generate_renditions(pk)):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('create_post'), {'caption': 'big', 'photo_files': [upload]})
+
+        photo = Photo.objects.get(post__profile=self.profile)
+        self.assertEqual(photo.get_thumbnail_url(), photo.thumbnail_file.url)
+        self.assertEqual(photo.get_feed_url(), photo.feed_file.url)
+
+        for rendition, size in ((photo.thumbnail_file, (320, 160)), (photo.feed_file, (1080, 540))):
+            with Image.open(rendition) as image:
+                self.assertEqual(image.format, 'JPEG')
+                self.assertEqual(image.size, size)
+
+    def test_lost_jobs_are_retried(self):
+        """Photos whose jobs never ran (or stopped part way) are served the
+        original until generate_renditions retries them.
+        """
+
+        # the jobs are lost, e.g. to a restart before the workers got to them
+        with mock.patch('mini_insta.images.executor.submit'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('create_post'), {
+                    'caption': 'lost',
+                    'photo_files': [self.upload(f'lost{i}.png', (400 + i, 200), 'PNG') for i in range(2)],
+                })
+
+        first, second = Photo.objects.order_by('pk')
+        self.assertEqual(first.get_feed_url(), first.image_file.url)
+
+        # one job got as far as the full size rendition before dying
+        generate_renditions(second.pk)
+        Photo.objects.filter(pk=second.pk).update(thumbnail_file='')
+
+        output = io.StringIO()
+        call_command('generate_renditions', stdout=output)
+        self.assertIn('Generated the renditions of 2 Photos.', output.getvalue())
+
+        for photo in Photo.objects.all():
+            self.assertEqual(photo.get_thumbnail_url(), photo.thumbnail_file.url)
+            self.assertEqual(photo.get_feed_url(), photo.feed_file.url)
+            self.assertTrue(photo.thumbnail_file.name.startswith('blobs/'))
+
+        output = io.StringIO()
+        call_command('generate_renditions', stdout=output)
+        self.assertIn('Generated the renditions of 0 Photos.', output.getvalue())
+
+
+class MediaStorageTests(MediaTestCase):
+    """Check that identical uploads are stored once, until nothing uses them."""
+
+    def test_identical_uploads_share_a_file(self):
+        """Two Posts uploading the same image share one file, which is only
+        deleted along with the last of them.
+        """
+
+        for caption in ('first', 'second'):
+            self.client.post(reverse('create_post'), {
+                'caption': caption,
+                'photo_files': [self.upload(f'{caption}.png', (10, 10), 'PNG')],
+            })
+
+        first, second = Photo.objects.order_by('pk')
+        name = first.image_file.name
+
+        self.assertEqual(second.image_file.name, name)
+        self.assertTrue(name.startswith('blobs/'))
+
+        # (deleted right away, however recently the file was uploaded)
+        with mock.patch('cs412.storage.BLOB_GRACE_PERIOD', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                first.post.delete()
+            self.assertTrue(media_storage.exists(name))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                second.post.delete()
+            self.assertFalse(media_storage.exists(name))
+
+    def test_replaced_file_is_released(self):
+        """Saving a row with a different file deletes the file it used to have."""
+
+        self.client.post(reverse('create_post'), {
+            'caption': 'first',
+            'photo_files': [self.upload('first.png', (10, 10), 'PNG')],
+        })
+
+        photo = Photo.objects.get()
+        old_name = photo.image_file.name
+
+        with mock.patch('cs412.storage.BLOB_GRACE_PERIOD', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                photo.image_file = self.upload('second.png', (20, 10), 'PNG')
+                photo.save()
+
+        self.assertNotEqual(photo.image_file.name, old_name)
+        self.assertTrue(media_storage.exists(photo.image_file.name))
+        self.assertFalse(media_storage.exists(old_name))
+
+    def test_recently_used_blob_outlives_its_references(self):
+        """A blob saved again just now isn't deleted along with its last row
+        (the row about to use it may not be committed yet), but is swept later.
+        """
+
+        self.client.post(reverse('create_post'), {
+            'caption': 'first',
+            'photo_files': [self.upload('first.png', (10, 10), 'PNG')],
+        })
+
+        photo = Photo.objects.get()
+        name = photo.image_file.name
+        path = media_storage.path(name)
+
+        # make the blob old, then store the same image again
+        os.utime(path, (0, 0))
+        self.assertEqual(media_storage.save('again.png', self.upload('again.png', (10, 10), 'PNG')), name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.post.delete()
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(media_storage.sweep(), 0)
+
+        # once it's old again, the scheduled sweep deletes it
+        os.utime(path, (0, 0))
+        output = io.StringIO()
+        call_command('sweep_media', stdout=output)
+        self.assertIn('Deleted 1 unreferenced blobs.', output.getvalue())
+        self.assertFalse(media_storage.exists(name))
+
+    def test_blob_permissions_ignore_the_umask(self):
+        """New blobs get FILE_UPLOAD_PERMISSIONS, or fixed permissions without
+        it, whatever the umask (which is never read, or changed, to work them out).
+        """
+
+        old_umask = os.umask(0o077)
+        self.addCleanup(os.umask, old_umask)
+
+        for permissions, size in ((0o640, 11), (None, 12)):
+            with self.subTest(permissions=permissions), self.settings(FILE_UPLOAD_PERMISSIONS=permissions):
+                name = media_storage.save('new.png', self.upload('new.png', (size, size), 'PNG'))
+                mode = os.stat(media_storage.path(name)).st_mode & 0o777
+
+                self.assertEqual(mode, permissions or 0o644)
+
+        self.assertEqual(os.umask(0o077), 0o077)
+
+
+class PhotoUploadTests(MediaTestCase):
+    """Check that multi-photo uploads are saved together, with their progress recorded."""
+
+    def test_photos_inserted_at_once_with_progress(self):
+        """Three photos take one INSERT, and each file's progress is recorded."""
+
+        uploads = [self.upload(f'photo{i}.png', (10 + i, 10), 'PNG') for i in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse('create_post') + '?progress_id=abc',
+                {'caption': 'three', 'photo_files': uploads},
+            )
+
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "mini_insta_photo"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Photo.objects.filter(post__caption='three').count(), 3)
+
+        # the progress is in the database, so a process with an empty cache still finds it
+        cache.clear()
+        progress = self.client.get(reverse('upload_progress'), {'progress_id': 'abc'}).json()
+        self.assertTrue(progress['done'])
+        self.assertEqual([f['name'] for f in progress['files']], ['photo0.png', 'photo1.png', 'photo2.png'])
+        self.assertTrue(all(f['done'] and f['received'] for f in progress['files']))
+
+    def test_progress_is_only_shown_to_its_user(self):
+        """Unknown uploads, and other users' uploads, aren't found."""
+
+        self.client.post(
+            reverse('create_post') + '?progress_id=abc',
+            {'caption': 'one', 'photo_files': [self.upload('photo.png', (10, 10), 'PNG')]},
+        )
+
+        response = self.client.get(reverse('upload_progress'), {'progress_id': 'xyz'})
+        self.assertEqual(response.status_code, 404)
+
+        User.objects.create_user('user1', password='password')
+        self.client.login(username='user1', password='password')
+
+        response = self.client.get(reverse('upload_progress'), {'progress_id': 'abc'})
+        self.assertEqual(response.status_code, 404)
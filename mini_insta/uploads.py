@@ -0,0 +1,122 @@
+# File: mini_insta/uploads.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/17/2025
+# Description: Upload handling for Posts' photos. Uploads are streamed to
+# temporary files on disk instead of being held in memory, and how far along
+# each file is gets recorded in the database (so any process can answer for
+# it), and the page doing the upload polls for it (see UploadProgressView).
+
+import re
+import time
+from datetime import timedelta
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from django.utils import timezone
+from .models import UploadProgress
+
+# how long (in seconds) to keep an upload's progress around after its last update
+UPLOAD_PROGRESS_TIMEOUT = 60 * 10
+
+# the least time (in seconds) between two progress updates of the same upload,
+# so a big upload doesn't write to the database for every chunk
+UPLOAD_PROGRESS_INTERVAL = 0.25
+
+
+def get_upload_progress(user_pk, progress_id):
+    """Return the progress of one user's upload (a dict, as saved by
+    UploadProgressHandler), or None if there's no such (recent) upload.
+    """
+
+    cutoff = timezone.now() - timedelta(seconds=UPLOAD_PROGRESS_TIMEOUT)
+
+    return UploadProgress.objects.filter(
+        user=user_pk, progress_id=progress_id, updated__gte=cutoff,
+    ).values_list('progress', flat=True).first()
+
+
+class UploadProgressHandler(FileUploadHandler):
+    """An upload handler that doesn't store anything itself, but records the
+    size of the request and the bytes received of each file in it under the
+    ID given by ?progress_id=... (if there is one), in an UploadProgress row.
+    Goes before the handler that actually stores the files.
+
+    The request body is read (by the CSRF check) before the view starts any
+    transaction, so each update is committed, and seen by the polls, at once.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+
+        progress_id = request.GET.get('progress_id', '')
+
+        # the ID comes from the browser, so only accept a short, plain one
+        if request.user.is_authenticated and re.fullmatch(r'[\w-]{1,64}', progress_id):
+            self.progress_id = progress_id
+        else:
+            self.progress_id = None
+
+        self.progress = {'length': 0, 'received': 0, 'files': [], 'done': False}
+        self.row_pk = None
+        self.last_saved = 0
+
+    def save(self, force=False):
+        """Record the progress (unless it was recorded very recently)."""
+
+        now = time.monotonic()
+
+        if not self.progress_id or not (force or now - self.last_saved >= UPLOAD_PROGRESS_INTERVAL):
+            return
+
+        if self.row_pk is None:
+            user = self.request.user
+            cutoff = timezone.now() - timedelta(seconds=UPLOAD_PROGRESS_TIMEOUT)
+
+            # clear out this user's finished-with uploads while we're at it
+            UploadProgress.objects.filter(user=user, updated__lt=cutoff).delete()
+
+            row, _ = UploadProgress.objects.update_or_create(
+                user=user, progress_id=self.progress_id, defaults={'progress': self.progress},
+            )
+            self.row_pk = row.pk
+        else:
+            # update() skips auto_now, so set the time by hand
+            UploadProgress.objects.filter(pk=self.row_pk).update(
+                progress=self.progress, updated=timezone.now(),
+            )
+
+        self.last_saved = now
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.progress['length'] = content_length
+        self.save(force=True)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+
+        self.progress['files'].append({'name': self.file_name, 'received': 0, 'done': False})
+        self.save(force=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.progress['received'] += len(raw_data)
+        self.progress['files'][-1]['received'] += len(raw_data)
+        self.save()
+
+        # pass the data on to the handler that stores it
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.progress['files'][-1]['done'] = True
+        self.save(force=True)
+
+        # let the next handler return the file
+        return None
+
+    def upload_complete(self):
+        self.progress['done'] = True
+        self.save(force=True)
+
+
+def get_photo_upload_handlers(request):
+    """Return the upload handlers for a request uploading photos: record
+    progress, then stream every file to a temporary file (however small).
+    """
+
+    return [UploadProgressHandler(request), TemporaryFileUploadHandler(request)]
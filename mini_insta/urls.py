@@ -29,6 +29,9 @@ urlpatterns = [
     path('profile/update', UpdateProfileView.as_view(), name='update_profile'),
     path('profile/feed', PostFeedListView.as_view(), name='show_feed'),
     path('profile/search', SearchView.as_view(), name='search'),
+    path('profile/suggestions', SuggestionsView.as_view(), name='suggestions'),
+    path('profile/autocomplete', AutocompleteView.as_view(), name='autocomplete'),
+    path('profile/upload_progress', UploadProgressView.as_view(), name='upload_progress'),
     path('profile/<int:pk>/follow', FollowProfileView.as_view(), name='follow_profile'),
     path('profile/<int:pk>/unfollow', UnfollowProfileView.as_view(), name='unfollow_profile'),
 
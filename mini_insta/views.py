@@ -3,9 +3,13 @@
 # Description: Contains views for the Mini Insta app. These render templates,
 # pass in context variables, and handle form submissions.
 
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
 from .models import *
 from .forms import *
+from .graph import follow_changed, suggest_profile_ids
+from .search import get_search_backend, profile_prefix_index
+from .images import queue_renditions
+from .uploads import get_photo_upload_handlers, get_upload_progress
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -13,6 +17,12 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.contrib.auth import login
+from django.db import transaction, IntegrityError
+from django.http import JsonResponse, Http404
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.core.paginator import Paginator
+from cs412.pagination import KeysetPaginationMixin
 
 
 class MyLoginRequiredMixin(LoginRequiredMixin):
@@ -29,6 +39,38 @@ class MyLoginRequiredMixin(LoginRequiredMixin):
         return Profile.objects.get(user=self.request.user)
 
 
+class PhotoUploadMixin:
+    """A mixin for views whose form uploads photo files (photo_files) for a
+    Post. Uploads are streamed to temporary files, with their progress
+    recorded for UploadProgressView, and all their Photos are created at once.
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        """Set up the upload handlers before anything reads the request body.
+        The CSRF middleware would read it first, so the CSRF check is done
+        here instead, after the handlers are in place.
+        """
+
+        request.upload_handlers = get_photo_upload_handlers(request)
+
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def store_photo_files(self, post):
+        """Store the uploaded photo files (each one read from its temporary
+        file in chunks) and return a new, unsaved Photo of post for each.
+        """
+
+        photos = []
+
+        for file in self.request.FILES.getlist('photo_files'):
+            photo = Photo(post=post)
+            photo.image_file.save(file.name, file, save=False)
+            photos.append(photo)
+
+        return photos
+
+
 class ProfileListView(ListView):
     """Define a view class to show all Mini Insta profiles."""
 
@@ -59,10 +101,8 @@ class ProfileDetailView(DetailView):
 
             # set a boolean context variable to true or false depending on 
             # if the logged in Profile follows the URL Profile
-            if my_profile.already_followed(profile):
-                context['already_followed'] = True
-            else:
-                context['already_followed'] = False
+            # (answered from the cached follow graph, not the database)
+            context['already_followed'] = my_profile.is_following(profile)
 
         return context
 
@@ -100,15 +140,12 @@ class PostDetailView(DetailView):
 
             # set a boolean context variable to true or false depending on 
             # if the logged in Profile has liked the URL Post
-            if my_profile.already_liked(post):
-                context['already_liked'] = True
-            else:
-                context['already_liked'] = False
+            context['already_liked'] = my_profile.has_liked(post)
 
         return context
 
 
-class CreatePostView(MyLoginRequiredMixin, CreateView):
+class CreatePostView(PhotoUploadMixin, MyLoginRequiredMixin, CreateView):
     """A view to handle creation of a new Post on a Mini Instagram Profile."""
 
     form_class = CreatePostForm
@@ -131,9 +168,9 @@ class CreatePostView(MyLoginRequiredMixin, CreateView):
         post = form.instance # the Post instance being created
         my_profile = self.get_logged_in_profile()
 
-        # attach the Profile's PK as a foreign key to the Post
+        # attach the Profile's PK as a foreign key to the Post, add the Post
+        # to everyone's feed timeline, and count it on the Profile
         post.profile = my_profile
-        post.save()
 
         # get the photo URL that the user entered through an explicit form
         # photo_image_url = self.request.POST['photo_image_url']
@@ -143,13 +180,20 @@ class CreatePostView(MyLoginRequiredMixin, CreateView):
         # photo = Photo(post=post, image_url=photo_image_url)
         # photo.save()
 
-        # get a list of photo files the user uploaded
-        photo_files = self.request.FILES.getlist('photo_files')
+        # store the photo files the user uploaded first, so the transaction
+        # below only has to insert rows
+        photos = self.store_photo_files(post)
 
-        # create a new Photo object for each file and save it to the db
-        for file in photo_files:
-            photo = Photo(post=post, image_file=file)
-            photo.save()
+        with transaction.atomic():
+            post.save()
+            post.fan_out()
+            my_profile.add_to_counts(num_posts=1)
+
+            # create all the Photos with a single INSERT
+            Photo.objects.bulk_create(photos)
+
+        # resize the uploads in the background, so the response doesn't wait
+        queue_renditions(photos)
 
         # let the superclass' form_valid() handle the rest
         return super().form_valid(form)
@@ -167,8 +211,19 @@ class UpdateProfileView(MyLoginRequiredMixin, UpdateView):
 
         return self.get_logged_in_profile()
 
+    def form_valid(self, form):
+        """Save only the fields the user changed. The Profile was loaded before
+        any follows, Likes or Posts that happened meanwhile, so saving all of
+        it would write their counts (and follow_version) back over theirs.
+        """
+
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=form.changed_data)
+
+        return redirect(self.get_success_url())
+
 
-class UpdatePostView(MyLoginRequiredMixin, UpdateView):
+class UpdatePostView(PhotoUploadMixin, MyLoginRequiredMixin, UpdateView):
     """View class to update a Post on a Mini Instagram Profile."""
 
     model = Post
@@ -182,13 +237,13 @@ class UpdatePostView(MyLoginRequiredMixin, UpdateView):
 
         post = form.instance # the Post instance being updated
 
-        # get a list of photo files the user uploaded
-        photo_files = self.request.FILES.getlist('photo_files')
+        # store the photo files the user uploaded, then create all their
+        # Photos with a single INSERT
+        photos = self.store_photo_files(post)
+        Photo.objects.bulk_create(photos)
 
-        # create a new Photo object for each file and save it to the db
-        for file in photo_files:
-            photo = Photo(post=post, image_file=file)
-            photo.save()
+        # resize the uploads in the background, so the response doesn't wait
+        queue_renditions(photos)
 
         # let the superclass' form_valid() handle the rest
         return super().form_valid(form)
@@ -213,6 +268,15 @@ class DeletePostView(MyLoginRequiredMixin, DeleteView):
         # redirect to the Profile page whose Post was deleted
         return reverse('show_profile', kwargs={'pk': profile.pk})
     
+    def form_valid(self, form):
+        """Delete the Post, and take it off its Profile's post count."""
+
+        with transaction.atomic():
+            response = super().form_valid(form)
+            self.object.profile.add_to_counts(num_posts=-1)
+
+        return response
+    
 
 class DeletePhotoView(MyLoginRequiredMixin, DeleteView):
     """View class to delete a Photo on a Mini Instagram Profile's Post."""
@@ -265,13 +329,21 @@ class ShowFollowingDetailView(DetailView):
     context_object_name = 'profile'
 
 
-class PostFeedListView(MyLoginRequiredMixin, ListView):
-    """View class to display a list of Posts in the feed."""
+class PostFeedListView(KeysetPaginationMixin, MyLoginRequiredMixin, ListView):
+    """View class to display a list of Posts in the feed, paged by a cursor
+    (?cursor=...) over the feed's sort order, so each page only fetches
+    its own Posts no matter how big the feed is.
+    """
 
     model = Post
     template_name = 'mini_insta/show_feed.html'
     context_object_name = 'post_feed'
 
+    # how many Posts to show per page of the feed, and the (unique) sort
+    # order that the cursor points into
+    paginate_by = 10
+    keyset_field = FEED_ORDER
+
     def get_queryset(self):
         """Returns a queryset that gets passed in as a context variable
         and becomes associated with context_object_name.
@@ -280,10 +352,27 @@ class PostFeedListView(MyLoginRequiredMixin, ListView):
         # get the logged in user's Profile
         my_profile = self.get_logged_in_profile()
 
-        # get the Profile's post feed
-        post_feed = my_profile.get_post_feed()
+        # get the Profile's post feed, along with everything the template
+        # shows about each Post (so a page takes the same few queries no
+        # matter how many Posts, Photos, Likes and Comments it has)
+        post_feed = get_feed_prefetches(my_profile.get_post_feed())
 
         return post_feed
+
+    def get_context_data(self, **kwargs):
+        """Return the dictionary of context variables for use in the template."""
+
+        context = super().get_context_data(**kwargs)
+
+        # mark which Posts on this page the logged in Profile has liked,
+        # looked up for the whole page at once
+        my_profile = self.request.user.profile
+        liked = my_profile.liked_post_ids([post.pk for post in context['post_feed']])
+
+        for post in context['post_feed']:
+            post.liked = post.pk in liked
+
+        return context
     
 
 class SearchView(MyLoginRequiredMixin, ListView):
@@ -295,6 +384,11 @@ class SearchView(MyLoginRequiredMixin, ListView):
     template_name = 'mini_insta/search_results.html'
     context_object_name = 'matching_profiles'
 
+    # how many matching Profiles/Posts to show per page (the Posts are
+    # paged separately, with ?posts_page=N)
+    paginate_by = 12
+    posts_paginate_by = 10
+
     def dispatch(self, request, *args, **kwargs):
         """Handles HTTP requests from the user that get mapped to
         this view through a URL.
@@ -328,13 +422,11 @@ class SearchView(MyLoginRequiredMixin, ListView):
         # end of the URL (can see it in browser!), unlike POST which gives a dict
         query = self.request.GET.get('query')
 
-        # # get a list of Profiles that match the search query,
-        # i.e. the query is found in its username, display name, or bio text
-        matching_profiles = (
-            Profile.objects.filter(username__contains=query) | # union operator that combines querysets
-            Profile.objects.filter(display_name__contains=query) |
-            Profile.objects.filter(bio_text__contains=query)
-        )
+        # get a ranked list of Profiles that match the search query in their
+        # username, display name, or bio text, from the search index
+        # (only the Profiles on the page being shown get fetched)
+        matching_profiles = get_search_backend().search_profiles(query)
+
         return matching_profiles
 
     def get_context_data(self, **kwargs):
@@ -343,17 +435,18 @@ class SearchView(MyLoginRequiredMixin, ListView):
         # get the search query attached to the GET request
         query = self.request.GET.get('query')
 
-        # get a list of Posts that match the search query,
-        # i.e. the query is found in its caption
-        matching_posts = Post.objects.filter(caption__contains=query)
+        # get a ranked list of Posts that match the search query in their caption,
+        # and just the page of them being shown (with everything the template shows)
+        matching_posts = get_search_backend().search_posts(query, get_feed_prefetches(Post.objects.all()))
+        posts_page = Paginator(matching_posts, self.posts_paginate_by).get_page(self.request.GET.get('posts_page'))
 
         # get the context dict from the superclass, and add all the
         # relevant data to it
         # (I didn't add matching_profiles because it's already associated with 
         # the context_object_name as a result of overriding get_queryset)
-        context = super().get_context_data()
+        context = super().get_context_data(**kwargs)
         context['query'] = query
-        context['matching_posts'] = matching_posts
+        context['matching_posts'] = posts_page
 
         return context
     
@@ -390,6 +483,7 @@ class CreateProfileView(CreateView):
         profile = form.instance
         profile.user = user
 
+        # save the Profile (which builds its feed timeline; see signals.py)
         return super().form_valid(form)
     
 
@@ -408,11 +502,24 @@ class FollowProfileView(MyLoginRequiredMixin, TemplateView):
         # get the logged in Profile
         my_profile = self.get_logged_in_profile()
 
-        # if the logged in Profile isn't viewing itself, AND is not already
-        # following the URL Profile, create and save a new Follow instance
-        if my_profile != profile and not my_profile.already_followed(profile):
-            follow = Follow(profile=profile, follower_profile=my_profile)
-            follow.save()
+        # if the logged in Profile isn't viewing itself, create a new Follow
+        # instance, unless it already follows the URL Profile (the database's
+        # unique constraint decides, so two requests at once can't both
+        # follow); only a new Follow moves the URL Profile's Posts into the
+        # followed part of the feed and counts
+        if my_profile != profile:
+            with transaction.atomic():
+                try:
+                    # the inner savepoint lets a duplicate fail on its own
+                    with transaction.atomic():
+                        Follow.objects.create(profile=profile, follower_profile=my_profile)
+                except IntegrityError:
+                    pass
+                else:
+                    my_profile.set_followed_in_timeline(profile, True)
+                    my_profile.add_to_counts(num_following=1)
+                    profile.add_to_counts(num_followers=1)
+                    follow_changed(my_profile)
 
         # redirect to the show_profile page
         return redirect('show_profile', pk=pk)
@@ -433,12 +540,17 @@ class UnfollowProfileView(MyLoginRequiredMixin, TemplateView):
         # get the logged in Profile
         my_profile = self.get_logged_in_profile()
 
-        # get the Follow instance (if it exists)
-        follow = my_profile.already_followed(profile)
+        # delete the Follow instance (if it exists) with a single DELETE, and
+        # if there was one, move the URL Profile's Posts back out of the
+        # followed part of the feed
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(profile=profile, follower_profile=my_profile).delete()
 
-        # if it exists, delete it
-        if follow:
-            follow.delete()
+            if deleted:
+                my_profile.set_followed_in_timeline(profile, False)
+                my_profile.add_to_counts(num_following=-1)
+                profile.add_to_counts(num_followers=-1)
+                follow_changed(my_profile)
 
         # redirect to the show_profile page
         return redirect('show_profile', pk=pk)
@@ -459,11 +571,11 @@ class LikePostView(MyLoginRequiredMixin, TemplateView):
         # get the logged in Profile
         my_profile = self.get_logged_in_profile()
 
-        # if the logged in Profile isn't viewing its own Post, AND has not 
-        # already liked the URL Post, create and save a new Like instance
-        if my_profile != post.profile and not my_profile.already_liked(post):
-            like = Like(post=post, profile=my_profile)
-            like.save()
+        # if the logged in Profile isn't viewing its own Post, create a new
+        # Like instance with a single INSERT that does nothing if the Post is
+        # already liked (the database's unique constraint decides)
+        if my_profile.pk != post.profile_id:
+            Like.objects.bulk_create([Like(post=post, profile=my_profile)], ignore_conflicts=True)
 
         # redirect to the show_post page
         return redirect('show_post', pk=pk)
@@ -477,19 +589,91 @@ class UnlikePostView(MyLoginRequiredMixin, TemplateView):
         this view through a URL.
         """
 
-        # get the Post specified in the URL
+        # get the PK of the Post specified in the URL
         pk = self.kwargs['pk']
-        post = Post.objects.get(pk=pk)
 
         # get the logged in Profile
         my_profile = self.get_logged_in_profile()
 
-        # get the Like instance (if it exists)
-        like = my_profile.already_liked(post)
-
-        # if it exists, delete it
-        if like:
-            like.delete()
+        # delete the Like instance (if it exists) with a single DELETE
+        Like.objects.filter(post=pk, profile=my_profile).delete()
 
         # redirect to the show_post page
-        return redirect('show_post', pk=pk)
\ No newline at end of file
+        return redirect('show_post', pk=pk)
+    
+
+class SuggestionsView(MyLoginRequiredMixin, View):
+    """View class to return "people you may know" for the logged in Profile
+    as JSON, worked out from the cached follow graph (see graph.py).
+    """
+
+    # the most suggestions to return
+    max_suggestions = 10
+
+    def get(self, request, *args, **kwargs):
+        """Respond to a GET request with a list of suggested Profiles,
+        best first, each with how many mutual connections led to it.
+        """
+
+        my_profile = self.get_logged_in_profile()
+        suggestions = suggest_profile_ids(my_profile.pk, limit=self.max_suggestions)
+
+        # the graph only holds PKs, so look up the Profiles to show in one query
+        profiles = Profile.objects.in_bulk([pk for pk, _ in suggestions])
+
+        data = [
+            {
+                'pk': pk,
+                'username': profiles[pk].username,
+                'display_name': profiles[pk].display_name,
+                'profile_image_url': profiles[pk].profile_image_url,
+                'url': profiles[pk].get_absolute_url(),
+                'mutual': score,
+            }
+            for pk, score in suggestions
+            if pk in profiles
+        ]
+
+        return JsonResponse({'suggestions': data})
+    
+
+class AutocompleteView(MyLoginRequiredMixin, View):
+    """View class to return the Profiles whose username (or a word of whose
+    display name) starts with ?q=..., as JSON for the typeahead on the
+    search page. Answered from an in-memory prefix index, not by searching
+    the Profiles table.
+    """
+
+    # the most matches to return
+    max_matches = 8
+
+    def get(self, request, *args, **kwargs):
+        """Respond to a GET request with the matching Profiles, best first."""
+
+        matches = profile_prefix_index.complete(request.GET.get('q', ''), self.max_matches)
+
+        data = [
+            dict(match, url=reverse('show_profile', kwargs={'pk': match['pk']}))
+            for match in matches
+        ]
+
+        return JsonResponse({'matches': data})
+
+
+class UploadProgressView(MyLoginRequiredMixin, View):
+    """View class to return how far along one of the logged in user's photo
+    uploads is (the one started with ?progress_id=...), as JSON, for the
+    progress bars on the create/update Post pages.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Respond to a GET request with the bytes received so far, overall
+        and for each file.
+        """
+
+        progress = get_upload_progress(request.user.pk, request.GET.get('progress_id', ''))
+
+        if progress is None:
+            raise Http404('No such upload.')
+
+        return JsonResponse(progress)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:33
+
+import cs412.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0007_remove_trade_tradee_confirmed_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="box",
+            name="cover_image",
+            field=models.ImageField(
+                storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="item",
+            name="image",
+            field=models.ImageField(
+                storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="player",
+            name="profile_image",
+            field=models.ImageField(
+                blank=True, storage=cs412.storage.get_media_storage, upload_to=""
+            ),
+        ),
+    ]
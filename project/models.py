@@ -4,6 +4,7 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from cs412.storage import get_media_storage
 import random
 
 
@@ -56,7 +57,7 @@ class Player(models.Model):
     """Encapsulate the data of a Player who opens blindboxes."""
 
     username = models.TextField(blank=False) # the Player's name
-    profile_image = models.ImageField(blank=True) # the Player's profile image
+    profile_image = models.ImageField(blank=True, storage=get_media_storage) # the Player's profile image
     boxes_opened = models.IntegerField(default=0) # the number of blindboxes that the Player has opened
     date_joined = models.DateTimeField(auto_now_add=True) # the date when the Player joined
     user = models.OneToOneField(User, on_delete=models.CASCADE) # the Django user tied to the Player via a 1-to-1 relationship
@@ -120,7 +121,7 @@ class Box(models.Model):
     
     player = models.ForeignKey(Player, on_delete=models.CASCADE) # the Player who created this Box
     name = models.TextField(blank=False) # the name of this Box
-    cover_image = models.ImageField(blank=False) # the cover image of this Box
+    cover_image = models.ImageField(blank=False, storage=get_media_storage) # the cover image of this Box
     published = models.BooleanField(default=False) # whether or not this Box is published to the shop
     date_created = models.DateTimeField(auto_now_add=True) # the date when this Box was created
 
@@ -190,7 +191,7 @@ class Item(models.Model):
 
     box = models.ForeignKey(Box, on_delete=models.CASCADE) # the Box that this Item belongs to
     name = models.TextField(blank=False) # this Item's name
-    image = models.ImageField(blank=False) # this Item's image
+    image = models.ImageField(blank=False, storage=get_media_storage) # this Item's image
 
     # this Item's rarity level (rarer == smaller chance of obtaining it from a Box)
     rarity = models.CharField(max_length=2, choices=RARITY_CHOICES, default=COMMON)
@@ -2,4 +2,5 @@ from django.contrib import admin
 from voter_analytics.models import *
 
 # register models to the Django admin site
-admin.site.register(Voter)
\ No newline at end of file
+admin.site.register(Voter)
+admin.site.register(DataVersion)
\ No newline at end of file
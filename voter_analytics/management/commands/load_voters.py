@@ -0,0 +1,43 @@
+# File: voter_analytics/management/commands/load_voters.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/31/2025
+# Description: Management command that bulk loads the Newton voter CSV
+# file into the database (python manage.py load_voters <path>).
+
+from django.core.management.base import BaseCommand
+from voter_analytics.models import Voter, VoterRollup, BATCH_SIZE, bump_data_version, load_data
+
+
+class Command(BaseCommand):
+    """Stream a voter CSV file into the Voter table in batches."""
+
+    help = 'Load registered voters from a CSV file into the Voter table.'
+
+    def add_arguments(self, parser):
+        """Define the command line arguments for this command."""
+
+        parser.add_argument('path', help='path to the voter CSV file')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'number of rows inserted per transaction (default {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='delete every existing Voter (and the rollup cube) before loading',
+        )
+
+    def handle(self, *args, **options):
+        """Run the import and report how it went."""
+
+        if options['clear']:
+            deleted, _ = Voter.objects.all().delete()
+            VoterRollup.objects.all().delete()
+            bump_data_version()
+            self.stdout.write(f'Deleted {deleted} existing voters.')
+
+        created, rejected = load_data(
+            options['path'], options['batch_size'], log=self.stdout.write,
+        )
+
+        # list every rejected line so the CSV can be fixed up
+        for line_num, error in rejected:
+            self.stderr.write(f'Rejected line {line_num}: {error}')
@@ -0,0 +1,21 @@
+# File: voter_analytics/management/commands/refresh_voter_rollup.py
+# Author: Yi Ji (Wayne) Wang (waynew@bu.edu), 10/31/2025
+# Description: Management command that rebuilds the VoterRollup cube from
+# scratch (python manage.py refresh_voter_rollup). The loader keeps the cube
+# up to date on its own; this is for when Voters were changed some other way.
+
+from django.core.management.base import BaseCommand
+from voter_analytics.models import rebuild_voter_rollup
+
+
+class Command(BaseCommand):
+    """Recompute every cell of the VoterRollup cube."""
+
+    help = 'Rebuild the VoterRollup cube from the Voter table.'
+
+    def handle(self, *args, **options):
+        """Rebuild the cube and report its size."""
+
+        cells = rebuild_voter_rollup()
+
+        self.stdout.write(f'Rebuilt the voter rollup cube ({cells} cells).')
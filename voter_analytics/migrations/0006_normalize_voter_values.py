@@ -0,0 +1,45 @@
+# Rewrites the text values of existing Voters so that the next migration
+# can cast the columns to integer/boolean/date types.
+
+from django.db import migrations
+
+# the election columns that hold 'TRUE'/'FALSE' strings
+ELECTIONS = ['v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
+
+
+def flags_to_digits(apps, schema_editor):
+    """Store the election flags as '1'/'0' (which every backend casts to a
+    boolean), and trim whitespace off the numeric columns.
+    """
+
+    Voter = apps.get_model('voter_analytics', 'Voter')
+
+    for elec in ELECTIONS:
+        Voter.objects.filter(**{elec: 'TRUE'}).update(**{elec: '1'})
+        Voter.objects.filter(**{elec: 'FALSE'}).update(**{elec: '0'})
+
+    for voter in Voter.objects.filter(score__contains=' ') | Voter.objects.filter(precinct__contains=' '):
+        voter.score = voter.score.strip()
+        voter.precinct = voter.precinct.strip()
+        voter.save(update_fields=['score', 'precinct'])
+
+
+def digits_to_flags(apps, schema_editor):
+    """Undo flags_to_digits()."""
+
+    Voter = apps.get_model('voter_analytics', 'Voter')
+
+    for elec in ELECTIONS:
+        Voter.objects.filter(**{elec: '1'}).update(**{elec: 'TRUE'})
+        Voter.objects.filter(**{elec: '0'}).update(**{elec: 'FALSE'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voter_analytics", "0005_alter_voter_score"),
+    ]
+
+    operations = [
+        migrations.RunPython(flags_to_digits, digits_to_flags),
+    ]
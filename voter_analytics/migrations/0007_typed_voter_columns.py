@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voter_analytics', '0006_normalize_voter_values'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voter',
+            name='birth_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='birth_year',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='precinct',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='registration_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='score',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='v20state',
+            field=models.BooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='v21primary',
+            field=models.BooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='v21town',
+            field=models.BooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='v22general',
+            field=models.BooleanField(),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='v23town',
+            field=models.BooleanField(),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['party', 'score', 'birth_year'], name='voter_party_score_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['score', 'birth_year'], name='voter_score_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['birth_year'], name='voter_birth_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['v20state', 'v21town', 'v21primary', 'v22general', 'v23town'], name='voter_elections_idx'),
+        ),
+    ]
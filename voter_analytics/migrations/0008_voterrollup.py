@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+# the Voter attributes that the rollup cube is keyed by
+ROLLUP_DIMENSIONS = [
+    "party",
+    "score",
+    "birth_year",
+    "v20state",
+    "v21town",
+    "v21primary",
+    "v22general",
+    "v23town",
+]
+
+
+def build_rollup(apps, schema_editor):
+    """Fill the new cube from the Voters that are already loaded."""
+
+    Voter = apps.get_model("voter_analytics", "Voter")
+    VoterRollup = apps.get_model("voter_analytics", "VoterRollup")
+
+    rows = Voter.objects.values(*ROLLUP_DIMENSIONS).annotate(count=models.Count("pk"))
+    VoterRollup.objects.bulk_create(VoterRollup(**row) for row in rows.order_by())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voter_analytics", "0007_typed_voter_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VoterRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("party", models.TextField()),
+                ("score", models.IntegerField()),
+                ("birth_year", models.IntegerField()),
+                ("v20state", models.BooleanField()),
+                ("v21town", models.BooleanField()),
+                ("v21primary", models.BooleanField()),
+                ("v22general", models.BooleanField()),
+                ("v23town", models.BooleanField()),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "party",
+                            "score",
+                            "birth_year",
+                            "v20state",
+                            "v21town",
+                            "v21primary",
+                            "v22general",
+                            "v23town",
+                        ),
+                        name="voter_rollup_cell_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voter_analytics", "0008_voterrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.IntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
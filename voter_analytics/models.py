@@ -3,7 +3,13 @@
 # Description: Defines what attributes the Voter models 
 # in the database should have.
 
-from django.db import models
+from django.db import models, transaction
+from datetime import date
+import csv
+import time
+
+# the elections that we know whether each Voter voted in
+ELECTIONS = ['v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
 
 
 class Voter(models.Model):
@@ -17,18 +23,29 @@ class Voter(models.Model):
     apt_number = models.TextField()
     zip = models.TextField()
 
-    birth_date = models.TextField()
-    birth_year = models.TextField()
-    registration_date = models.TextField()
+    birth_date = models.DateField()
+    birth_year = models.IntegerField()
+    registration_date = models.DateField()
     party = models.TextField()
-    precinct = models.TextField()
+    precinct = models.IntegerField()
+
+    # whether or not this Voter voted in each election
+    v20state = models.BooleanField()
+    v21town = models.BooleanField()
+    v21primary = models.BooleanField()
+    v22general = models.BooleanField()
+    v23town = models.BooleanField()
+    score = models.IntegerField()
+
+    class Meta:
+        """Index the columns that the filter form searches on."""
 
-    v20state = models.TextField()
-    v21town = models.TextField()
-    v21primary = models.TextField()
-    v22general = models.TextField()
-    v23town = models.TextField()
-    score = models.TextField()
+        indexes = [
+            models.Index(fields=['party', 'score', 'birth_year'], name='voter_party_score_year_idx'),
+            models.Index(fields=['score', 'birth_year'], name='voter_score_year_idx'),
+            models.Index(fields=['birth_year'], name='voter_birth_year_idx'),
+            models.Index(fields=ELECTIONS, name='voter_elections_idx'),
+        ]
 
     def __str__(self):
         """Return a string representation of this Voter instance."""
@@ -36,65 +53,249 @@ class Voter(models.Model):
         return f'{self.first_name} {self.last_name} (voter score: {self.score})'
     
 
-def load_data():
-    """Function to load data records from CSV file into the Django database."""
-
-    # open the CSV file containing the data
-    filename = '/Users/waynewang/Downloads/CS412/data/newton_voters.csv'
-    f = open(filename, 'r')
-
-    # for i in range(2):
-    #     line = f.readline()
-
-    #     fields = line.strip().split(',')
-
-    #     for j in range(len(fields)):
-    #         print(f'fields[{j}] = {fields[j]}')
-
-    # Voter.objects.all().delete()
-
-    # discard the first line containing the column headers
-    f.readline()
-
-    # add each line as a separate Voter instance to the database
-    for line in f:
-        try:
-            # get a list of the fields
-            fields = line.strip().split(',')
-
-            # create a new Voter instance using the fields 
-            # and save it to the db
-            voter = Voter(
-                last_name = fields[1],
-                first_name = fields[2],
-
-                street_number = fields[3],
-                street_name = fields[4],
-                apt_number = fields[5],
-                zip = fields[6],
-
-                birth_date = fields[7],
-                birth_year = fields[7][0:4],
-                registration_date = fields[8],
-                party = fields[9],
-                precinct = fields[10],
-
-                v20state = fields[11],
-                v21town = fields[12],
-                v21primary = fields[13],
-                v22general = fields[14],
-                v23town = fields[15],
-                
-                score = fields[16],
-            )
-            voter.save()
-
-        # skip the line if there was an error
-        except Exception as e:
-            print(f'AAAAAAAAAAA AN ERROR!!! in line: {line}\n')
-            print(e)
-
-    print(f'Done! Created {len(Voter.objects.all())} voters.')
+class DataVersion(models.Model):
+    """Store a counter that goes up every time the Voter data is (re)loaded.
+    Anything cached from the Voter table is keyed by the current version, 
+    so bumping it invalidates those caches in every process at once.
+    """
+
+    version = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True) # when the version was last bumped
+
+    def __str__(self):
+        """Return a string representation of this DataVersion."""
+
+        return f'Voter data version {self.version} ({self.updated})'
+    
+
+def get_data_version():
+    """Return the current version of the Voter data (0 if it was never bumped)."""
+
+    version = DataVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+
+    return version or 0
+
+
+def bump_data_version():
+    """Mark the Voter data as changed, invalidating everything cached from it."""
+
+    # there's only ever one DataVersion row; create it the first time around
+    if not DataVersion.objects.filter(pk=1).update(version=models.F('version') + 1):
+        DataVersion.objects.create(pk=1, version=1)
+
+
+# the Voter attributes that the rollup cube is keyed by
+ROLLUP_DIMENSIONS = ['party', 'score', 'birth_year'] + ELECTIONS
+
+
+class VoterRollup(models.Model):
+    """Store one cell of a precomputed cube of Voter counts: how many Voters 
+    share a party, score, birth year, and set of elections voted in.
+
+    The cube has the same attribute names as Voter, so the graphs can be
+    filtered and grouped over it just like over the Voter table, while 
+    summing count instead of counting rows.
+    """
+
+    party = models.TextField()
+    score = models.IntegerField()
+    birth_year = models.IntegerField()
+
+    v20state = models.BooleanField()
+    v21town = models.BooleanField()
+    v21primary = models.BooleanField()
+    v22general = models.BooleanField()
+    v23town = models.BooleanField()
+
+    count = models.IntegerField(default=0) # how many Voters fall into this cell
+
+    class Meta:
+        """Each combination of dimensions gets exactly one cell."""
+
+        constraints = [
+            models.UniqueConstraint(fields=ROLLUP_DIMENSIONS, name='voter_rollup_cell_unique'),
+        ]
+
+    def __str__(self):
+        """Return a string representation of this VoterRollup cell."""
+
+        return f'{self.party} | score {self.score} | born {self.birth_year}: {self.count} voters'
+    
+
+def rebuild_voter_rollup():
+    """Recompute every cell of the VoterRollup cube from the Voter table.
+    Returns the number of cells created.
+    """
+
+    # count the Voters in every combination of dimensions in one grouped query
+    cells = [
+        VoterRollup(**row)
+        for row in Voter.objects.values(*ROLLUP_DIMENSIONS).annotate(count=models.Count('pk')).order_by()
+    ]
+
+    with transaction.atomic():
+        VoterRollup.objects.all().delete()
+        VoterRollup.objects.bulk_create(cells)
+
+        # let graphs cached from the old cube know that it changed
+        bump_data_version()
+
+    return len(cells)
+
+
+def add_to_voter_rollup(voters):
+    """Incrementally add a batch of newly created Voters to the VoterRollup 
+    cube, by bumping the counts of existing cells and creating any new ones.
+    """
+
+    # tally the batch by cell
+    deltas = {}
+    for voter in voters:
+        key = tuple(getattr(voter, dim) for dim in ROLLUP_DIMENSIONS)
+        deltas[key] = deltas.get(key, 0) + 1
+
+    # fetch every existing cell that the batch could touch
+    existing = VoterRollup.objects.filter(
+        party__in={key[0] for key in deltas},
+        score__in={key[1] for key in deltas},
+        birth_year__in={key[2] for key in deltas},
+    )
+    cells = {
+        tuple(getattr(cell, dim) for dim in ROLLUP_DIMENSIONS): cell for cell in existing
+    }
+
+    updated = []
+    created = []
+
+    for key, delta in deltas.items():
+        if key in cells:
+            cells[key].count += delta
+            updated.append(cells[key])
+        else:
+            created.append(VoterRollup(count=delta, **dict(zip(ROLLUP_DIMENSIONS, key))))
+
+    VoterRollup.objects.bulk_update(updated, ['count'])
+    VoterRollup.objects.bulk_create(created)
+
+
+# the number of Voters inserted per bulk_create call (and per transaction)
+BATCH_SIZE = 2000
+
+# the number of columns in each row of the voter CSV file
+NUM_COLUMNS = 17
+
+
+def parse_flag(text):
+    """Turn a 'TRUE'/'FALSE' CSV field into a bool."""
+
+    if text == 'TRUE':
+        return True
+    elif text == 'FALSE':
+        return False
+    else:
+        raise ValueError(f'expected TRUE or FALSE, got {text!r}')
+
+
+def parse_voter(fields):
+    """Build (but don't save) a Voter instance from a list of CSV fields.
+    Raises a ValueError if the row doesn't have the expected shape.
+    """
+
+    if len(fields) != NUM_COLUMNS:
+        raise ValueError(f'expected {NUM_COLUMNS} columns, got {len(fields)}')
+
+    birth_date = date.fromisoformat(fields[7])
+
+    return Voter(
+        last_name = fields[1],
+        first_name = fields[2],
+
+        street_number = fields[3],
+        street_name = fields[4],
+        apt_number = fields[5],
+        zip = fields[6],
+
+        birth_date = birth_date,
+        birth_year = birth_date.year,
+        registration_date = date.fromisoformat(fields[8]),
+        party = fields[9],
+        precinct = int(fields[10]),
+
+        v20state = parse_flag(fields[11]),
+        v21town = parse_flag(fields[12]),
+        v21primary = parse_flag(fields[13]),
+        v22general = parse_flag(fields[14]),
+        v23town = parse_flag(fields[15]),
+
+        score = int(fields[16]),
+    )
+
+
+def save_voters(voters):
+    """Insert a batch of unsaved Voters with a single bulk_create, and add 
+    them to the VoterRollup cube, inside one transaction. 
+    Returns how many were inserted.
+    """
+
+    with transaction.atomic():
+        Voter.objects.bulk_create(voters)
+        add_to_voter_rollup(voters)
+
+    return len(voters)
+
+
+def load_data(filename, batch_size=BATCH_SIZE, log=print):
+    """Function to load data records from CSV file into the Django database.
+
+    The file is streamed through the csv module and inserted in chunks of 
+    batch_size rows, so we never hold the whole file in memory and never 
+    pay for one INSERT (and one transaction) per voter. Rows that can't be 
+    parsed are skipped and returned as a list of (line number, error) tuples,
+    along with the number of Voters created.
+    """
+
+    created = 0
+    rejected = []
+    batch = []
+    start = time.perf_counter()
+
+    with open(filename, 'r', newline='') as f:
+        reader = csv.reader(f)
+
+        # discard the first line containing the column headers
+        next(reader, None)
+
+        for fields in reader:
+            try:
+                batch.append(parse_voter(fields))
+
+            # skip the line if there was an error, but remember where it was
+            except ValueError as e:
+                rejected.append((reader.line_num, str(e)))
+                continue
+
+            # flush the batch to the db once it's full
+            if len(batch) >= batch_size:
+                created += save_voters(batch)
+                batch = []
+
+                elapsed = time.perf_counter() - start
+                log(f'Created {created} voters ({created / elapsed:.0f} rows/sec)')
+
+        # flush whatever is left over
+        if batch:
+            created += save_voters(batch)
+
+    # let cached dropdowns, graphs, etc. know that the Voters changed
+    bump_data_version()
+
+    elapsed = time.perf_counter() - start
+    rate = created / elapsed if elapsed else 0
+
+    log(f'Done! Created {created} voters in {elapsed:.2f}s '
+        f'({rate:.0f} rows/sec), rejected {len(rejected)} lines.')
+
+    return created, rejected
 
 
 # fields[0] = Voter ID Number
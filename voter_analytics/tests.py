@@ -1,3 +1,223 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+import io
+import os
+import tempfile
+from datetime import date
+from django.core.management import call_command
+from django.test import RequestFactory
+from .models import *
+from .views import filter_voters, get_voter_distributions
+
+# the header line of the Newton voter CSV file
+CSV_HEADER = [
+    'Voter ID Number', 'Last Name', 'First Name', 'Residential Address - Street Number',
+    'Residential Address - Street Name', 'Residential Address - Apartment Number',
+    'Residential Address - Zip Code', 'Date of Birth', 'Date of Registration',
+    'Party Affiliation', 'Precinct Number', 'v20state', 'v21town', 'v21primary',
+    'v22general', 'v23town', 'voter_score',
+]
+
+
+def voter_row(i, party='D', birth_date='1980-01-03', flags=('TRUE', 'FALSE', 'FALSE', 'TRUE', 'FALSE')):
+    """Return the CSV fields of a made up voter (with score = the flags set)."""
+
+    return [
+        f'10WLA{i:07}', f'Last{i}', f'First{i}', str(i), 'CIRCUIT AVE', '', '02461',
+        birth_date, '2022-11-26', party, '1', *flags, str(flags.count('TRUE')),
+    ]
+
+
+class VoterCSVTestCase(TestCase):
+    """A TestCase that can write voter CSV files to load."""
+
+    def write_csv(self, rows):
+        """Write a voter CSV file (header included) and return its path."""
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+
+        with os.fdopen(fd, 'w', newline='') as f:
+            for fields in [CSV_HEADER] + rows:
+                f.write(','.join(fields) + '\r\n')
+
+        return path
+
+    def load(self, rows, batch_size=2):
+        """Load the rows with load_data() in small batches; return its result."""
+
+        return load_data(self.write_csv(rows), batch_size, log=lambda message: None)
+
+
+class LoadVotersTests(VoterCSVTestCase):
+    """Check the streaming, batched CSV import and the filters over what it loads."""
+
+    def test_rows_are_typed_and_bad_rows_rejected(self):
+        """Good rows become typed Voters, and each bad line is reported by number."""
+
+        rows = [
+            voter_row(1, party='D', birth_date='1960-05-01'),
+            voter_row(2, party='R', birth_date='1990-07-04'),
+            voter_row(3, flags=('YES', 'FALSE', 'FALSE', 'FALSE', 'FALSE')),
+            voter_row(4)[:10],
+            voter_row(5, birth_date='not a date'),
+            voter_row(6, party='U', birth_date='2000-02-29'),
+        ]
+
+        created, rejected = self.load(rows)
+
+        self.assertEqual(created, 3)
+        self.assertEqual([line_num for line_num, _ in rejected], [4, 5, 6])
+        self.assertEqual(Voter.objects.count(), 3)
+
+        voter = Voter.objects.get(first_name='First1')
+        self.assertEqual(voter.birth_date, date(1960, 5, 1))
+        self.assertEqual(voter.birth_year, 1960)
+        self.assertEqual((voter.precinct, voter.score), (1, 2))
+        self.assertEqual([getattr(voter, elec) for elec in ELECTIONS], [True, False, False, True, False])
+
+    def test_command_loads_and_clears(self):
+        """load_voters loads a path, and --clear replaces what was there."""
+
+        path = self.write_csv([voter_row(i) for i in range(5)] + [voter_row(5)[:3]])
+
+        for _ in range(2):
+            output, errors = io.StringIO(), io.StringIO()
+            call_command('load_voters', path, '--clear', '--batch-size', '2', stdout=output, stderr=errors)
+
+        self.assertEqual(Voter.objects.count(), 5)
+        self.assertIn('Deleted 5 existing voters.', output.getvalue())
+        self.assertIn('Created 5 voters', output.getvalue())
+        self.assertIn('Rejected line 7', errors.getvalue())
+
+    def test_filters_over_loaded_voters(self):
+        """The voter list filters the loaded Voters by party, birth year and elections."""
+
+        self.load([
+            voter_row(1, party='D', birth_date='1960-05-01'),
+            voter_row(2, party='D', birth_date='1990-07-04', flags=('TRUE',) * 5),
+            voter_row(3, party='R', birth_date='1990-01-01'),
+            voter_row(4, party='D', birth_date='2001-03-03'),
+        ])
+
+        def listed(**params):
+            """Return the first names of the Voters the list shows for the filters."""
+
+            response = self.client.get('/voter_analytics/', params)
+            return sorted(voter.first_name for voter in response.context['voters'])
+
+        self.assertEqual(listed(), ['First1', 'First2', 'First3', 'First4'])
+        self.assertEqual(listed(party='D', min_birth_year=1980), ['First2', 'First4'])
+        self.assertEqual(listed(party='D', max_birth_year=1990), ['First1', 'First2'])
+        self.assertEqual(listed(elections=['v21town', 'v23town']), ['First2'])
+        self.assertEqual(listed(score=5), ['First2'])
+
+
+class VoterRollupTests(VoterCSVTestCase):
+    """Check that the rollup cube gives the same answers as the Voter table."""
+
+    # filter combinations that the graphs can answer from the cube
+    FILTERS = [
+        {},
+        {'party': 'D'},
+        {'party': 'R', 'min_birth_year': '1970'},
+        {'score': '2', 'max_birth_year': '1990'},
+        {'elections': ['v20state', 'v22general'], 'min_birth_year': '1960', 'max_birth_year': '2000'},
+    ]
+
+    def setUp(self):
+        """Load voters spread over a few parties, birth years and elections."""
+
+        flags = [('TRUE', 'FALSE', 'FALSE', 'TRUE', 'FALSE'), ('TRUE',) * 5, ('FALSE',) * 5]
+
+        self.load([
+            voter_row(i, party='DRU'[i % 3], birth_date=f'{1950 + i * 3}-06-01', flags=flags[i % 4 % 3])
+            for i in range(20)
+        ])
+
+    def assert_rollup_matches_voters(self):
+        """For every filter combination, the cube and the table agree."""
+
+        factory = RequestFactory()
+
+        for params in self.FILTERS:
+            with self.subTest(params=params):
+                request = factory.get('/voter_analytics/graphs/data', params)
+
+                self.assertEqual(
+                    get_voter_distributions(filter_voters(request, VoterRollup.objects.all())),
+                    get_voter_distributions(filter_voters(request, Voter.objects.all())),
+                )
+
+    def test_rollup_after_loads(self):
+        """The cube kept up incrementally by two loads matches the Voters."""
+
+        self.assert_rollup_matches_voters()
+
+        self.load([voter_row(100 + i, party='D', birth_date='1980-01-01') for i in range(5)])
+        self.assert_rollup_matches_voters()
+
+    def test_rollup_after_an_edit_and_refresh(self):
+        """After Voters are edited, refreshing the cube makes it match again."""
+
+        Voter.objects.filter(party='U').update(party='D', v21town=True)
+        Voter.objects.filter(first_name='First4').delete()
+
+        # the edits went around the loader, so the cube is out of date until refreshed
+        self.assertNotEqual(
+            get_voter_distributions(VoterRollup.objects.all()),
+            get_voter_distributions(Voter.objects.all()),
+        )
+
+        output = io.StringIO()
+        call_command('refresh_voter_rollup', stdout=output)
+
+        self.assert_rollup_matches_voters()
+
+
+class GraphsDataTests(VoterCSVTestCase):
+    """Check the JSON behind the graphs, and its ETag."""
+
+    def setUp(self):
+        """Load a few voters."""
+
+        self.load([
+            voter_row(1, party='D', birth_date='1960-05-01'),
+            voter_row(2, party='D', birth_date='1990-07-04', flags=('TRUE',) * 5),
+            voter_row(3, party='R', birth_date='1990-01-01'),
+        ])
+
+    def get_data(self, **headers):
+        """GET the graph data for the Voters born from 1980 on."""
+
+        return self.client.get('/voter_analytics/graphs/data', {'min_birth_year': 1980}, headers=headers)
+
+    def test_json_shape(self):
+        """The response holds the filtered series for each graph."""
+
+        data = self.get_data().json()
+
+        self.assertEqual(data, {
+            'total': 2,
+            'birth_years': {'x': [1990], 'y': [2]},
+            'parties': {'labels': ['D', 'R'], 'values': [1, 1]},
+            'elections': {'x': ELECTIONS, 'y': [2, 1, 1, 2, 1]},
+        })
+
+    def test_etag_revalidation(self):
+        """A matching If-None-Match gets a 304 until the Voter data changes."""
+
+        response = self.get_data()
+        etag = response['ETag']
+
+        response = self.get_data(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.load([voter_row(4, party='R', birth_date='1999-09-09')])
+
+        response = self.get_data(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total'], 3)
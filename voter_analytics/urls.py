@@ -10,5 +10,6 @@ from .views import *
 urlpatterns = [
 	path('', VotersListView.as_view(), name='voters'),
     path('graphs', GraphsListView.as_view(), name='graphs'),
+    path('graphs/data', GraphsDataView.as_view(), name='graphs_data'),
     path('voter/<int:pk>', VoterDetailView.as_view(), name='voter'),
 ]
\ No newline at end of file
@@ -3,15 +3,40 @@
 # Description: Contains views for the Voter Analytics app. These render templates,
 # pass in context variables, and handle form submissions.
 
-from django.views.generic import ListView, DetailView
+from django.views.generic import ListView, DetailView, View
 from . models import *
-import plotly
-import plotly.graph_objects as go
-from django.db.models import Count
+from django.db.models import Count, Q, Sum
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from cs412.chart_cache import normalize_params
+from cs412.pagination import KeysetPaginationMixin
+import hashlib
 
 
-class VotersListView(ListView):
-    """View to display every Voter based on filter criteria."""
+# how long (in seconds) to cache the drop down menu values for; a reload of
+# the data bumps the data version, which invalidates them right away anyway
+UNIQUE_ATTRIBUTES_TIMEOUT = 60 * 60 * 24
+
+# the GET parameters that can be answered from the VoterRollup cube
+ROLLUP_FILTERS = {'party', 'score', 'min_birth_year', 'max_birth_year', 'elections'}
+
+
+def graphs_data_etag(request, *args, **kwargs):
+    """Helper function that returns the ETag for a GraphsDataView response, 
+    which only changes when the filters or the Voter data do.
+    """
+
+    params = repr(normalize_params(request.GET)).encode()
+
+    return f'{get_data_version()}-{hashlib.md5(params).hexdigest()}'
+
+
+class VotersListView(KeysetPaginationMixin, ListView):
+    """View to display every Voter based on filter criteria. Pages are 
+    fetched by primary key (?cursor=...), so deep pages are as cheap as the first.
+    """
 
     model = Voter
     template_name = 'voter_analytics/voters.html'
@@ -32,17 +57,6 @@ class VotersListView(ListView):
         # so we can keep those choices checked after the page reloads
         context = add_filter_choices(self.request, context)
 
-        # get a copy of the GET request's parameters
-        params = self.request.GET.copy()
-
-        # remove the page parameter if it already exists;
-        # this makes it easier for pagination in the template
-        if 'page' in params:
-            params.pop('page')
-        
-        # add the remaining parameters as a string to the context dict
-        context['querystring'] = params.urlencode()
-
         return context
     
     def get_queryset(self):
@@ -78,121 +92,53 @@ class GraphsListView(ListView):
         # so we can keep those choices checked after the page reloads
         context = add_filter_choices(self.request, context)
 
-        # get the default Voters queryset from the context dict
-        voters = context['voters']
+        # the graphs are drawn in the browser from GraphsDataView's JSON, which 
+        # gets requested with the same filter parameters as this page
+        context['querystring'] = self.request.GET.urlencode()
 
-        # filter the voters based on filter criteria
-        voters = filter_voters(self.request, voters)
-
-        ################################ BIRTH YEARS BAR GRAPH ################################
-
-        # for each birth year, count the number of Voters who have that birth year;
-        # this returns a list of dictionaries of the form {birth_year: count of Voters}
-        graph_div_birth_years_data = voters.values('birth_year').annotate(count=Count('pk'))
-
-        print(f'BIRTH YEARS DATA: {graph_div_birth_years_data}')
+        return context
+    
 
-        # extract the birth years and counts into lists for the x and y axes
-        x = [
-            d['birth_year'] for d in graph_div_birth_years_data
-        ]
-        y = [
-            d['count'] for d in graph_div_birth_years_data
-        ]
+class GraphsDataView(View):
+    """View to return the data behind the graphs (aggregated counts for the 
+    filtered Voters) as JSON, for graphs.html to draw client-side.
+    """
 
-        # create the graph and its title text
-        fig = go.Bar(x=x, y=y)
-        title_text = f'Voter Distribution by Year of Birth (n={len(voters)})'
+    @method_decorator(condition(etag_func=graphs_data_etag))
+    def get(self, request, *args, **kwargs):
+        """Respond to a GET request with the graphs' series as JSON. The ETag 
+        lets browsers revalidate with a cheap 304 until the data changes.
+        """
 
-        # get the graph as an HTML div element
-        graph_div_birth_years = plotly.offline.plot(
-            {
-                'data': [fig],
-                'layout_title_text': title_text,
+        # answer from the precomputed VoterRollup cube when every filter can be
+        # applied to it; otherwise fall back to the raw Voter table
+        if filters_fit_rollup(request):
+            voters = VoterRollup.objects.all()
+        else:
+            voters = Voter.objects.all()
+
+        # filter the voters based on filter criteria, then count everything
+        # the graphs need with a single grouped query
+        voters = filter_voters(request, voters)
+        distributions = get_voter_distributions(voters)
+
+        data = {
+            'total': distributions['total'],
+            'birth_years': {
+                'x': list(distributions['birth_years'].keys()),
+                'y': list(distributions['birth_years'].values()),
             },
-            auto_open=False,
-            output_type='div',
-        )
-
-        # add graph to context
-        context['graph_div_birth_years'] = graph_div_birth_years
-
-        ################################ PARTIES PIE GRAPH ################################
-
-        # for each party, count the number of Voters who are affiliated with that party;
-        # this returns a list of dictionaries of the form {party: count of Voters}
-        graph_div_parties_data = voters.values('party').annotate(count=Count('pk'))
-
-        print(f'PARTIES DATA: {graph_div_parties_data}')
-
-        # extract the parties and counts into lists for the labels and values
-        labels = [
-            d['party'] for d in graph_div_parties_data
-        ]
-        values = [
-            d['count'] for d in graph_div_parties_data
-        ]
-
-        # create the graph and its title text
-        fig = go.Pie(labels=labels, values=values)
-        title_text = f'Voter Distribution by Party Affiliation (n={len(voters)})'
-
-        # get the graph as an HTML div element
-        graph_div_parties = plotly.offline.plot(
-            {
-                'data': [fig],
-                'layout_title_text': title_text,
+            'parties': {
+                'labels': list(distributions['parties'].keys()),
+                'values': list(distributions['parties'].values()),
             },
-            auto_open=False,
-            output_type='div',
-        )
-
-        # add graph to context
-        context['graph_div_parties'] = graph_div_parties
-
-        ################################ ELECTIONS BAR GRAPH ################################
-
-        # for each election, get a subset of the Voters who voted in that election
-        graph_div_elections_v20state_data = voters.filter(v20state='TRUE')
-        graph_div_elections_v21town_data = voters.filter(v21town='TRUE')
-        graph_div_elections_v21primary_data = voters.filter(v21primary='TRUE')
-        graph_div_elections_v22general_data = voters.filter(v22general='TRUE')
-        graph_div_elections_v23town_data = voters.filter(v23town='TRUE')
-
-        # create the lists for the x and y axes
-        x = [
-            'v20state',
-            'v21town',
-            'v21primary',
-            'v22general',
-            'v23town',
-        ]
-        y = [
-            len(graph_div_elections_v20state_data),
-            len(graph_div_elections_v21town_data),
-            len(graph_div_elections_v21primary_data),
-            len(graph_div_elections_v22general_data),
-            len(graph_div_elections_v23town_data),
-        ]
-
-        # create the graph and its title text
-        fig = go.Bar(x=x, y=y)
-        title_text = f'Vote Count by Election n={len(voters)}'
-
-        # get the graph as an HTML div element
-        graph_div_elections = plotly.offline.plot(
-            {
-                'data': [fig],
-                'layout_title_text': title_text,
+            'elections': {
+                'x': list(distributions['elections'].keys()),
+                'y': list(distributions['elections'].values()),
             },
-            auto_open=False,
-            output_type='div'
-        )
-
-        # add graph to context
-        context['graph_div_elections'] = graph_div_elections
+        }
 
-        return context
+        return JsonResponse(data)
     
 
 class VoterDetailView(DetailView):
@@ -208,22 +154,107 @@ def add_unique_voter_attributes(context):
     and birth year to the specified context dictionary.
     """
 
-    context['parties'] = Voter.objects.values_list('party', flat=True).distinct().order_by('party')
-    context['scores'] = Voter.objects.values_list('score', flat=True).distinct().order_by('score')
-    context['birth_years'] = Voter.objects.values_list('birth_year', flat=True).distinct().order_by('birth_year')
+    context.update(get_unique_voter_attributes())
 
     return context
 
 
+def get_unique_voter_attributes():
+    """Helper function that returns a dict with every unique party, voter score,
+    and birth year. These only change when the Voter data is reloaded, so the 
+    DISTINCT queries are cached under the current data version.
+    """
+
+    key = f'voter_analytics:unique_attributes:{get_data_version()}'
+    attributes = cache.get(key)
+
+    if attributes is None:
+        attributes = {
+            'parties': list(Voter.objects.values_list('party', flat=True).distinct().order_by('party')),
+            'scores': list(Voter.objects.values_list('score', flat=True).distinct().order_by('score')),
+            'birth_years': list(Voter.objects.values_list('birth_year', flat=True).distinct().order_by('birth_year')),
+        }
+        cache.set(key, attributes, UNIQUE_ATTRIBUTES_TIMEOUT)
+
+    return attributes
+
+
+def filters_fit_rollup(request):
+    """Helper function that checks whether every GET parameter is a filter
+    that can be answered from the VoterRollup cube.
+    """
+
+    return all(param in ROLLUP_FILTERS for param in request.GET)
+
+
+def get_voter_distributions(voters):
+    """Helper function that counts the specified Voters queryset by birth year,
+    by party, and by which elections they voted in, all with one grouped query.
+    The queryset may also be over the VoterRollup cube, in which case each 
+    cell's count is summed instead of counting rows.
+
+    Returns a dict of plain counts: 'total', and 'birth_years', 'parties' and
+    'elections' dicts that map each value to its count.
+    """
+
+    if voters.model is VoterRollup:
+        tally = lambda q=None: Sum('count', filter=q, default=0)
+    else:
+        tally = lambda q=None: Count('pk', filter=q)
+
+    # group by (birth_year, party), and count each group's voters along 
+    # with how many of them voted in each election
+    election_counts = {
+        f'{elec}_count': tally(Q(**{elec: True})) for elec in ELECTIONS
+    }
+    rows = voters.values('birth_year', 'party').annotate(
+        num_voters=tally(), **election_counts,
+    ).order_by('birth_year', 'party')
+
+    total = 0
+    birth_years = {}
+    parties = {}
+    elections = {elec: 0 for elec in ELECTIONS}
+
+    # fold the (birth_year, party) groups into the separate distributions
+    for row in rows:
+        total += row['num_voters']
+        birth_years[row['birth_year']] = birth_years.get(row['birth_year'], 0) + row['num_voters']
+        parties[row['party']] = parties.get(row['party'], 0) + row['num_voters']
+
+        for elec in ELECTIONS:
+            elections[elec] += row[f'{elec}_count']
+
+    return {
+        'total': total,
+        'birth_years': birth_years,
+        'parties': dict(sorted(parties.items())),
+        'elections': elections,
+    }
+
+
+def get_int_param(request, name):
+    """Helper function that returns the GET parameter with the given name
+    as an int, or None if it's missing or isn't a number.
+    """
+
+    try:
+        return int(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
 def add_filter_choices(request, context):
     """Helper function to add the filter choices (parameters passed in 
     through the GET request) to the specified context dictionary.
     """
 
+    # the numeric choices are converted to ints, so the template can compare 
+    # them against the (integer) drop down values
     context['party_choice'] = request.GET.get('party')
-    context['score_choice'] = request.GET.get('score')
-    context['min_birth_year_choice'] = request.GET.get('min_birth_year')
-    context['max_birth_year_choice'] = request.GET.get('max_birth_year')
+    context['score_choice'] = get_int_param(request, 'score')
+    context['min_birth_year_choice'] = get_int_param(request, 'min_birth_year')
+    context['max_birth_year_choice'] = get_int_param(request, 'max_birth_year')
     
     # process the list of election filters to add each one
     # to the context dict, if it exists
@@ -243,40 +274,27 @@ def filter_voters(request, voters):
 
     # get each filter from the GET request's parameters
     party = request.GET.get('party')
-    score = request.GET.get('score')
-    min_birth_year = request.GET.get('min_birth_year')
-    max_birth_year = request.GET.get('max_birth_year')
+    score = get_int_param(request, 'score')
+    min_birth_year = get_int_param(request, 'min_birth_year')
+    max_birth_year = get_int_param(request, 'max_birth_year')
     elections = request.GET.getlist('elections')
 
     # keep on filtering the Voters queryset for each existing filter
     if party:
         voters = voters.filter(party=party)
 
-    if score:
+    if score is not None:
         voters = voters.filter(score=score)
 
-    if min_birth_year:
+    if min_birth_year is not None:
         voters = voters.filter(birth_year__gte=min_birth_year)
 
-    if max_birth_year:
+    if max_birth_year is not None:
         voters = voters.filter(birth_year__lte=max_birth_year)
 
-    if elections:
-        elections = {elec: True for elec in elections}
-
-        if elections.get('v20state'):
-            voters = voters.filter(v20state='TRUE')
-
-        if elections.get('v21town'):
-            voters = voters.filter(v21town='TRUE')
-
-        if elections.get('v21primary'):
-            voters = voters.filter(v21primary='TRUE')
-
-        if elections.get('v22general'):
-            voters = voters.filter(v22general='TRUE')
-
-        if elections.get('v23town'):
-            voters = voters.filter(v23town='TRUE')
+    # only keep Voters who voted in every checked election
+    for elec in ELECTIONS:
+        if elec in elections:
+            voters = voters.filter(**{elec: True})
 
     return voters
\ No newline at end of file